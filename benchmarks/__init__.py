@@ -0,0 +1,11 @@
+"""Benchmarks for maxify.
+
+:mod:`benchmarks.generate` creates a deterministic synthetic data file, and
+:mod:`benchmarks.run` times the scenarios defined in
+:mod:`benchmarks.scenarios` against it::
+
+    python -m benchmarks.run --projects 20 --tasks 500 --rows 50000
+
+The other modules are standalone benchmarks: ``api_load.py`` for the HTTP
+API, and ``import_time.py`` for the client's startup time.
+"""
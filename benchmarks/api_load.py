@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""
+Load generator for the HTTP API (see :mod:`maxify.api`).
+
+Starts the API in a separate process against a fresh data file, then runs a
+number of concurrent clients, each sending requests over a keep-alive
+connection for a fixed amount of time.  A fraction of the requests record a
+duration, the rest query a task's totals.  Reports the throughput and the
+latency percentiles of each type of request.
+
+Usage::
+
+    python benchmarks/api_load.py --clients 16 --seconds 10 --writes 0.5
+
+Passing ``--max-batch 1`` commits every recorded value separately, which
+gives a baseline for the effect of group commits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROJECT = "load"
+TASKS = 50
+
+
+def serve(args):
+    from maxify.api import run
+    from maxify.metrics import Duration
+    from maxify.projects import Project
+    from maxify.repo import Repository, Projects
+
+    Repository.init(args.data_file)
+    project = Project(name=PROJECT)
+    project.add_metric(name="Coding Time", metric_type=Duration)
+    Projects().save(project)
+
+    run(port=args.port,
+        commit_interval=args.commit_interval / 1000.0,
+        max_batch=args.max_batch)
+
+
+async def client(port, deadline, write_ratio, seed, latencies):
+    rand = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        while time.perf_counter() < deadline:
+            task = "task-{}".format(rand.randrange(TASKS))
+            if rand.random() < write_ratio:
+                kind = "record"
+                payload = json.dumps(dict(project=PROJECT,
+                                          task=task,
+                                          metric="Coding Time",
+                                          value="15m")).encode("utf-8")
+                request = "POST /record HTTP/1.1\r\n" \
+                          "Content-Length: {}\r\n\r\n".format(len(payload))
+            else:
+                kind = "totals"
+                payload = b""
+                request = "GET /totals?project={}&task={} HTTP/1.1\r\n" \
+                          "\r\n".format(PROJECT, task)
+
+            start = time.perf_counter()
+            writer.write(request.encode("latin-1") + payload)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies[kind].append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_clients(args, deadline, latencies):
+    await asyncio.gather(*[client(args.port, deadline, args.writes, i,
+                                  latencies)
+                           for i in range(args.clients)])
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def load(args):
+    data_dir = tempfile.mkdtemp(prefix="maxify-load-")
+    data_file = os.path.join(data_dir, "maxify.db")
+    server = subprocess.Popen([sys.executable,
+                               os.path.abspath(__file__),
+                               "--serve",
+                               "--data-file", data_file,
+                               "--port", str(args.port),
+                               "--commit-interval", str(args.commit_interval),
+                               "--max-batch", str(args.max_batch)])
+    try:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(wait_for_server(args.port))
+
+        latencies = dict(record=[], totals=[])
+        start = time.perf_counter()
+        loop.run_until_complete(run_clients(args, start + args.seconds,
+                                            latencies))
+        elapsed = time.perf_counter() - start
+        loop.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+    total = sum(len(l) for l in latencies.values())
+    print("{} clients, {:.0f}% writes, {:.1f} s, commit interval {} ms, "
+          "max batch {}".format(args.clients, args.writes * 100, elapsed,
+                                args.commit_interval, args.max_batch))
+    print("Throughput: {:.0f} requests/s".format(total / elapsed))
+    print("{:8}  {:>8}  {:>8}  {:>8}  {:>8}".format("Request", "Count",
+                                                    "p50 ms", "p95 ms",
+                                                    "p99 ms"))
+    for kind, values in sorted(latencies.items()):
+        if not values:
+            continue
+        print("{:8}  {:>8}  {:>8.2f}  {:>8.2f}  {:>8.2f}".format(
+            kind,
+            len(values),
+            percentile(values, 0.5) * 1000,
+            percentile(values, 0.95) * 1000,
+            percentile(values, 0.99) * 1000))
+
+
+async def wait_for_server(port, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the "
+                                                 "maxify HTTP API")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--writes",
+                        type=float,
+                        default=0.5,
+                        help="Fraction of requests that record a value.")
+    parser.add_argument("--port", type=int, default=8431)
+    parser.add_argument("--commit-interval",
+                        type=float,
+                        default=5.0,
+                        metavar="MS")
+    parser.add_argument("--max-batch", type=int, default=500)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--data-file", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+    else:
+        load(args)
+
+
+if __name__ == "__main__":
+    main()
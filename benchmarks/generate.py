@@ -0,0 +1,149 @@
+"""Generator of synthetic data files for benchmarks.
+
+The data is generated from a seeded random number generator, so the same
+arguments always produce the same data.  Rows are inserted straight into the
+data file's tables rather than through the ORM, so that large data files are
+quick to create.
+
+Usage::
+
+    python -m benchmarks.generate maxify-bench.db --projects 20 --tasks 500 \\
+        --rows 50000
+
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import random
+import uuid
+
+from maxify.data import open_user_data, to_epoch
+from maxify.metrics import Metric, Duration, Number
+from maxify.projects import Project, Task
+from maxify.utils import natural_sort_key
+
+#: Point in time that generated values are recorded before.
+BASE_TIME = datetime(2014, 6, 1)
+
+#: Metrics created in each project, as (name, type, value range) tuples.
+METRICS = [
+    ("Coding Time", Duration, None),
+    ("Debug Time", Duration, None),
+    ("Test Time", Duration, None),
+    ("Story Points", Number, [1, 2, 3, 5, 8, 13])
+]
+
+
+def project_name(index):
+    """Returns the qualified name of a generated project."""
+    name = "project-{:03}".format(index)
+    organization = _organization(index)
+    return organization + "/" + name if organization else name
+
+
+def generate(path, projects=10, tasks=200, rows=20000, seed=0):
+    """Creates a data file with generated projects, tasks and values.
+
+    :param path: Path of the data file, which must not contain projects
+        already.
+    :param projects: Number of projects.
+    :param tasks: Number of tasks in each project.
+    :param rows: Number of durations recorded in each project.  Each task
+        also has a single number.
+    :param seed: Seed of the random number generator.
+
+    """
+    rand = random.Random(seed)
+
+    def new_id():
+        return uuid.UUID(int=rand.getrandbits(128))
+
+    session = open_user_data(path)
+    engine = session.bind
+    session.close()
+
+    project_rows, metric_rows, task_rows = [], [], []
+    duration_rows, number_rows = [], []
+    for p in range(projects):
+        project_id = new_id()
+        project_rows.append(dict(id=project_id,
+                                 name="project-{:03}".format(p),
+                                 organization=_organization(p),
+                                 desc="Generated project {}".format(p)))
+
+        metric_ids = []
+        for name, metric_type, value_range in METRICS:
+            metric_id = new_id()
+            metric_ids.append((metric_id, metric_type, value_range))
+            metric_rows.append(dict(id=metric_id,
+                                    name=name,
+                                    metric_type=metric_type,
+                                    project_id=project_id,
+                                    value_range=value_range))
+
+        durations = [m for m in metric_ids if m[1] is Duration]
+        task_ids = []
+        for t in range(tasks):
+            task_id = new_id()
+            task_ids.append(task_id)
+            created = BASE_TIME - timedelta(days=rand.randrange(365))
+            name = "task-{}".format(t + 1)
+            task_rows.append(dict(id=task_id,
+                                  name=name,
+                                  sort_key=natural_sort_key(name),
+                                  created=created,
+                                  last_updated=created,
+                                  project_id=project_id))
+            for metric_id, metric_type, value_range in metric_ids:
+                if metric_type is Number:
+                    number_rows.append(_value(task_id, metric_id, created,
+                                              rand.choice(value_range)))
+
+        for _ in range(rows):
+            metric_id, _, _ = rand.choice(durations)
+            timestamp = BASE_TIME - timedelta(seconds=rand.randrange(
+                365 * 24 * 3600))
+            row = _value(rand.choice(task_ids), metric_id, timestamp,
+                         timedelta(minutes=rand.randrange(5, 240)))
+            row["id"] = new_id()
+            duration_rows.append(row)
+
+    with engine.begin() as conn:
+        for table, values in ((Project.__table__, project_rows),
+                              (Metric.__table__, metric_rows),
+                              (Task.__table__, task_rows),
+                              (Number.__table__, number_rows),
+                              (Duration.__table__, duration_rows)):
+            if values:
+                conn.execute(table.insert(), values)
+
+    engine.dispose()
+
+
+def _organization(index):
+    return "org{}".format(index % 3) if index % 2 else None
+
+
+def _value(task_id, metric_id, timestamp, value):
+    return dict(task_id=task_id,
+                metric_id=metric_id,
+                timestamp=timestamp,
+                epoch=to_epoch(timestamp),
+                value=value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic maxify "
+                                                 "data file")
+    parser.add_argument("path")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    generate(args.path, args.projects, args.tasks, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""History of benchmark results, and comparison of results for regressions.
+
+Results are saved as JSON files in ``.benchmarks/<fingerprint>/<revision>.json``
+where the fingerprint identifies the machine and Python build the benchmarks
+ran on, since only results from the same machine can be compared, and the
+revision is the git commit they ran against (with a ``-dirty`` suffix if the
+working tree had uncommitted changes).
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Default directory that results are saved in.
+HISTORY_DIR = os.path.join(ROOT, ".benchmarks")
+
+#: Prefixes of the scenarios that are checked for regressions by default.
+CHECKED_PREFIXES = ("maxify.repo:", "maxify.ui:")
+
+
+def revision():
+    """Returns the git revision of the working tree."""
+    def git(*args):
+        return subprocess.run(["git"] + list(args),
+                              cwd=ROOT,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL,
+                              universal_newlines=True)
+
+    head = git("rev-parse", "--short=12", "HEAD")
+    if head.returncode != 0:
+        return "unknown"
+
+    dirty = git("diff", "--quiet", "HEAD").returncode != 0
+    return head.stdout.strip() + ("-dirty" if dirty else "")
+
+
+def machine():
+    """Returns a description of the machine and Python build."""
+    return dict(system=platform.system(),
+                release=platform.release(),
+                machine=platform.machine(),
+                processor=platform.processor(),
+                cpus=os.cpu_count(),
+                python=platform.python_implementation() + " " +
+                platform.python_version())
+
+
+def fingerprint(description=None):
+    """Returns a short hash identifying a machine description."""
+    description = description or machine()
+    data = json.dumps(description, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def save(results, params, directory=HISTORY_DIR):
+    """Saves the results of a benchmark run.
+
+    :param results: ``dict`` mapping scenario names to their results.
+    :param params: ``dict`` of the parameters of the run, such as the size of
+        the generated data.
+    :param directory: Directory to save results in.
+
+    :return: The path of the saved file.
+
+    """
+    description = machine()
+    record = dict(revision=revision(),
+                  fingerprint=fingerprint(description),
+                  machine=description,
+                  time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  params=params,
+                  results=results)
+
+    path = os.path.join(directory, record["fingerprint"],
+                        record["revision"] + ".json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2, sort_keys=True)
+
+    return path
+
+
+def load(name, directory=HISTORY_DIR):
+    """Loads saved results.
+
+    :param name: Path to a results file, or a revision (or a prefix of one)
+        whose results were saved on this machine.
+    :param directory: Directory results are saved in.
+
+    :raises ValueError: If no results, or more than one set of results,
+        match the revision.
+
+    """
+    if os.path.isfile(name):
+        path = name
+    else:
+        machine_dir = os.path.join(directory, fingerprint())
+        files = sorted(f for f in os.listdir(machine_dir)
+                       if f.startswith(name)) \
+            if os.path.isdir(machine_dir) else []
+        if name + ".json" in files:
+            files = [name + ".json"]
+        if not files:
+            raise ValueError("No results saved for revision {} on this "
+                             "machine".format(name))
+        if len(files) > 1:
+            raise ValueError("Revision {} is ambiguous: {}".format(
+                name, ", ".join(files)))
+        path = os.path.join(machine_dir, files[0])
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def mann_whitney_p(baseline, current):
+    """Returns the p-value of a one-sided Mann-Whitney U test of whether the
+    current timings tend to be larger than the baseline timings, using the
+    normal approximation with a tie correction.
+    """
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+
+    values = sorted([(v, 0) for v in current] + [(v, 1) for v in baseline])
+    ranks = [0.0] * len(values)
+    ties = 0.0
+    i = 0
+    while i < len(values):
+        j = i
+        while j + 1 < len(values) and values[j + 1][0] == values[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        count = j - i + 1
+        ties += count ** 3 - count
+        i = j + 1
+
+    rank_sum = sum(r for r, (_, group) in zip(ranks, values) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(baseline, current, threshold=0.1, alpha=0.05,
+            prefixes=CHECKED_PREFIXES):
+    """Compares two sets of saved results.
+
+    A scenario has regressed if its median time grew by more than
+    ``threshold`` and the slowdown is statistically significant.
+
+    :return: ``list`` of (name, baseline p50, current p50, change, p-value,
+        regressed) tuples for the scenarios present in both sets of results.
+
+    """
+    rows = []
+    for name, result in sorted(current["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+
+        change = result["p50"] / base["p50"] - 1 if base["p50"] else 0.0
+        p = mann_whitney_p(base["times"], result["times"])
+        regressed = name.startswith(tuple(prefixes)) and \
+            change > threshold and p < alpha
+        rows.append((name, base["p50"], result["p50"], change, p, regressed))
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run compare",
+                                     description="Compare saved benchmark "
+                                                 "results and exit with a "
+                                                 "non-zero status if any "
+                                                 "scenario regressed")
+    parser.add_argument("baseline",
+                        help="Revision or results file to compare against.")
+    parser.add_argument("current",
+                        nargs="?",
+                        help="Revision or results file to compare. Defaults "
+                             "to the current revision.")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=0.1,
+                        help="Relative slowdown of the median time that "
+                             "counts as a regression. By default, 0.1 (10%%).")
+    parser.add_argument("--alpha",
+                        type=float,
+                        default=0.05,
+                        help="Significance level. By default, 0.05.")
+    parser.add_argument("--dir", default=HISTORY_DIR)
+
+    args = parser.parse_args(argv)
+    try:
+        baseline = load(args.baseline, args.dir)
+        current = load(args.current or revision(), args.dir)
+    except ValueError as e:
+        print("Error: " + str(e), file=sys.stderr)
+        sys.exit(2)
+
+    if baseline["params"] != current["params"]:
+        print("Warning: results were generated with different parameters",
+              file=sys.stderr)
+
+    print("Comparing {} against {}".format(current["revision"],
+                                           baseline["revision"]))
+    rows = compare(baseline, current, args.threshold, args.alpha)
+    width = max([len(r[0]) for r in rows] + [8])
+    print("{:{}}  {:>9}  {:>9}  {:>8}  {:>7}".format("Scenario", width,
+                                                     "Base ms", "Now ms",
+                                                     "Change", "p"))
+    for name, base, now, change, p, regressed in rows:
+        print("{:{}}  {:>9.2f}  {:>9.2f}  {:>+7.1%}  {:>7.3f}{}".format(
+            name, width, base * 1000, now * 1000, change, p,
+            "  REGRESSION" if regressed else ""))
+
+    if any(r[-1] for r in rows):
+        sys.exit(1)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+Import-time benchmark for the command line client's startup.
+
+Imports each module in a fresh interpreter with ``-X importtime`` a number
+of times, and reports the median cumulative import time of the module along
+with the modules it imports that take the longest.
+
+Usage::
+
+    python benchmarks/import_time.py [--runs 10] [--top 10] [MODULE ...]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["maxify.main", "maxify.client", "maxify.ui"]
+
+
+def import_times(module):
+    """Imports a module in a fresh interpreter.
+
+    :param module: Name of the module to import.
+
+    :return: ``dict`` mapping the names of imported modules to their
+        cumulative import time in microseconds.
+
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime",
+                             "-c", "import " + module],
+                            cwd=ROOT,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark for "
+                                                 "maxify modules")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+
+    args = parser.parse_args()
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        total = statistics.median(r[module] for r in runs)
+        print("{}: {:.1f} ms (median of {} runs)".format(module,
+                                                         total / 1000.0,
+                                                         args.runs))
+
+        names = set.intersection(*(set(r) for r in runs)) - {module}
+        medians = sorted(((statistics.median(r[n] for r in runs), n)
+                          for n in names), reverse=True)
+        for us, name in medians[:args.top]:
+            print("  {:>8.1f} ms  {}".format(us / 1000.0, name))
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Runner for the benchmark scenarios.
+
+Generates a data file (unless an existing one is given), then times each
+scenario a number of times after a warm-up run and reports the median (p50)
+and 95th percentile (p95) durations, along with the peak memory allocated
+during a separate, traced run.
+
+With ``--save``, the results are also saved to the history of results
+(see :mod:`benchmarks.history`), and the ``compare`` mode compares saved
+results, exiting with a non-zero status if a scenario regressed.
+
+Usage::
+
+    python -m benchmarks.run [--projects 10] [--tasks 200] [--rows 20000]
+        [--repeat 20] [-k PATTERN] [--save]
+    python -m benchmarks.run compare BASELINE [CURRENT] [--threshold 0.1]
+
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import history
+from benchmarks.generate import generate
+from benchmarks.scenarios import scenarios, Context
+
+
+def percentile(values, fraction):
+    """Returns a percentile of a list of values, using the nearest rank."""
+    values = sorted(values)
+    return values[min(int(round(fraction * (len(values) - 1))),
+                      len(values) - 1)]
+
+
+def time_scenario(func, repeat, warmup=1):
+    """Times a scenario.
+
+    :param func: The function returned by the scenario.
+    :param repeat: Number of timed runs.
+    :param warmup: Number of runs before the timed runs.
+
+    :return: ``dict`` with the durations of the runs in seconds (``times``),
+        their ``p50`` and ``p95``, and the ``peak`` memory in bytes.
+
+    """
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return dict(times=times,
+                p50=percentile(times, 0.5),
+                p95=percentile(times, 0.95),
+                peak=peak)
+
+
+def run(data_path, work_dir, projects, repeat, pattern=None):
+    """Runs the scenarios against a data file.
+
+    :return: ``dict`` mapping scenario names to their results.
+
+    """
+    from maxify.repo import Repository
+    from maxify.utils import set_locale
+
+    set_locale()
+    Repository.init(data_path)
+    context = Context(data_path, work_dir, projects)
+
+    results = {}
+    for name, setup in scenarios:
+        if pattern and pattern not in name:
+            continue
+        results[name] = time_scenario(setup(context), repeat)
+
+    return results
+
+
+def print_results(results):
+    width = max(len(name) for name in results)
+    print("{:{}}  {:>9}  {:>9}  {:>10}".format("Scenario", width, "p50 ms",
+                                               "p95 ms", "Peak KiB"))
+    for name, result in results.items():
+        print("{:{}}  {:>9.2f}  {:>9.2f}  {:>10.1f}".format(
+            name,
+            width,
+            result["p50"] * 1000,
+            result["p95"] * 1000,
+            result["peak"] / 1024.0))
+
+
+def parser():
+    parser = argparse.ArgumentParser(description="Run the maxify benchmark "
+                                                 "scenarios")
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("-k",
+                        dest="pattern",
+                        help="Only run scenarios with names containing "
+                             "PATTERN.")
+    parser.add_argument("--data-file",
+                        help="Existing data file generated with the same "
+                             "number of projects, instead of generating one.")
+    parser.add_argument("--save",
+                        action="store_true",
+                        help="Save the results, keyed by git revision and "
+                             "machine fingerprint.")
+    parser.add_argument("--dir",
+                        default=history.HISTORY_DIR,
+                        help="Directory to save results in.")
+    return parser
+
+
+def main():
+    if sys.argv[1:2] == ["compare"]:
+        history.main(sys.argv[2:])
+        return
+
+    args = parser().parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="maxify-bench-")
+    try:
+        data_path = os.path.join(work_dir, "maxify.db")
+        if args.data_file:
+            shutil.copy(args.data_file, data_path)
+        else:
+            generate(data_path, args.projects, args.tasks, args.rows,
+                     args.seed)
+
+        results = run(data_path, work_dir, args.projects, args.repeat,
+                      args.pattern)
+    finally:
+        shutil.rmtree(work_dir)
+
+    print_results(results)
+    if args.save:
+        params = dict(projects=args.projects,
+                      tasks=args.tasks,
+                      rows=args.rows,
+                      seed=args.seed,
+                      repeat=args.repeat,
+                      data_file=args.data_file)
+        print("\nSaved to " + history.save(results, params, args.dir))
+
+
+if __name__ == "__main__":
+    main()
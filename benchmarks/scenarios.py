@@ -0,0 +1,179 @@
+"""Timed benchmark scenarios.
+
+Each scenario is a function that takes a :class:`Context` and prepares
+anything it needs, then returns the function to time.  Scenarios are named
+after the module they exercise, such as ``maxify.ui:projects``.
+"""
+
+from datetime import timedelta
+import itertools
+import os
+
+from benchmarks.generate import project_name
+
+#: ``list`` of registered (name, function) tuples, in order.
+scenarios = []
+
+
+def scenario(name):
+    """Decorator registering a scenario."""
+    def register(func):
+        scenarios.append((name, func))
+        return func
+
+    return register
+
+
+class Context(object):
+    """Environment shared by the scenarios of a benchmark run.
+
+    :param data_path: Path to the generated data file.
+    :param work_dir: Directory where scenarios can create files.
+    :param projects: Number of projects in the data file.
+
+    """
+
+    def __init__(self, data_path, work_dir, projects):
+        self.data_path = data_path
+        self.work_dir = work_dir
+        self.project_names = [project_name(i) for i in range(projects)]
+        self._interpreter = None
+
+    @property
+    def interpreter(self):
+        """:class:`maxify.ui.MaxifyCmd` writing its output to ``os.devnull``
+        and switched to the first project.
+        """
+        from maxify.ui import MaxifyCmd
+
+        if self._interpreter is None:
+            self._interpreter = MaxifyCmd(stdout=open(os.devnull, "w"),
+                                          use_color=False)
+        self._interpreter.onecmd("switch " + self.project_names[0])
+        return self._interpreter
+
+
+@scenario("maxify.ui:projects")
+def projects(context):
+    interpreter = context.interpreter
+    return lambda: interpreter.onecmd("projects")
+
+
+@scenario("maxify.ui:tasks --details")
+def tasks_details(context):
+    interpreter = context.interpreter
+    return lambda: interpreter.onecmd("tasks --details")
+
+
+@scenario("maxify.ui:switch")
+def switch(context):
+    interpreter = context.interpreter
+    names = itertools.cycle(context.project_names)
+    return lambda: interpreter.onecmd("switch " + next(names))
+
+
+@scenario("maxify.ui:complete_switch")
+def complete_switch(context):
+    interpreter = context.interpreter
+    line = "switch proj"
+    return lambda: interpreter.complete_switch("proj", line, 7, len(line))
+
+
+@scenario("maxify.ui:complete_stopwatch")
+def complete_stopwatch(context):
+    interpreter = context.interpreter
+    line = "stopwatch task-1"
+    return lambda: interpreter.complete_stopwatch("task-1", line, 10,
+                                                  len(line))
+
+
+@scenario("maxify.config:import")
+def import_config(context):
+    from maxify.config import import_config, ImportStrategy
+
+    path = os.path.join(context.work_dir, "import.yaml")
+    with open(path, "w") as f:
+        f.write("projects:\n")
+        for i in range(5):
+            f.write("  - name: imported-{}\n"
+                    "    metrics:\n"
+                    "      - name: Coding Time\n"
+                    "        metric_type: Duration\n"
+                    "      - name: Story Points\n"
+                    "        metric_type: Number\n".format(i))
+
+    return lambda: import_config(path, ImportStrategy.overwrite)
+
+
+@scenario("maxify.repo:Projects.save")
+def projects_save(context):
+    from maxify.repo import Projects
+
+    projects = Projects()
+    project = projects.get(context.project_names[0])
+    metric = project.metric("Coding Time")
+
+    def save():
+        project.task("task-1").record(metric, timedelta(minutes=5))
+        projects.save(project)
+
+    return save
+
+
+@scenario("maxify.repo:Projects.get x100")
+def projects_get(context):
+    from maxify.repo import Projects
+
+    projects = Projects()
+    name = context.project_names[0]
+    # Held like the interpreter holds its current project, which keeps the
+    # project's loaded tasks and metrics in the session.
+    project = projects.get(name)
+
+    def get():
+        for _ in range(100):
+            assert projects.get(name) is project
+
+    return get
+
+
+@scenario("maxify.repo:Tasks.starts_with x100")
+def tasks_starts_with(context):
+    from maxify.repo import Projects, Tasks
+
+    tasks = Tasks(Projects().get(context.project_names[0]))
+
+    def starts_with():
+        for _ in range(100):
+            tasks.starts_with("task-1")
+
+    return starts_with
+
+
+@scenario("maxify.metrics:Duration.total x100")
+def duration_total(context):
+    from maxify.metrics import Duration
+    from maxify.repo import Projects, Repository
+
+    project = Projects().get(context.project_names[0])
+    metric = project.metric("Coding Time")
+    task = project.task("task-1")
+
+    def total():
+        for _ in range(100):
+            Duration.total(metric, task, Repository.db_session)
+
+    return total
+
+
+@scenario("maxify.metrics:Duration.parse")
+def duration_parse(context):
+    from maxify.metrics import Duration
+
+    values = ["1h 30m", "45 minutes", "2:15", "3 hrs", "1d 2h 3m 4s"] * 20
+
+    def parse():
+        for value in values:
+            Duration.parse(value)
+
+    return parse
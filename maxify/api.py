@@ -0,0 +1,391 @@
+"""Module implementing a local HTTP/JSON API for recording and querying
+metric values, intended for editor plugins and CI jobs running on the same
+machine.
+
+The API is served by a single asyncio event loop on localhost, which owns
+the repository's database session.  Recorded values are not committed one
+by one: they are queued and written with a single commit per batch (a group
+commit), either after a short interval or once enough values are queued,
+and each request is answered once its batch has been committed.
+
+Endpoints:
+
+``GET /projects``
+    The projects in the data file.
+``GET /tasks?project=NAME``
+    The tasks of a project.
+``GET /totals?project=NAME&task=TASK``
+    The totals of each metric for a task.
+``GET /report?project=NAME[&by=day|week|month][&since=DATE][&until=DATE]``
+    The durations recorded in a project, broken down by period.
+``POST /record``
+    Records a value, given a JSON object with ``project``, ``task``,
+    ``metric`` and ``value`` (parsed like values entered at the prompt).
+
+"""
+
+import asyncio
+from datetime import timedelta
+from decimal import Decimal
+import json
+from urllib.parse import urlsplit, parse_qs
+
+from maxify.log import Logger
+from maxify.metrics import Number, ParsingError
+from maxify.repo import Repository, Projects, Reports, begin_write
+from maxify.reports import periods
+from maxify.utils import parse_datetime
+
+log = Logger("api")
+
+_reasons = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error"
+}
+
+
+class ApiError(Exception):
+    """Error returned to the client as a JSON response.
+
+    :param status: HTTP status code of the response.
+    :param message: Description of the error.
+
+    """
+
+    def __init__(self, status, message):
+        super(ApiError, self).__init__(message)
+        self.status = status
+
+
+class GroupCommitter(object):
+    """Applies writes to the database session in batches, with a single
+    commit per batch.  A write that fails is rolled back on its own, and
+    only its future receives the exception.
+
+    :param session: The sqlalchemy database session to commit.
+    :param interval: Seconds to wait for more writes before committing.
+    :param max_batch: Number of queued writes that triggers a commit
+        immediately.
+
+    """
+
+    def __init__(self, session, interval=0.005, max_batch=500):
+        self.session = session
+        self.interval = interval
+        self.max_batch = max_batch
+        self.commits = 0
+        self._pending = []
+        self._handle = None
+
+    def submit(self, write):
+        """Queues a write.
+
+        :param write: Function applying the write to the session, which is
+            called when the batch is committed.
+
+        :return: :class:`asyncio.Future` resolved with the result of the
+            write once it has been committed.
+
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((write, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._handle is None:
+            self._handle = loop.call_later(self.interval, self.flush)
+
+        return future
+
+    def flush(self):
+        """Applies and commits all queued writes."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        # Each write is applied in its own savepoint, so that a failed write
+        # is rolled back without failing the rest of the batch.  pysqlite
+        # doesn't begin a transaction for savepoints, so the batch's
+        # transaction is begun first, otherwise each savepoint would be
+        # committed on its own when released.
+        results = []
+        try:
+            begin_write(self.session)
+            for write, future in batch:
+                try:
+                    with self.session.begin_nested():
+                        results.append((write(), None))
+                except Exception as e:
+                    log.exception("Write in a group commit failed")
+                    results.append((None, e))
+
+            self.session.commit()
+        except Exception as e:
+            log.exception("Group commit of {} writes failed", len(batch))
+            self.session.rollback()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.commits += 1
+        for (_, future), (result, error) in zip(batch, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class ApiServer(object):
+    """HTTP server exposing the API.
+
+    :param host: Address to listen on.
+    :param port: Port to listen on, or 0 to pick a free port.
+    :param commit_interval: Seconds to wait for more writes before
+        committing a batch of recorded values.
+    :param max_batch: Number of queued values that triggers a commit
+        immediately.
+
+    """
+
+    def __init__(self,
+                 host="127.0.0.1",
+                 port=8421,
+                 commit_interval=0.005,
+                 max_batch=500):
+        self.host = host
+        self.port = port
+        self.projects = Projects()
+        self.committer = GroupCommitter(Repository.db_session,
+                                        commit_interval,
+                                        max_batch)
+        self._server = None
+        self._routes = {
+            ("GET", "/projects"): self.get_projects,
+            ("GET", "/tasks"): self.get_tasks,
+            ("GET", "/totals"): self.get_totals,
+            ("GET", "/report"): self.get_report,
+            ("POST", "/record"): self.post_record
+        }
+
+    async def start(self):
+        """Starts listening for connections."""
+        self._server = await asyncio.start_server(self._handle_connection,
+                                                  self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        log.info("Listening on http://{}:{}/", self.host, self.port)
+
+    async def close(self):
+        """Stops listening and commits queued values."""
+        self._server.close()
+        await self._server.wait_closed()
+        self.committer.flush()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                status, response = await self._dispatch(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_format_response(status, response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        handler = self._routes.get((method, url.path))
+        try:
+            if handler is None:
+                if any(path == url.path for _, path in self._routes):
+                    raise ApiError(405, "Method not allowed")
+                raise ApiError(404, "Not found")
+
+            if method == "POST":
+                try:
+                    params = json.loads(body.decode("utf-8"))
+                except ValueError:
+                    raise ApiError(400, "Invalid JSON body")
+                if not isinstance(params, dict):
+                    raise ApiError(400, "Expected a JSON object")
+
+            return await handler(params)
+        except ApiError as e:
+            return e.status, dict(error=str(e))
+        except Exception as e:
+            log.exception("Exception occurred handling {} {}", method, target)
+            Repository.db_session.rollback()
+            return 500, dict(error=str(e))
+
+    async def get_projects(self, params):
+        return 200, [dict(name=p.name,
+                          organization=p.organization,
+                          qualified_name=p.qualified_name,
+                          desc=p.desc)
+                     for p in self.projects.all()]
+
+    async def get_tasks(self, params):
+        project = self._project(params)
+        return 200, [dict(name=t.name,
+                          created=_json_value(t.created),
+                          last_updated=_json_value(t.last_updated))
+                     for t in sorted(project.tasks, key=lambda t: t.name)]
+
+    async def get_totals(self, params):
+        project = self._project(params)
+        task = project.task(_param(params, "task"), create=False)
+        if not task:
+            raise ApiError(404, "No task found named '{}'".format(
+                params["task"]))
+
+        session = Repository.db_session
+        return 200, {m.name: _json_value(m.metric_type.total(m, task, session))
+                     for m in project.metrics}
+
+    async def get_report(self, params):
+        project = self._project(params)
+        period = params.get("by", "day")
+        if period not in periods:
+            raise ApiError(400, "Invalid period: " + period)
+        try:
+            since = parse_datetime(params["since"]) \
+                if "since" in params else None
+            until = parse_datetime(params["until"]) \
+                if "until" in params else None
+        except ValueError as e:
+            raise ApiError(400, str(e))
+
+        table = Reports(project).durations(period, since, until)
+        return 200, [dict(period=row,
+                          total=_json_value(table.row_total(row)),
+                          metrics={c.name: _json_value(table.cell(row, c))
+                                   for c in table.columns
+                                   if table.cell(row, c) is not None})
+                     for row in table.rows]
+
+    async def post_record(self, params):
+        project = self._project(params)
+        task_name = _param(params, "task")
+        metric = project.metric(_param(params, "metric"))
+        if not metric:
+            raise ApiError(404, "No metric found named '{}'".format(
+                params["metric"]))
+        try:
+            value = metric.metric_type.parse(str(_param(params, "value")))
+        except ParsingError as e:
+            raise ApiError(400, str(e))
+        if metric.metric_type is Number and metric.value_range is not None \
+                and value not in metric.value_range:
+            raise ApiError(400, "{} is not in the valid range of values for "
+                                "metric {}".format(value, metric.name))
+
+        def write():
+            project.task(task_name).record(metric, value)
+
+        try:
+            await self.committer.submit(write)
+        except Exception:
+            # The failed write was rolled back, so reload the project's tasks
+            # in case it created one
+            project.unpack()
+            raise
+
+        return 201, dict(project=project.qualified_name,
+                         task=task_name,
+                         metric=metric.name,
+                         value=_json_value(value))
+
+    def _project(self, params):
+        project = self.projects.get(_param(params, "project"))
+        if not project:
+            raise ApiError(404, "No project found named '{}'".format(
+                params["project"]))
+        return project
+
+
+def run(host="127.0.0.1", port=8421, commit_interval=0.005, max_batch=500):
+    """Runs the API server until it is interrupted."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = ApiServer(host, port, commit_interval, max_batch)
+    loop.run_until_complete(server.start())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+
+
+async def _read_request(reader):
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ConnectionError("Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", 0))
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _format_response(status, body, keep_alive):
+    payload = json.dumps(body).encode("utf-8")
+    head = "HTTP/1.1 {} {}\r\n" \
+           "Content-Type: application/json\r\n" \
+           "Content-Length: {}\r\n" \
+           "Connection: {}\r\n\r\n".format(status,
+                                           _reasons[status],
+                                           len(payload),
+                                           "keep-alive" if keep_alive
+                                           else "close")
+    return head.encode("latin-1") + payload
+
+
+def _param(params, name):
+    value = params.get(name)
+    if value is None or value == "":
+        raise ApiError(400, "Missing parameter: " + name)
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
@@ -0,0 +1,239 @@
+"""Module implementing cold storage of old metric data in archive data files.
+
+Each archive is a separate SQLite file next to the main data file holding
+the values recorded in a single year, for instance ``maxify-archive-2014.db``
+for a ``maxify.db`` data file.  Moving old values out of the main data file
+keeps it small, while queries that aggregate values (such as
+:meth:`maxify.metrics.Duration.total` and reports) include the archives that
+cover the period being queried.
+
+"""
+
+import glob
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import text
+
+from maxify.data import Base, ARCHIVES_KEY, to_epoch, upgrade_tables
+from maxify.metrics import Duration, Number
+from maxify.projects import Task
+from maxify.log import Logger
+
+log = Logger("archive")
+
+#: Tables stored in archive data files.  Tasks are copied to archives (rather
+#: than moved) so that archived values can be queried by project.
+archived_tables = [
+    Task.__table__,
+    Number.__table__,
+    Duration.__table__
+]
+
+_archive_name_re = re.compile(r"-archive-(?P<year>\d{4})$")
+
+
+class Archive(object):
+    """Archive data file holding the values recorded in a single year.
+
+    :param path: Path to the archive data file.
+    :param year: The year of the values stored in the archive.
+
+    """
+
+    def __init__(self, path, year):
+        self.path = path
+        self.year = year
+        self._session = None
+
+    @classmethod
+    def for_data_file(cls, data_path, year):
+        """Returns the archive for a year of a data file.
+
+        :param data_path: Path to the main data file.
+        :param year: The year of the values stored in the archive.
+
+        """
+        root, ext = os.path.splitext(data_path)
+        path = "{}-archive-{}{}".format(root, year, ext or ".db")
+        return cls(path, year)
+
+    @property
+    def session(self):
+        """Database session used to query the archive.  The archive data
+        file is opened (and created, if needed) on first use.
+        """
+        if self._session is None:
+            engine = create_engine("sqlite:///" + self.path)
+            Base.metadata.create_all(engine, tables=archived_tables)
+            upgrade_tables(engine, archived_tables)
+            self._session = sessionmaker(bind=engine)()
+
+        return self._session
+
+    def covers(self, start=None, end=None):
+        """Returns ``True`` if the archive may contain values recorded in
+        the specified range of time.
+
+        :param start: :class:`datetime.datetime` at which the range starts
+            (inclusive), or ``None`` for no lower bound.
+        :param end: :class:`datetime.datetime` at which the range ends
+            (exclusive), or ``None`` for no upper bound.
+
+        """
+        if start is not None and start >= datetime(self.year + 1, 1, 1):
+            return False
+        if end is not None and end <= datetime(self.year, 1, 1):
+            return False
+        return True
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session.bind.dispose()
+            self._session = None
+
+
+def find_archives(data_path):
+    """Returns the archives that exist for a data file.
+
+    :param data_path: Path to the main data file.
+
+    :return: ``list`` of :class:`Archive` objects ordered by year.
+
+    """
+    root, ext = os.path.splitext(data_path)
+    pattern = "{}-archive-[0-9][0-9][0-9][0-9]{}".format(glob.escape(root),
+                                                         ext or ".db")
+    archives = []
+    for path in glob.glob(pattern):
+        name, _ = os.path.splitext(path)
+        match = _archive_name_re.search(name)
+        archives.append(Archive(path, int(match.group("year"))))
+
+    return sorted(archives, key=lambda a: a.year)
+
+
+def session_archives(session, start=None, end=None):
+    """Returns the archives registered with a database session that cover a
+    range of time.
+
+    :param session: The sqlalchemy database session of the main data file.
+    :param start: Optional :class:`datetime.datetime` at which the range
+        starts (inclusive).
+    :param end: Optional :class:`datetime.datetime` at which the range ends
+        (exclusive).
+
+    :return: ``list`` of :class:`Archive` objects.
+
+    """
+    return [a for a in session.info.get(ARCHIVES_KEY, ())
+            if a.covers(start, end)]
+
+
+def archive_before(session, data_path, before):
+    """Moves values recorded before a point in time from the main data file
+    into archive data files, one per year.
+
+    The values of each year are moved in their own transaction, by attaching
+    the year's archive to the main data file's connection (SQLite can't
+    attach databases within a transaction).  If moving a year fails, the
+    years before it stay archived and the later ones stay in the main data
+    file.  Archives created in the process are registered with the session,
+    even if a later year fails.
+
+    :param session: The sqlalchemy database session of the main data file.
+    :param data_path: Path to the main data file.
+    :param before: :class:`datetime.datetime` before which values are
+        archived.
+
+    :return: ``dict`` mapping archived years to (durations, numbers) tuples
+        containing the number of values moved.
+
+    """
+    session.commit()
+
+    cutoff = to_epoch(before)
+    years = [row[0] for row in session.execute(text("""
+        SELECT CAST(strftime('%Y', epoch, 'unixepoch', 'localtime') AS INTEGER)
+            AS year
+        FROM metrics_data_durations WHERE epoch < :cutoff
+        UNION
+        SELECT CAST(strftime('%Y', epoch, 'unixepoch', 'localtime') AS INTEGER)
+        FROM metrics_data_numbers WHERE epoch < :cutoff
+        ORDER BY year
+    """), dict(cutoff=cutoff))]
+
+    archives = {a.year: a for a in session.info.get(ARCHIVES_KEY, ())}
+    moved = {}
+    try:
+        for year in years:
+            archive = archives.get(year) or \
+                Archive.for_data_file(data_path, year)
+            # Make sure the archive's tables exist before it is attached.
+            archive.session.commit()
+            archives[year] = archive
+
+            start = max(to_epoch(datetime(year, 1, 1)), 0)
+            end = min(to_epoch(datetime(year + 1, 1, 1)), cutoff)
+            moved[year] = _move(session, archive, start, end)
+            log.debug("Archived {} to {}", moved[year], archive.path)
+    finally:
+        session.info[ARCHIVES_KEY] = sorted(archives.values(),
+                                           key=lambda a: a.year)
+        session.expire_all()
+
+    return moved
+
+
+def _move(session, archive, start, end):
+    # Archived rows reference tasks and metrics that only exist in the main
+    # data file, so foreign keys can't be enforced while they are moved.
+    # Values have no dependent rows, so deleting them cascades nothing.
+    session.execute("PRAGMA foreign_keys=OFF")
+    session.execute("ATTACH DATABASE :path AS archive", dict(path=archive.path))
+    try:
+        params = dict(start=start, end=end)
+        task_columns = ", ".join(c.name for c in Task.__table__.columns)
+        session.execute(text("""
+            INSERT OR REPLACE INTO archive.tasks ({columns})
+            SELECT {columns} FROM main.tasks WHERE id IN (
+                SELECT task_id FROM main.metrics_data_durations
+                WHERE epoch >= :start AND epoch < :end
+                UNION
+                SELECT task_id FROM main.metrics_data_numbers
+                WHERE epoch >= :start AND epoch < :end)
+        """.format(columns=task_columns)), params)
+
+        counts = []
+        for table in (Duration.__table__, Number.__table__):
+            columns = ", ".join(c.name for c in table.columns)
+            counts.append(session.execute(text("""
+                INSERT OR REPLACE INTO archive.{table} ({columns})
+                SELECT {columns} FROM main.{table}
+                WHERE epoch >= :start AND epoch < :end
+            """.format(table=table.name, columns=columns)), params).rowcount)
+            session.execute(text("""
+                DELETE FROM main.{table} WHERE epoch >= :start AND epoch < :end
+            """.format(table=table.name)), params)
+
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        _detach(session)
+
+    return tuple(counts)
+
+
+def _detach(session):
+    # Depending on the connection pool, the connection that the archive was
+    # attached to may already have been closed at the end of the transaction.
+    databases = [row[1] for row in session.execute("PRAGMA database_list")]
+    if "archive" in databases:
+        session.execute("DETACH DATABASE archive")
+    session.execute("PRAGMA foreign_keys=ON")
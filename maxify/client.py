@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+"""
+Thin command line client that forwards commands to a running maxify daemon
+(see :mod:`maxify.server`).
+
+Only the standard library is imported, so that one-shot commands start as
+quickly as possible.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import sys
+
+
+class Client(object):
+    """Connection to a maxify daemon.
+
+    :param path: Path of the daemon's socket.
+    :param timeout: Seconds to wait for a response.
+
+    """
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(path)
+        self._file = self._sock.makefile("rb")
+
+    def execute(self, command, project=None, use_color=False):
+        """Executes a command with the daemon.
+
+        :param command: The command line to execute.
+        :param project: Optional name of the project to execute the command
+            against.
+        :param use_color: ``True`` to color the output.
+
+        :return: ``tuple`` of the command's output and whether it succeeded.
+
+        """
+        request = dict(command=command, project=project, color=use_color)
+        self._sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+
+        response = json.loads(line.decode("utf-8"))
+        return response["output"], response["ok"]
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maxify client that "
+                                                 "forwards commands to a "
+                                                 "running daemon")
+    parser.add_argument("-p",
+                        "--project",
+                        help="Name of project to execute the command against.")
+    parser.add_argument("-f",
+                        "--data-file",
+                        default="maxify.db",
+                        help="Path to Maxify data file served by the daemon. "
+                             "By default, this is 'maxify.db' in the current "
+                             "directory.")
+    parser.add_argument("-s",
+                        "--socket",
+                        help="Path of the daemon's socket. By default, this "
+                             "is the path to the data file followed by "
+                             "'.sock'.")
+    parser.add_argument("command",
+                        nargs=argparse.REMAINDER,
+                        help="Command to execute.")
+
+    args = parser.parse_args()
+    if not args.command:
+        parser.error("No command specified")
+
+    path = args.socket or os.path.abspath(args.data_file) + ".sock"
+    try:
+        with Client(path) as client:
+            command = " ".join(shlex.quote(arg) for arg in args.command)
+            output, ok = client.execute(command,
+                                        project=args.project,
+                                        use_color=sys.stdout.isatty())
+    except OSError as e:
+        print("Error: Unable to reach the maxify daemon at {}: {}".format(
+            path, e), file=sys.stderr)
+        sys.exit(2)
+
+    sys.stdout.write(output)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
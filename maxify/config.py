@@ -124,6 +124,7 @@ def _do_merge(project_repo, new_projects):
                                         project.organization)
         if existing_prj:
             existing_prj.desc = project.desc
+            existing_prj.retention_days = project.retention_days
             for metric in project.metrics:
                 existing_metric = existing_prj.metric(metric.name)
                 if not existing_metric:
@@ -165,7 +166,8 @@ def _load_yaml_config(path):
     for project in config[PROJECTS_KEY]:
         p = Project(name=project["name"],
                     organization=project.get("organization"),
-                    desc=project.get("desc"))
+                    desc=project.get("desc"),
+                    retention_days=project.get("retention_days"))
         for metric in project["metrics"]:
             metric_type = [m for m in metric_types
                            if m.__name__ == metric["metric_type"]]
@@ -6,27 +6,53 @@ from datetime import timedelta
 
 from decimal import Decimal
 import uuid
+import zlib
 
 from sqlalchemy import (
     create_engine,
+    Column,
+    Integer,
     Numeric,
+    String,
     Text
 )
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext import baked
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.sqltypes import Float
 from sqlalchemy.types import TypeDecorator, CHAR
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateColumn
 
 Base = declarative_base()
 
+#: Functions called with the engine each time a data file is opened, after
+#: tables have been created.  These are used for schema objects that
+#: ``create_all`` does not manage (such as triggers), so each one must be
+#: safe to run against an already initialized data file.
+schema_hooks = []
+
+#: Functions called with the engine when a data file's schema is upgraded,
+#: after its tables are brought up to date.  These remove schema objects
+#: left behind by earlier versions of the application, and are part of the
+#: :func:`schema_version`, so that each one runs once per data file.
+upgrade_hooks = []
+
+#: Cache of compiled queries, used by :mod:`sqlalchemy.ext.baked` queries for
+#: lookups that run often enough for building and compiling their query each
+#: time to show, such as those used by tab completion.
+bakery = baked.bakery()
+
+#: Key of the list of :class:`maxify.archive.Archive` objects for a data file
+#: in the ``info`` dictionary of its database session.
+ARCHIVES_KEY = "archives"
+
 #######################################
 # Utility functions
 #######################################
 
 
-def open_user_data(path, echo=False, use_static_pool=False):
+def open_user_data(path, echo=False, use_static_pool=False, busy_timeout=5.0):
     """Opens the local SQLite data store containing task data for the user.
 
     :param path: The path to the SQLite database/data file.
@@ -37,11 +63,15 @@ def open_user_data(path, echo=False, use_static_pool=False):
         same thread checks for SQLite.  This is used only for unit testing
         where a second thread might be used for not blocking user I/O
         but all writes are still performed on the same thread.
+    :param busy_timeout: Optional number of seconds that statements wait for
+        a lock held by another process (for instance, another client using
+        the same data file) before failing with "database is locked".
     """
     url = "sqlite:///" + path
-    kwargs = dict(echo=echo)
+    connect_args = dict(timeout=busy_timeout)
+    kwargs = dict(echo=echo, connect_args=connect_args)
     if use_static_pool:
-        kwargs["connect_args"] = dict(check_same_thread=False)
+        connect_args["check_same_thread"] = False
         kwargs["poolclass"] = StaticPool
 
     engine = create_engine(url, **kwargs)
@@ -53,12 +83,146 @@ def open_user_data(path, echo=False, use_static_pool=False):
     event.listen(engine, "connect", on_connect)
 
     engine.execute("pragma foreign_keys=ON")
-    Base.metadata.create_all(engine)
+
+    # Creating and upgrading tables inspects each of them, so this is
+    # skipped if the data file was last upgraded to the same schema.
+    version = schema_version()
+    if engine.execute("pragma user_version").scalar() != version:
+        Base.metadata.create_all(engine)
+        upgrade_tables(engine)
+        for hook in upgrade_hooks:
+            hook(engine)
+        engine.execute("pragma user_version={}".format(version))
+
+    for hook in schema_hooks:
+        hook(engine)
+
     session = sessionmaker()
     session.configure(bind=engine)
     return session()
 
 
+def schema_version():
+    """Returns a number identifying the tables, columns and indexes defined
+    by the application (along with its :data:`upgrade_hooks`), stored in the
+    ``user_version`` of data files once their tables are up to date.
+    """
+    schema = [(table.name,
+               [column.name for column in table.columns],
+               sorted(index.name for index in table.indexes))
+              for table in Base.metadata.sorted_tables]
+    schema.append([hook.__name__ for hook in upgrade_hooks])
+    return zlib.crc32(repr(schema).encode("utf-8")) & 0x7fffffff
+
+
+def upgrade_tables(engine, tables=None):
+    """Brings tables created by an earlier version of the application up to
+    date by adding any columns and indexes that they are missing.
+
+    Columns can provide a way to populate them for existing rows via a
+    "backfill" entry in their info dictionary: either a SQL expression, or a
+    function called with the engine once the column has been added.
+
+    :param engine: The engine of the data file to upgrade.
+    :param tables: Optional list of the tables to upgrade.  By default, all
+        tables are upgraded.
+
+    """
+    for table in tables or Base.metadata.sorted_tables:
+        existing_columns = {row[1] for row in engine.execute(
+            "PRAGMA table_info({})".format(table.name))}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+
+            engine.execute("ALTER TABLE {} ADD COLUMN {}".format(
+                table.name, CreateColumn(column).compile(engine)))
+            backfill = column.info.get("backfill")
+            if callable(backfill):
+                backfill(engine)
+            elif backfill:
+                engine.execute("UPDATE {} SET {} = {}".format(table.name,
+                                                            column.name,
+                                                            backfill))
+
+        existing_indexes = {row[1] for row in engine.execute(
+            "PRAGMA index_list({})".format(table.name))}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                index.create(engine)
+
+
+def to_epoch(value):
+    """Converts a naive :class:`datetime.datetime` in local time into the
+    number of seconds since the epoch, as stored in indexed timestamp columns.
+
+    :param value: The :class:`datetime.datetime` to convert.
+
+    :return: ``int`` number of seconds since the epoch.
+
+    """
+    return int(value.timestamp())
+
+
+def track_versions(name, *tables):
+    """Registers a data version counter that is incremented by triggers
+    every time a row in one of the specified tables is updated or deleted.
+
+    Inserts deliberately leave the version untouched: consumers that cache
+    derived data can pick up new rows incrementally using the tables'
+    ``rowid`` and only need to rebuild when the version changes.
+
+    :param name: The name of the version counter.
+    :param tables: :class:`sqlalchemy.Table` objects to track.
+
+    """
+    def create_triggers(engine):
+        engine.execute("INSERT OR IGNORE INTO data_versions (name, version) "
+                       "VALUES (?, 0)", name)
+        for table in tables:
+            for operation in ("UPDATE", "DELETE"):
+                engine.execute(
+                    "CREATE TRIGGER IF NOT EXISTS {table}_{op}_{name} "
+                    "AFTER {op} ON {table} "
+                    "BEGIN "
+                    "UPDATE data_versions SET version = version + 1 "
+                    "WHERE name = '{name}'; "
+                    "END".format(table=table.name,
+                                 op=operation.lower(),
+                                 name=name))
+
+    schema_hooks.append(create_triggers)
+
+
+def data_version(session, name):
+    """Returns the current value of a data version counter registered with
+    :func:`track_versions`.
+
+    :param session: The sqlalchemy database session used to query the
+        datastore.
+    :param name: The name of the version counter.
+
+    :return: The version as an ``int``.
+
+    """
+    return session.query(DataVersion.version).filter_by(name=name).scalar()
+
+
+#######################################
+# Tables
+#######################################
+
+
+class DataVersion(Base):
+    """Counter identifying the current version of the data stored in a group
+    of tables.  See :func:`track_versions`.
+    """
+    __tablename__ = "data_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
 #######################################
 # Type decorators
 #######################################
@@ -116,6 +280,10 @@ class GUID(TypeDecorator):
 
     def load_dialect_impl(self, dialect):
         if dialect.name == "postgresql":
+            # Imported here, since the dialect is slow to import and only
+            # needed with Postgresql
+            from sqlalchemy.dialects.postgresql import UUID
+
             return dialect.type_descriptor(UUID())
         else:
             return dialect.type_descriptor(CHAR(32))
@@ -0,0 +1,409 @@
+"""Instrumentation of the work done against the data store, used to find out
+whether the time taken by a command goes to SQL, to building ORM objects or
+to the rest of the command (such as printing its output), to detect N+1
+query patterns, and to trace the time taken by repository calls.
+
+Example::
+
+    with profile(Repository.db_session.bind) as stats:
+        interpreter.onecmd("tasks --details")
+
+    print(stats)
+
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import functools
+import inspect
+import itertools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+import warnings
+
+from sqlalchemy import event
+
+from maxify.data import Base
+
+#: Modules reported as the call site of repeated queries.
+CALL_SITE_MODULES = ("maxify.projects", "maxify.ui")
+
+
+class RepeatedQueryWarning(UserWarning):
+    """Warning issued when the same SELECT statement is executed more times
+    than allowed by a :class:`QueryDetector`.
+    """
+    pass
+
+
+class RepeatedQueryError(Exception):
+    """Error raised instead of :class:`RepeatedQueryWarning` when repeated
+    queries are not allowed, such as in unit tests.
+    """
+    pass
+
+
+class Profile(object):
+    """Measurements of the work done while profiling.
+
+    :ivar wall_time: Total number of seconds spent.
+    :ivar statements: Number of SQL statements executed.
+    :ivar sql_time: Number of seconds spent executing SQL statements.
+    :ivar rows: Number of rows fetched from the data store.
+    :ivar objects: Number of ORM objects loaded from fetched rows.
+
+    """
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.objects = 0
+
+    def __str__(self):
+        return "{:.1f} ms, {} SQL statement(s) in {:.1f} ms, {} row(s) " \
+               "fetched, {} object(s) loaded".format(self.wall_time * 1000,
+                                                     self.statements,
+                                                     self.sql_time * 1000,
+                                                     self.rows,
+                                                     self.objects)
+
+
+class Profiler(object):
+    """Collects a :class:`Profile` through SQLAlchemy events.
+
+    Statements and their duration are counted with engine events, fetched
+    rows with a row factory installed on each DBAPI cursor, and loaded
+    objects with the ORM ``load`` event of every mapped class.
+
+    :param engine: The engine whose statements are profiled.
+
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.profile = None
+        self._started = None
+
+    def start(self):
+        """Starts collecting a new profile.
+
+        :return: The :class:`Profile` being collected.
+
+        """
+        self.profile = Profile()
+        self._started = time.perf_counter()
+        event.listen(self.engine, "before_cursor_execute",
+                     self._before_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_execute)
+        event.listen(Base, "load", self._on_load, propagate=True)
+        return self.profile
+
+    def stop(self):
+        """Stops collecting the profile.
+
+        :return: The collected :class:`Profile`.
+
+        """
+        event.remove(self.engine, "before_cursor_execute",
+                     self._before_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_execute)
+        event.remove(Base, "load", self._on_load)
+        self.profile.wall_time = time.perf_counter() - self._started
+        return self.profile
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault("profile_start", []).append(time.perf_counter())
+        if getattr(cursor, "row_factory", None) is None:
+            cursor.row_factory = self._count_row
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        started = conn.info["profile_start"].pop()
+        self.profile.statements += 1
+        self.profile.sql_time += time.perf_counter() - started
+
+    def _count_row(self, cursor, row):
+        self.profile.rows += 1
+        return row
+
+    def _on_load(self, target, context):
+        self.profile.objects += 1
+
+
+@contextmanager
+def profile(engine):
+    """Context manager collecting a :class:`Profile` of the work done against
+    an engine inside the block.
+    """
+    profiler = Profiler(engine)
+    stats = profiler.start()
+    try:
+        yield stats
+    finally:
+        profiler.stop()
+
+
+def allocated_memory(func):
+    """Calls a function and measures the memory it allocated with
+    :mod:`tracemalloc`.
+
+    :param func: The function to call, which takes no arguments.
+
+    :return: ``tuple`` of the function's result and the number of bytes
+        allocated by the call that were still in use when it returned, such
+        as the memory taken by the objects it returned.
+
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+class QueryDetector(object):
+    """Detects N+1 query patterns, where the same parameterized SELECT
+    statement is executed over and over, typically by a lazy-loaded
+    relationship accessed once for each object in a loop.
+
+    Statements are fingerprinted by their SQL text, which contains
+    placeholders rather than parameter values.  When a statement is executed
+    more than ``threshold`` times, the innermost frame of one of the
+    ``modules`` on the stack is recorded as its call site.
+
+    :param engine: The engine whose statements are checked.
+    :param threshold: Number of times the same statement may be executed.
+    :param modules: Names of the modules reported as call sites.
+
+    """
+
+    def __init__(self, engine, threshold=5, modules=CALL_SITE_MODULES):
+        self.engine = engine
+        self.threshold = threshold
+        self.modules = modules
+        self.counts = Counter()
+        self.call_sites = {}
+
+    def start(self):
+        """Starts counting statements."""
+        self.counts.clear()
+        self.call_sites.clear()
+        event.listen(self.engine, "before_cursor_execute",
+                     self._before_execute)
+
+    def stop(self):
+        """Stops counting statements.
+
+        :return: ``list`` of repeated queries, see :meth:`findings`.
+
+        """
+        event.remove(self.engine, "before_cursor_execute",
+                     self._before_execute)
+        return self.findings()
+
+    def findings(self):
+        """Returns the statements executed more than ``threshold`` times.
+
+        :return: ``list`` of (statement, count, call site) tuples, where the
+            call site is a ``str`` like ``maxify/ui.py:42 in do_tasks``, or
+            ``None`` if no frame of the checked modules was on the stack.
+
+        """
+        return [(statement, count, self.call_sites.get(statement))
+                for statement, count in self.counts.most_common()
+                if count > self.threshold]
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        if not statement.lstrip()[:6].upper() == "SELECT":
+            return
+
+        fingerprint = " ".join(statement.split())
+        self.counts[fingerprint] += 1
+        if self.counts[fingerprint] == self.threshold + 1:
+            self.call_sites[fingerprint] = self._call_site()
+
+    def _call_site(self):
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_globals.get("__name__") in self.modules:
+                return "{}.py:{} in {}".format(
+                    frame.f_globals["__name__"].replace(".", "/"),
+                    frame.f_lineno,
+                    frame.f_code.co_name)
+            frame = frame.f_back
+
+        return None
+
+
+def format_finding(finding):
+    """Returns a description of a repeated query found by a
+    :class:`QueryDetector`.
+    """
+    statement, count, call_site = finding
+    if len(statement) > 100:
+        statement = statement[:97] + "..."
+
+    return "{} executed {} times from {}".format(statement,
+                                                 count,
+                                                 call_site or "unknown")
+
+
+@contextmanager
+def detect_repeated_queries(engine, threshold=5, fail=False):
+    """Context manager that checks for repeated queries executed against an
+    engine inside the block, using a :class:`QueryDetector`.
+
+    :param fail: If ``True``, raises :class:`RepeatedQueryError` when
+        repeated queries are found, instead of issuing a
+        :class:`RepeatedQueryWarning` for each of them.
+
+    """
+    detector = QueryDetector(engine, threshold)
+    detector.start()
+    try:
+        yield detector
+    finally:
+        findings = detector.stop()
+
+    messages = [format_finding(f) for f in findings]
+    if messages and fail:
+        raise RepeatedQueryError("Repeated queries:\n" + "\n".join(messages))
+
+    for message in messages:
+        warnings.warn(message, RepeatedQueryWarning, stacklevel=3)
+
+
+class Tracer(object):
+    """Writes a span for each call to a traced function to a file, with one
+    JSON object per line.
+
+    Each span has the traced function's ``name``, the ``start`` time of the
+    call in seconds since the epoch, its ``duration`` in milliseconds, the
+    ``thread`` it ran on, an ``id`` and the ``parent`` id of the span it was
+    called from (or ``null``), and the name of the ``error`` it raised, if
+    any.
+
+    :param path: Path of the file that spans are appended to.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._local = threading.local()
+
+    def wrap(self, name, func):
+        """Returns a function that calls ``func`` inside a span named
+        ``name``.
+        """
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            stack = self._stack()
+            span = dict(name=name,
+                        id=next(self._ids),
+                        parent=stack[-1] if stack else None,
+                        thread=threading.current_thread().name,
+                        start=time.time())
+            stack.append(span["id"])
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except BaseException as e:
+                span["error"] = type(e).__name__
+                raise
+            finally:
+                span["duration"] = (time.perf_counter() - started) * 1000
+                stack.pop()
+                self._write(span)
+
+        traced.__wrapped__ = func
+        return traced
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _write(self, span):
+        line = json.dumps(span, sort_keys=True) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+
+# Tracer that traced methods write to, and the original attributes of the
+# classes whose methods were replaced by traced ones.
+_tracer = None
+_patched = []
+
+
+def enable_tracing(path, classes=None):
+    """Traces calls to the public methods of classes, writing their spans to
+    a JSON-lines file with a :class:`Tracer`.
+
+    Methods are only replaced while tracing is enabled, so that calls cost
+    nothing extra otherwise.
+
+    :param path: Path of the file that spans are appended to.
+    :param classes: Classes whose methods are traced.  By default, these are
+        the repositories in :mod:`maxify.repo`.
+
+    """
+    global _tracer
+    if classes is None:
+        from maxify.repo import Repository, Projects, Reports, Tasks
+
+        classes = (Repository, Projects, Tasks, Reports)
+
+    disable_tracing()
+    _tracer = Tracer(path)
+    for cls in classes:
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_"):
+                continue
+
+            span_name = cls.__name__ + "." + name
+            if isinstance(attr, (classmethod, staticmethod)):
+                traced = type(attr)(_tracer.wrap(span_name, attr.__func__))
+            elif inspect.isfunction(attr):
+                traced = _tracer.wrap(span_name, attr)
+            else:
+                continue
+
+            _patched.append((cls, name, attr))
+            setattr(cls, name, traced)
+
+
+def disable_tracing():
+    """Restores the methods traced by :func:`enable_tracing` and closes the
+    trace file.
+    """
+    global _tracer
+    while _patched:
+        cls, name, attr = _patched.pop()
+        setattr(cls, name, attr)
+
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
@@ -1,27 +1,75 @@
 """Utility module for performing some basic setup around runtime logging.
-"""
 
-import logbook
+Logging is disabled unless :func:`enable_loggers` is called, and ``logbook``
+is only imported once it is, which keeps it out of the client's startup
+time.
+"""
 
-# Create a log group specific to the application, and control its logging
-# level individually.
-maxify_log_group = logbook.LoggerGroup(level=logbook.DEBUG)
-maxify_log_group.disabled = True
+# Loggers created so far, and the log group that controls their logging
+# level, which is only created once logging is enabled.
+_loggers = []
+_log_group = None
 
 
 def enable_loggers():
     """Enable debug logging for application components."""
-    maxify_log_group.disabled = False
+    global _log_group
+    if _log_group is not None:
+        return
+
+    import logbook
+
+    # Create a log group specific to the application, and control its
+    # logging level individually.
+    _log_group = logbook.LoggerGroup(level=logbook.DEBUG)
+    for logger in _loggers:
+        logger._enable(_log_group)
+
+
+#: Names of the methods that log a record at each level.
+_levels = ("debug", "info", "notice", "warning", "warn", "error", "exception",
+           "critical")
+
 
+def _drop(*args, **kwargs):
+    pass
 
-class Logger(logbook.Logger):
-    """Extension of the basic :class:`logbook.Logger` class that automatically
-    adds the logger to the program's logging group.
+
+class Logger(object):
+    """Application logger, which forwards records to a
+    :class:`logbook.Logger` once logging is enabled and drops them until
+    then.
+
+    While logging is disabled, the logging methods do nothing at all, so
+    arguments should be passed for formatting by the logger (as in
+    ``log.debug("Matching: {}", prefix)``) rather than formatted by the
+    caller.  Code that needs to compute arguments can check :attr:`enabled`
+    first.
 
     :param name: The name of the logger.
     :param level: The log level for the logger.
 
     """
+
+    #: Whether records are logged, rather than dropped.
+    enabled = False
+
     def __init__(self, name, level=0):
-        super(Logger, self).__init__(name, level)
-        maxify_log_group.add_logger(self)
\ No newline at end of file
+        self.name = name
+        self.level = level
+        self._logger = None
+        for method in _levels:
+            setattr(self, method, _drop)
+
+        _loggers.append(self)
+        if _log_group is not None:
+            self._enable(_log_group)
+
+    def _enable(self, log_group):
+        import logbook
+
+        self._logger = logbook.Logger(self.name, self.level)
+        log_group.add_logger(self._logger)
+        for method in _levels:
+            setattr(self, method, getattr(self._logger, method))
+        self.enabled = True
@@ -6,12 +6,6 @@ Main module for maxify command line application.
 
 import argparse
 
-import colorama
-
-from maxify.repo import Repository
-from maxify.log import enable_loggers
-from maxify.ui import MaxifyCmd
-
 
 def main():
     parser = argparse.ArgumentParser(description="Maxify programmer time "
@@ -31,21 +25,91 @@ def main():
                         "--debug",
                         action="store_true",
                         help="Print debugging statements during execution.")
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help="Print the time taken by each command, along "
+                             "with the number of SQL statements it executed, "
+                             "the time spent executing them and the number "
+                             "of rows and objects loaded.")
+    parser.add_argument("--trace",
+                        metavar="FILE",
+                        help="Append the time taken by each call to the "
+                             "repository to FILE, as one JSON object per "
+                             "line.")
+    parser.add_argument("--checkpoint-interval",
+                        type=float,
+                        default=30.0,
+                        metavar="SECONDS",
+                        help="Number of seconds between saves of the state of "
+                             "running stop watches, used to recover their "
+                             "time if the client exits unexpectedly. By "
+                             "default, this is 30 seconds.")
+    parser.add_argument("--write-behind",
+                        type=float,
+                        metavar="MS",
+                        help="Queue recorded values in memory and write them "
+                             "in batches at most this many milliseconds "
+                             "later, on a background thread. Queued values "
+                             "are written on exit, but lost if the client "
+                             "crashes.")
+    parser.add_argument("-s",
+                        "--socket",
+                        help="Path of the socket to listen on when running "
+                             "the daemon with the 'serve' command. By "
+                             "default, this is the path to the data file "
+                             "followed by '.sock'.")
+    parser.add_argument("--port",
+                        type=int,
+                        default=8421,
+                        help="Port on localhost to listen on when running the "
+                             "HTTP API with the 'api' command. By default, "
+                             "this is 8421.")
     parser.add_argument("command",
                         nargs=argparse.REMAINDER,
                         help="Optional command to execute at startup and then "
-                             "exit.")
+                             "exit, 'serve' to run a daemon that executes "
+                             "commands sent with maxify.client, or 'api' to "
+                             "run the HTTP API.")
 
     args = parser.parse_args()
 
+    # Imported once arguments are parsed, so that invalid arguments and
+    # --help don't pay for importing the application.
+    import colorama
+
+    from maxify.log import enable_loggers
+    from maxify.repo import Repository
+    from maxify.ui import MaxifyCmd
+    from maxify.utils import set_locale
+
     if args.debug:
         enable_loggers()
+    if args.trace:
+        from maxify.instrument import enable_tracing
 
+        enable_tracing(args.trace)
+
+    set_locale()
     colorama.init()
     Repository.init(args.data_file)
+    if args.write_behind:
+        Repository.enable_write_behind(args.write_behind / 1000.0)
+
+    if args.command == ["api"]:
+        from maxify.api import run
+
+        run(port=args.port)
+        return
+
+    interpreter = MaxifyCmd(checkpoint_interval=args.checkpoint_interval,
+                            profile=args.profile)
+    if args.command == ["serve"]:
+        from maxify.server import serve, socket_path_for
 
-    interpreter = MaxifyCmd()
-    interpreter.cmdloop(args)
+        interpreter.stopwatches.restore()
+        serve(args.socket or socket_path_for(args.data_file), interpreter)
+    else:
+        interpreter.cmdloop(args)
 
 
 if __name__ == "__main__":
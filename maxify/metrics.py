@@ -3,15 +3,16 @@ Module defining metrics for a project and the different types of data that
 can be stored in a metric.
 """
 
+from collections import namedtuple
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, timedelta
-import locale
-import os
 import re
 import uuid
 
 from sqlalchemy import (
+    bindparam,
     Column,
+    Integer,
     String,
     DateTime,
     Text
@@ -19,23 +20,22 @@ from sqlalchemy import (
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.schema import ForeignKey
 from sqlalchemy.sql.functions import func
-from sqlalchemy.sql.schema import PrimaryKeyConstraint
+from sqlalchemy.sql.schema import Index, PrimaryKeyConstraint
 from sqlalchemy.sql.sqltypes import PickleType
 from sqlalchemy.types import TypeDecorator
 
 from maxify.data import (
     Base,
+    ARCHIVES_KEY,
+    bakery,
     GUID,
     DecimalType,
-    IntervalType
+    IntervalType,
+    to_epoch,
+    track_versions,
+    upgrade_hooks
 )
 
-# By default, force locale-specific formatting into default locale specified
-# via the LANG environment variable.
-lang = os.environ.get("LANG")
-if lang:
-    locale.setlocale(locale.LC_ALL, lang)
-
 #######################################
 # Type decorators
 #######################################
@@ -132,6 +132,16 @@ class Metric(Base):
 #######################################
 
 
+class DataPoint(namedtuple("DataPoint",
+                           "task_id metric_id timestamp value")):
+    """Read-only copy of a recorded metric value, with the same attributes as
+    the :class:`MetricData` object it was recorded as.  Data points are
+    built straight from query results, without the instrumentation and state
+    tracking of mapped objects, for commands that only read values.
+    """
+    __slots__ = ()
+
+
 class MetricData(object):
     """Mixin for metrics data that provides the bare-minimum set of properties
     for a data value, such as the ID of its parent metric, its value, and
@@ -146,6 +156,7 @@ class MetricData(object):
 
     def __init__(self, metric, task):
         self.timestamp = datetime.now()
+        self.epoch = to_epoch(self.timestamp)
         self.metric_id = metric.id
         self.task_id = task.id
 
@@ -163,13 +174,13 @@ class MetricData(object):
     @declared_attr
     def task_id(self):
         """Column used to store reference to the task that the data value
-        belongs to.
+        belongs to.  It is indexed along with the epoch by the index of
+        each data type's table.
         """
         return Column(GUID,
                       ForeignKey("tasks.id",
                                  ondelete="cascade",
-                                 onupdate="cascade"),
-                      index=True)
+                                 onupdate="cascade"))
 
     @declared_attr
     def timestamp(self):
@@ -177,6 +188,16 @@ class MetricData(object):
         """
         return Column(DateTime)
 
+    @declared_attr
+    def epoch(self):
+        """Indexed column containing the timestamp as the number of seconds
+        since the epoch, used for querying values by time range.
+        """
+        return Column(Integer,
+                      index=True,
+                      info=dict(backfill="CAST(strftime('%s', timestamp, "
+                                         "'utc') AS INTEGER)"))
+
     @classmethod
     def display_name(cls):
         """Returns the name of the metric data type.
@@ -206,6 +227,9 @@ class Number(Base, MetricData):
     # that can be created).
     __table_args__ = (
         PrimaryKeyConstraint("metric_id", "task_id"),
+        # Finds the values of a task, optionally within a range of time, so
+        # that time range queries for a project start from its tasks.
+        Index("ix_metrics_data_numbers_task_id_epoch", "task_id", "epoch"),
         dict()
     )
 
@@ -240,8 +264,18 @@ class Number(Base, MetricData):
 
         :return: The total value of the metric.
         """
-        return session.query(Number.value)\
-            .filter_by(metric_id=metric.id, task_id=task.id).scalar()
+        value = bakery(lambda s: s.query(Number.value).filter(
+            Number.metric_id == bindparam("metric_id"),
+            Number.task_id == bindparam("task_id")))(session)\
+            .params(metric_id=metric.id, task_id=task.id).scalar()
+
+        # Fall back to archived values, most recent first
+        for archive in reversed(session.info.get(ARCHIVES_KEY, ())):
+            if value is not None:
+                break
+            value = Number.total(metric, task, archive.session)
+
+        return value
 
     @staticmethod
     def parse(value):
@@ -301,6 +335,9 @@ class Duration(Base, MetricData):
     # additional part of the primary key.
     __table_args__ = (
         PrimaryKeyConstraint("metric_id", "task_id", "id"),
+        # Finds the values of a task, optionally within a range of time, so
+        # that time range queries for a project start from its tasks.
+        Index("ix_metrics_data_durations_task_id_epoch", "task_id", "epoch"),
         dict()
     )
 
@@ -337,8 +374,18 @@ class Duration(Base, MetricData):
         :return: The total duration as a :class:`datetime.timedelta`.
 
         """
-        return session.query(func.sum(Duration.value).label("total"))\
-            .filter_by(metric_id=metric.id, task_id=task.id).scalar()
+        total = bakery(lambda s: s.query(
+            func.sum(Duration.value).label("total")).filter(
+                Duration.metric_id == bindparam("metric_id"),
+                Duration.task_id == bindparam("task_id")))(session)\
+            .params(metric_id=metric.id, task_id=task.id).scalar()
+
+        for archive in session.info.get(ARCHIVES_KEY, ()):
+            archived = Duration.total(metric, task, archive.session)
+            if archived is not None:
+                total = archived + total if total is not None else archived
+
+        return total
 
     @classmethod
     def parse(cls, value):
@@ -410,4 +457,34 @@ class Duration(Base, MetricData):
 metric_types = [
     Number,
     Duration
-]
\ No newline at end of file
+]
+
+#: Name of the data version counter tracking changes to recorded durations.
+DURATION_DATA_VERSION = "metrics_data_durations"
+
+track_versions(DURATION_DATA_VERSION, Duration.__table__)
+
+
+def _drop_metric_data_version(engine):
+    # Earlier versions kept a "metrics_data" version counter for a cache of
+    # recorded values, updated by triggers named after the counter (or
+    # suffixed with "_version" before that).
+    for table in (Number.__table__, Duration.__table__):
+        for operation in ("update", "delete"):
+            for suffix in ("version", "metrics_data"):
+                engine.execute("DROP TRIGGER IF EXISTS {}_{}_{}".format(
+                    table.name, operation, suffix))
+    engine.execute("DELETE FROM data_versions WHERE name = 'metrics_data'")
+
+
+upgrade_hooks.append(_drop_metric_data_version)
+
+
+def _drop_task_id_indexes(engine):
+    # Replaced by the indexes on the task and epoch of values, which also
+    # serve lookups by task alone.
+    for table in (Number.__table__, Duration.__table__):
+        engine.execute("DROP INDEX IF EXISTS ix_{}_task_id".format(table.name))
+
+
+upgrade_hooks.append(_drop_task_id_indexes)
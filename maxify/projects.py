@@ -1,23 +1,27 @@
 """Module defining constructs for projects and tasks
 """
 
+from collections import namedtuple
 from datetime import datetime, timedelta
 from decimal import Decimal
 import uuid
 
 from sqlalchemy import (
     Column,
+    Integer,
     String,
     DateTime
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.schema import ForeignKey
+from sqlalchemy.schema import ForeignKey, Index
+from sqlalchemy.sql import bindparam, select, text
 
 from maxify.data import (
     Base,
     GUID
 )
 from maxify.metrics import Metric, Number, Duration
+from maxify.utils import natural_sort_key
 
 
 class Project(Base):
@@ -32,6 +36,9 @@ class Project(Base):
     :param desc: Optional description of the project.
     :param metrics: List of :class:`maxify.metrics.Metric` objects defining
         metrics that can be record against tasks in this project.
+    :param retention_days: Optional number of days that individual duration
+        entries are kept for.  Older entries are combined into a single entry
+        per task, metric and day when the data file is compacted.
 
     """
     __tablename__ = "projects"
@@ -44,6 +51,7 @@ class Project(Base):
     name = Column(String(256), index=True, unique=True)
     organization = Column(String(100), index=True)
     desc = Column(String, nullable=True)
+    retention_days = Column(Integer, nullable=True)
 
     metrics = relationship(Metric,
                            cascade="all, delete, delete-orphan")
@@ -53,11 +61,13 @@ class Project(Base):
     def __init__(self,
                  name,
                  organization=None,
-                 desc=None):
+                 desc=None,
+                 retention_days=None):
         self.id = uuid.uuid4()
         self.name = name
         self.organization = organization
         self.desc = desc
+        self.retention_days = retention_days
         self._task_map = {}
         self._metrics_map = {}
 
@@ -194,6 +204,19 @@ class Project(Base):
         return organization, name
 
 
+def _backfill_sort_keys(engine):
+    # Computes the sort key of tasks stored before the column was added.
+    tasks = Task.__table__
+    keys = [dict(task_id=task_id, key=natural_sort_key(name))
+            for task_id, name
+            in engine.execute(select([tasks.c.id, tasks.c.name]))]
+    if keys:
+        engine.execute(tasks.update()
+                       .where(tasks.c.id == bindparam("task_id"))
+                       .values(sort_key=bindparam("key")),
+                       keys)
+
+
 class Task(Base):
     """Object representing a single measured task within a project.  Tasks
     contain 0 or more :class:`DataPoint` objects, one for each metric configured
@@ -209,6 +232,9 @@ class Task(Base):
     id = Column(GUID, primary_key=True)
     name = Column(String(256))
     desc = Column(String, nullable=True)
+    # Key of the name that tasks are listed in, computed with
+    # maxify.utils.natural_sort_key so that "task-2" comes before "task-10".
+    sort_key = Column(String(512), info=dict(backfill=_backfill_sort_keys))
     created = Column(DateTime)
     last_updated = Column(DateTime)
 
@@ -221,12 +247,23 @@ class Task(Base):
     duration_values = relationship(Duration,
                                    cascade="all, delete, delete-orphan")
 
+    # Tasks are looked up by project, and by name prefix (regardless of case)
+    # within a project, and listed by project in the order of their sort key.
+    __table_args__ = (
+        Index("ix_tasks_project_id_name_nocase",
+              "project_id",
+              text("name COLLATE NOCASE")),
+        Index("ix_tasks_project_id_sort_key", "project_id", "sort_key",
+              "name")
+    )
+
     def __init__(self,
                  project,
                  name):
         self.id = uuid.uuid4()
         self.project_id = project.id
         self.name = name
+        self.sort_key = natural_sort_key(name)
 
         self.created = datetime.now()
         self.last_updated = self.created
@@ -286,3 +323,26 @@ class Task(Base):
             collection = self.numeric_values
 
         return filter(lambda d: d.metric_id == metric.id, collection)
+
+
+class TaskSummary(namedtuple("TaskSummary",
+                             "id name created last_updated totals")):
+    """Read-only summary of a task, with the total value recorded for each of
+    its project's metrics.  Summaries are built straight from query results,
+    without loading the task's values, for commands that only list tasks.
+
+    The ``totals`` attribute is a ``dict`` mapping the ids of metrics to the
+    total values recorded for them.
+
+    """
+    __slots__ = ()
+
+    def value(self, metric):
+        """Returns the total value recorded for a metric, or ``None`` if no
+        value was recorded.
+
+        :param metric: The :class:`maxify.metrics.Metric` to get a total
+            value for.
+
+        """
+        return self.totals.get(metric.id)
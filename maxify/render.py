@@ -0,0 +1,125 @@
+"""Module containing utilities for rendering output to the terminal that is
+continuously updated, such as the display of a running stop watch or the
+progress of a long running command.
+
+"""
+
+from threading import Lock
+import time
+
+from termcolor import colored
+
+
+class StatusLine(object):
+    """Single line of output that is redrawn in place as its text changes.
+
+    To keep output cheap on slow terminals (for instance, over SSH or inside
+    tmux), only the characters that changed since the last frame are
+    redrawn, each frame is written with a single write, and frames are
+    throttled to a maximum rate.  Frames that arrive too quickly are
+    skipped, although the most recent one is drawn by :meth:`flush`.  When
+    the output is not a terminal, only forced frames are written.
+
+    :param stream: File-like object to write output to.
+    :param max_fps: Maximum number of frames drawn per second.
+    :param use_color: ``False`` to disable colored output.
+
+    """
+
+    def __init__(self, stream, max_fps=10, use_color=True):
+        self.stream = stream
+        self.min_interval = 1.0 / max_fps
+        self.use_color = use_color
+
+        isatty = getattr(stream, "isatty", None)
+        self.is_tty = bool(isatty and isatty())
+
+        #: Text and color of the line as currently displayed.
+        self.text = ""
+        self.color = None
+
+        self._lock = Lock()
+        self._pending = None
+        self._last_draw = None
+
+    def update(self, text, color=None, force=False):
+        """Updates the text of the line.
+
+        :param text: The new text, which must not contain tabs or newlines.
+        :param color: Optional name of the color to draw the text in.
+        :param force: ``True`` to draw the frame regardless of the frame rate
+            or whether output is a terminal, for instance because it
+            contains a change of state that must be displayed.
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            throttled = self._last_draw is not None and \
+                now - self._last_draw < self.min_interval
+            if not force and (throttled or not self.is_tty):
+                self._pending = (text, color)
+                return
+
+            self._draw(text, color)
+            self._last_draw = now
+
+    def flush(self):
+        """Draws the most recent frame, if it was skipped."""
+        with self._lock:
+            if self._pending and self.is_tty:
+                self._draw(*self._pending)
+                self._last_draw = time.monotonic()
+            self._pending = None
+
+    def clear(self):
+        """Erases the line."""
+        with self._lock:
+            self._pending = None
+            if self.text:
+                self._write("\r" + " " * len(self.text) + "\r")
+            self.text = ""
+            self.color = None
+
+    def _draw(self, text, color):
+        self._pending = None
+        if text == self.text and color == self.color:
+            return
+
+        # Redraw everything if the color changed, otherwise skip over the
+        # characters that are the same as in the previous frame.
+        if color != self.color or not self.is_tty:
+            unchanged = 0
+        else:
+            unchanged = _common_prefix_len(self.text, text)
+
+        changed = text[unchanged:]
+        padding = " " * max(len(self.text) - len(text), 0)
+
+        output = ["\r"]
+        if unchanged:
+            output.append("\x1b[{}C".format(unchanged))
+        output.append(self._colored(changed, color))
+        if padding:
+            output.append(padding)
+        output.append("\r")
+        self._write("".join(output))
+
+        self.text = text
+        self.color = color
+
+    def _colored(self, text, color):
+        if text and color and self.use_color:
+            return colored(text, color)
+        return text
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.stream.flush()
+
+
+def _common_prefix_len(a, b):
+    length = min(len(a), len(b))
+    for i in range(length):
+        if a[i] != b[i]:
+            return i
+    return length
@@ -13,14 +13,33 @@ Example: Getting a project
 
 """
 
+import atexit
 from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+import random
+import string
+import sys
+import threading
+from time import sleep
+import uuid
 
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import load_only
+from sqlalchemy import and_, bindparam, or_
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.orm import load_only, sessionmaker, subqueryload
+from sqlalchemy.sql import select, text
+from sqlalchemy.sql.functions import func
 from sqlalchemy.orm.exc import NoResultFound
 
-from maxify.data import open_user_data
-from maxify.projects import Project, Task
+from maxify.archive import archive_before, find_archives, session_archives
+from maxify.data import bakery, open_user_data, ARCHIVES_KEY, to_epoch
+from maxify.metrics import metric_types, DataPoint, Duration, Metric, Number
+from maxify.projects import Project, Task, TaskSummary
+from maxify.reports import (
+    periods,
+    refresh_rollups,
+    DailyRollup,
+    PivotTable
+)
 from maxify.log import Logger
 
 
@@ -30,11 +49,27 @@ class Repository(object):
 
     """
 
+    log = Logger("repository")
+
     #: Database session used to access data
     db_session = None
 
+    #: Path to the data store, or ``:memory:`` for an in-memory data store.
+    data_path = None
+
+    #: :class:`RecordQueue` that recorded values are written through, or
+    #: ``None`` if values are written with the session.
+    record_queue = None
+
+    #: Number of attempts made to acquire the write lock of a data store
+    #: locked by another process, and the delay in seconds before the first
+    #: retry, which doubles with each attempt up to ``max_retry_delay``.
+    write_attempts = 8
+    retry_delay = 0.05
+    max_retry_delay = 2.0
+
     @classmethod
-    def init(cls, path, test_mode=False):
+    def init(cls, path, test_mode=False, busy_timeout=5.0):
         """Initialize the repository with a path to the data store to be
         used.
 
@@ -42,9 +77,258 @@ class Repository(object):
         :param test_mode: Optional `boolean` indicating whether the repository
             is being used in a test mode (i.e. during unit tests) vs.
             normal operation mode.
+        :param busy_timeout: Optional number of seconds that statements wait
+            for a lock held by another process before failing.
+
+        """
+        cls.disable_write_behind()
+        cls.db_session = open_user_data(path,
+                                        use_static_pool=test_mode,
+                                        busy_timeout=busy_timeout)
+        cls.data_path = path
+        if path != ":memory:":
+            cls.db_session.info[ARCHIVES_KEY] = find_archives(path)
+
+    @classmethod
+    def commit(cls):
+        """Commits the session's changes, retrying with exponential backoff
+        while another process holds the data store's write lock.
+
+        The write lock is acquired before anything is written, so that a
+        failed attempt leaves the session's pending changes untouched.
+
+        """
+        session = cls.db_session
+        if session.new or session.dirty or session.deleted:
+            for attempt in range(cls.write_attempts):
+                try:
+                    begin_write(session)
+                    break
+                except OperationalError as e:
+                    if not _is_locked(e) or attempt == cls.write_attempts - 1:
+                        raise
+
+                delay = min(cls.retry_delay * 2 ** attempt,
+                            cls.max_retry_delay)
+                cls.log.debug("Data store locked, retrying in {:.2f} s",
+                              delay)
+                sleep(delay * random.uniform(0.5, 1.0))
+
+        session.commit()
+
+    @classmethod
+    def enable_write_behind(cls, interval=0.1, max_rows=500):
+        """Writes values recorded with :meth:`Tasks.record` through a
+        write-behind queue, which commits them in batches on a background
+        thread instead of with the session.
+
+        Values still queued when the process exits are written, but values
+        recorded during the last ``interval`` are lost if it crashes.
+
+        :param interval: Maximum number of seconds values are held in memory
+            before being written, which is the durability window.
+        :param max_rows: Number of queued values that triggers a write
+            immediately.
+
+        :return: The :class:`RecordQueue`.
+
+        """
+        cls.disable_write_behind()
+        cls.record_queue = RecordQueue(cls.db_session.bind, interval, max_rows)
+        cls.record_queue.start()
+        return cls.record_queue
+
+    @classmethod
+    def disable_write_behind(cls):
+        """Writes any values still queued and stops the write-behind queue.
+        """
+        if cls.record_queue is not None:
+            cls.record_queue.close()
+            cls.record_queue = None
+
+
+def begin_write(session):
+    """Begins a transaction holding the data store's write lock, unless the
+    session's connection is already in one.
+
+    pysqlite only begins a transaction before the first write, so unless
+    something was already flushed, the write lock is acquired explicitly.
+
+    """
+    if not session.connection().connection.in_transaction:
+        session.execute("BEGIN IMMEDIATE")
+
+
+def _is_locked(error):
+    return "database is locked" in str(error.orig)
+
+
+class RecordQueue(object):
+    """Write-behind queue of recorded metric values.
+
+    Values are accumulated in memory and written by a background thread,
+    with a single transaction per batch, either every ``interval`` seconds or
+    as soon as ``max_rows`` values are queued.  The thread uses its own
+    connection, so the values are not visible through objects already loaded
+    in the session until they are refreshed.
+
+    :param engine: The sqlalchemy engine of the data store.
+    :param interval: Maximum number of seconds values are held in memory.
+    :param max_rows: Number of queued values that triggers a write.
+
+    """
+
+    log = Logger("record_queue")
+
+    def __init__(self, engine, interval=0.1, max_rows=500):
+        self.engine = engine
+        self.interval = interval
+        self.max_rows = max_rows
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def __len__(self):
+        return len(self._rows)
+
+    def start(self):
+        """Starts the background thread, and makes sure queued values are
+        written when the process exits.
+        """
+        self._thread = threading.Thread(target=self._run,
+                                        name="maxify-record-queue")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, task, metric, value):
+        """Queues a value.
+
+        :param task: The :class:`maxify.projects.Task`, which must already
+            be stored.
+        :param metric: The :class:`maxify.metrics.Metric` the value is
+            recorded for.
+        :param value: The value to record.
+
+        """
+        timestamp = datetime.now()
+        row = dict(metric_id=metric.id,
+                   task_id=task.id,
+                   timestamp=timestamp,
+                   epoch=to_epoch(timestamp),
+                   value=value)
+        if metric.metric_type is Duration:
+            row["id"] = uuid.uuid4()
+
+        with self._lock:
+            self._rows.append((metric.metric_type, row))
+            full = len(self._rows) >= self.max_rows
+
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes all queued values in a single transaction.
+
+        If the transaction fails for any reason other than the data store
+        being unavailable (for instance, a value recorded for a task that has
+        since been deleted), the values are written one at a time, and those
+        that still fail are logged and dropped.
+
+        :return: The number of values written.
 
         """
-        cls.db_session = open_user_data(path, use_static_pool=test_mode)
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+
+            try:
+                with self.engine.begin() as conn:
+                    self._write(conn, rows)
+            except OperationalError:
+                # Keep the values so that they are written by the next flush
+                self.log.exception("Failed to write {} queued values",
+                                   len(rows))
+                self._requeue(rows)
+                raise
+            except Exception:
+                self.log.exception("Failed to write {} queued values, "
+                                   "writing them one at a time", len(rows))
+                return self._write_each(rows)
+
+            self.log.debug("Wrote {} queued values", len(rows))
+            return len(rows)
+
+    def _write_each(self, rows):
+        written = 0
+        for i, row in enumerate(rows):
+            try:
+                with self.engine.begin() as conn:
+                    self._write(conn, [row])
+            except OperationalError:
+                self.log.exception("Failed to write {} queued values",
+                                   len(rows) - i)
+                self._requeue(rows[i:])
+                raise
+            except Exception:
+                self.log.exception("Dropped queued value {}", row[1])
+            else:
+                written += 1
+
+        self.log.debug("Wrote {} queued values", written)
+        return written
+
+    def _write(self, conn, rows):
+        durations = [r for t, r in rows if t is Duration]
+        if durations:
+            conn.execute(Duration.__table__.insert(), durations)
+
+        # Numbers hold a single value per task and metric
+        numbers = Number.__table__
+        for row in (r for t, r in rows if t is Number):
+            updated = conn.execute(
+                numbers.update()
+                .where(numbers.c.metric_id == row["metric_id"])
+                .where(numbers.c.task_id == row["task_id"])
+                .values(value=row["value"])).rowcount
+            if not updated:
+                conn.execute(numbers.insert(), row)
+
+    def _requeue(self, rows):
+        with self._lock:
+            self._rows[:0] = rows
+
+    def close(self):
+        """Stops the background thread and writes any queued values."""
+        if self._closed:
+            return
+
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        atexit.unregister(self.close)
+        self.flush()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Already logged, and the values are retried by the next flush
+                pass
+
+
+# Folds ASCII letters to lowercase, like SQLite's NOCASE collation.
+_ascii_lowercase = str.maketrans(string.ascii_uppercase,
+                                 string.ascii_lowercase)
 
 
 class Tasks(Repository):
@@ -71,12 +355,363 @@ class Tasks(Repository):
 
         """
         self.log.debug("Matching: {}", prefix)
-        return self.db_session.query(Task)\
-            .filter(Task.project_id == self.project.id,
-                    Task.name.like(prefix + "%"))\
-            .options(load_only("id", "name"))\
+        query = bakery(lambda session: session.query(Task)
+                       .filter(Task.project_id == bindparam("project_id"))
+                       .options(load_only("id", "name")))
+        params = dict(project_id=self.project.id)
+
+        # Matched as a range of names, which (unlike LIKE) can be searched
+        # for with the index on the project and name of tasks.  Both are
+        # compared with the NOCASE collation, which only folds ASCII letters
+        # (to lowercase), so the bounds are folded the same way.
+        if prefix:
+            name = Task.name.collate("NOCASE")
+            start = prefix.translate(_ascii_lowercase)
+            query += lambda q: q.filter(name >= bindparam("start"))
+            params["start"] = start
+            if ord(start[-1]) < sys.maxunicode:
+                end = chr(ord(start[-1]) + 1)
+                # "@" is followed by uppercase letters, which NOCASE folds
+                if end == "A":
+                    end = "["
+                query += lambda q: q.filter(name < bindparam("end"))
+                params["end"] = start[:-1] + end
+
+        return query(self.db_session).params(**params).all()
+
+    def load_values(self):
+        """Loads the values recorded for all tasks in the project with one
+        query per type of value, rather than one query per task when the
+        values of each task are first accessed.
+        """
+        self.db_session.query(Task) \
+            .filter(Task.project_id == self.project.id) \
+            .options(subqueryload(Task.numeric_values),
+                     subqueryload(Task.duration_values)) \
             .all()
 
+    def record(self, task, metric, value):
+        """Records a metric's value for a task, through the write-behind
+        queue if it is enabled.  Otherwise, the value is added to the task
+        and stored when the session is next committed.
+
+        :param task: The :class:`maxify.projects.Task` to record a value for.
+        :param metric: The :class:`maxify.metrics.Metric` to record a value
+            for.
+        :param value: The value to record.
+
+        """
+        if self.record_queue is None:
+            task.record(metric, value)
+            return
+
+        if metric.metric_type is Number and metric.value_range is not None \
+                and value not in metric.value_range:
+            raise ValueError("{} is not in the valid range of "
+                             "values for metric {}".format(value, metric.name))
+
+        # Queued values reference the task, so it needs to be stored first.
+        if task in self.db_session.new:
+            self.commit()
+
+        self.record_queue.put(task, metric, value)
+
+    def between(self, start, end, metric=None):
+        """Returns values recorded for tasks in the project within a range
+        of time.
+
+        :param start: :class:`datetime.datetime` at which the range starts
+            (inclusive), or ``None`` for no lower bound.
+        :param end: :class:`datetime.datetime` at which the range ends
+            (exclusive), or ``None`` for no upper bound.
+        :param metric: Optional :class:`maxify.metrics.Metric` to return
+            values for.  By default, values for all metrics are returned.
+
+        :return: ``list`` of :class:`maxify.metrics.MetricData` objects
+            ordered by the time they were recorded.
+
+        """
+        self.log.debug("Values between {} and {}", start, end)
+        if metric:
+            data_types = [metric.metric_type]
+        else:
+            data_types = metric_types
+
+        values = []
+        for data_type in data_types:
+            query = self.db_session.query(data_type)\
+                .join(Task, Task.id == data_type.task_id)\
+                .filter(Task.project_id == self.project.id)
+            if start is not None:
+                query = query.filter(data_type.epoch >= to_epoch(start))
+            if end is not None:
+                query = query.filter(data_type.epoch < to_epoch(end))
+            if metric:
+                query = query.filter(data_type.metric_id == metric.id)
+
+            values.extend(query.all())
+
+        return sorted(values, key=lambda v: v.timestamp)
+
+    def data_points(self, start, end, metric=None):
+        """Returns values recorded for tasks in the project within a range
+        of time, like :meth:`between`, but as read-only
+        :class:`maxify.metrics.DataPoint` objects.
+
+        :return: ``list`` of :class:`maxify.metrics.DataPoint` objects
+            ordered by the time they were recorded.
+
+        """
+        self.log.debug("Data points between {} and {}", start, end)
+        if metric:
+            data_types = [metric.metric_type]
+        else:
+            data_types = metric_types
+
+        # Core queries don't flush pending changes like ORM queries do
+        self.db_session.flush()
+
+        tasks = Task.__table__
+        queries = []
+        for data_type in data_types:
+            values = data_type.__table__
+            query = select([values.c.task_id,
+                            values.c.metric_id,
+                            values.c.timestamp,
+                            values.c.value])\
+                .select_from(values.join(tasks,
+                                         tasks.c.id == values.c.task_id))\
+                .where(tasks.c.project_id == self.project.id)
+            if start is not None:
+                query = query.where(values.c.epoch >= to_epoch(start))
+            if end is not None:
+                query = query.where(values.c.epoch < to_epoch(end))
+            if metric:
+                query = query.where(values.c.metric_id == metric.id)
+            queries.append(query)
+
+        # Include values moved to archives covering the requested range
+        sessions = [self.db_session] + \
+            [a.session for a in session_archives(self.db_session, start, end)]
+        points = []
+        for session in sessions:
+            for query in queries:
+                points.extend(map(DataPoint._make, session.execute(query)))
+
+        return sorted(points, key=lambda p: p.timestamp)
+
+    def summaries(self, totals=True, pattern=None, offset=0, limit=None):
+        """Returns a read-only summary of each task in the project, in the
+        natural order of their names (so that ``task-2`` comes before
+        ``task-10``).
+
+        :param totals: ``False`` to skip computing the total value of each
+            metric for the tasks, leaving their ``totals`` empty.
+        :param pattern: Optional glob pattern that the names of the returned
+            tasks must match.
+        :param offset: Optional number of tasks to skip, used with ``limit``
+            to return a page of tasks.
+        :param limit: Optional maximum number of tasks to return.
+
+        :return: ``list`` of :class:`maxify.projects.TaskSummary` objects.
+
+        """
+        self.db_session.flush()
+        tasks = Task.__table__
+        query = self._filter(select([tasks.c.id,
+                                     tasks.c.name,
+                                     tasks.c.created,
+                                     tasks.c.last_updated]), pattern) \
+            .order_by(tasks.c.sort_key, tasks.c.name)
+        paged = offset or limit is not None
+        if paged:
+            query = query.offset(offset).limit(limit)
+
+        summaries = [TaskSummary(task_id, name, created, last_updated, {})
+                     for task_id, name, created, last_updated
+                     in self.db_session.execute(query)]
+        if not totals or not summaries:
+            return summaries
+
+        numbers = Number.__table__
+        durations = Duration.__table__
+        queries = (
+            select([numbers.c.task_id, numbers.c.metric_id, numbers.c.value])
+            .select_from(numbers.join(tasks, tasks.c.id == numbers.c.task_id)),
+            select([durations.c.task_id,
+                    durations.c.metric_id,
+                    func.sum(durations.c.value)])
+            .select_from(durations.join(tasks,
+                                        tasks.c.id == durations.c.task_id))
+            .group_by(durations.c.task_id, durations.c.metric_id)
+        )
+
+        # A page only needs the totals of its own tasks
+        by_id = {summary.id: summary for summary in summaries}
+        if paged:
+            queries = [q.where(tasks.c.id.in_(list(by_id))) for q in queries]
+        else:
+            queries = [self._filter(q, pattern) for q in queries]
+
+        # Values moved to archives count too, like in Number.total and
+        # Duration.total: the most recent number wins and durations add up.
+        archives = reversed(self.db_session.info.get(ARCHIVES_KEY, ()))
+        for session in [self.db_session] + [a.session for a in archives]:
+            for query, summed in zip(queries, (False, True)):
+                for task_id, metric_id, value in session.execute(query):
+                    # Archives may still hold values of since deleted tasks
+                    summary = by_id.get(task_id)
+                    if summary is None:
+                        continue
+                    if metric_id not in summary.totals:
+                        summary.totals[metric_id] = value
+                    elif summed:
+                        summary.totals[metric_id] += value
+
+        return summaries
+
+    def count(self, pattern=None):
+        """Returns the number of tasks in the project.
+
+        :param pattern: Optional glob pattern that the names of the counted
+            tasks must match.
+
+        """
+        self.db_session.flush()
+        tasks = Task.__table__
+        return self.db_session.execute(
+            self._filter(select([func.count(tasks.c.id)]), pattern)).scalar()
+
+    def _filter(self, query, pattern):
+        tasks = Task.__table__
+        query = query.where(tasks.c.project_id == self.project.id)
+        if pattern:
+            query = query.where(tasks.c.name.op("GLOB")(pattern))
+        return query
+
+
+class Reports(Repository):
+    """Repository used to build reports of the values recorded for tasks in
+    a project.
+
+    :param project: The :class:`maxify.projects.Project` to report on.
+
+    """
+
+    log = Logger("reports")
+
+    def __init__(self, project):
+        self.project = project
+
+    def refresh(self, rebuild=False):
+        """Brings the daily rollups that reports are computed from up to date
+        with the recorded durations.
+
+        :param rebuild: ``True`` to recompute all rollups from scratch rather
+            than only adding durations recorded since the last refresh.
+
+        """
+        if refresh_rollups(self.db_session, rebuild):
+            self.commit()
+
+    def durations(self, period, start=None, end=None):
+        """Returns the total duration recorded for each duration metric in
+        the project, broken down by period of time.
+
+        Totals are computed by a single grouped query over the daily rollups
+        of recorded durations, which are refreshed first.  If ``start`` or
+        ``end`` fall in the middle of a day, the recorded durations are
+        queried directly instead.
+
+        :param period: The period to group totals by, one of the keys of
+            :data:`maxify.reports.periods` (``day``, ``week`` or ``month``).
+        :param start: Optional :class:`datetime.datetime` at which the
+            report starts (inclusive).
+        :param end: Optional :class:`datetime.datetime` at which the report
+            ends (exclusive).
+
+        :return: :class:`maxify.reports.PivotTable` with a row per period and
+            a column per metric.
+
+        """
+        self.log.debug("Durations by {} between {} and {}", period, start, end)
+        if any(d is not None and d.time() != time() for d in (start, end)):
+            totals = self._duration_totals(self.db_session, period, start, end)
+        else:
+            self.refresh()
+            totals = self._rollup_totals(period, start, end)
+
+        # Include durations moved to archives covering the requested range
+        for archive in session_archives(self.db_session, start, end):
+            totals.extend(self._duration_totals(archive.session,
+                                                period,
+                                                start,
+                                                end))
+
+        return PivotTable.from_totals(self.project.metrics, totals)
+
+    def _rollup_totals(self, period, start, end):
+        bucket = func.strftime(periods[period], DailyRollup.day)\
+            .label("bucket")
+        query = self.db_session.query(bucket,
+                                      DailyRollup.metric_id,
+                                      func.sum(DailyRollup.total))\
+            .filter(DailyRollup.project_id == self.project.id)
+        if start is not None:
+            query = query.filter(DailyRollup.day >= start.strftime("%Y-%m-%d"))
+        if end is not None:
+            query = query.filter(DailyRollup.day < end.strftime("%Y-%m-%d"))
+
+        return query.group_by(bucket, DailyRollup.metric_id).all()
+
+    def _duration_totals(self, session, period, start, end):
+        bucket = func.strftime(periods[period],
+                               Duration.epoch,
+                               "unixepoch",
+                               "localtime").label("bucket")
+        query = session.query(bucket,
+                              Duration.metric_id,
+                              func.sum(Duration.value))\
+            .join(Task, Task.id == Duration.task_id)\
+            .filter(Task.project_id == self.project.id)
+        if start is not None:
+            query = query.filter(Duration.epoch >= to_epoch(start))
+        if end is not None:
+            query = query.filter(Duration.epoch < to_epoch(end))
+
+        return query.group_by(bucket, Duration.metric_id).all()
+
+
+# Inserts one entry per task, metric and day combining all of a project's
+# durations recorded before the cutoff, for days with more than one entry.
+_compact_insert_sql = text("""
+    INSERT INTO metrics_data_durations
+        (metric_id, task_id, id, timestamp, epoch, value)
+    SELECT d.metric_id, d.task_id, lower(hex(randomblob(16))),
+           MIN(d.timestamp), MIN(d.epoch), SUM(d.value)
+    FROM metrics_data_durations d
+    JOIN tasks t ON t.id = d.task_id
+    WHERE t.project_id = :project_id AND d.epoch < :cutoff
+    GROUP BY d.task_id, d.metric_id,
+             strftime('%Y-%m-%d', d.epoch, 'unixepoch', 'localtime')
+    HAVING COUNT(*) > 1
+""")
+
+# Deletes the entries that were combined by the insert above, which are the
+# entries that existed before it (rowid <= :last_rowid) for which a combined
+# entry now exists on the same day.
+_compact_delete_sql = text("""
+    DELETE FROM metrics_data_durations
+    WHERE rowid <= :last_rowid AND epoch < :cutoff AND EXISTS (
+        SELECT 1 FROM metrics_data_durations c
+        WHERE c.rowid > :last_rowid
+            AND c.task_id = metrics_data_durations.task_id
+            AND c.metric_id = metrics_data_durations.metric_id
+            AND strftime('%Y-%m-%d', c.epoch, 'unixepoch', 'localtime') =
+                strftime('%Y-%m-%d', metrics_data_durations.epoch,
+                         'unixepoch', 'localtime'))
+""")
+
 
 class Projects(Repository):
     """Repository for accessing projects from the internal data store.
@@ -103,13 +738,22 @@ class Projects(Repository):
         :return: The set of projects
 
         """
-        return self._unpack(self.db_session.query(Project).all())
+        return self._unpack(self._query().all())
 
     def all_named(self, *names):
-        query = self.db_session.query(Project)
+        if not names:
+            return []
+
+        conditions = []
         for organization, name in map(Project.split_qualfied_name, names):
-            query.filter_by(name=name, organization=organization)
+            if organization is None:
+                conditions.append(and_(Project.name == name,
+                                       Project.organization.is_(None)))
+            else:
+                conditions.append(and_(Project.name == name,
+                                       Project.organization == organization))
 
+        query = self._query().filter(or_(*conditions))
         return self._unpack(query.all())
 
     def matching_name(self, name):
@@ -125,7 +769,7 @@ class Projects(Repository):
          argument.
 
         """
-        self.log.debug("Finding full names matching " + name)
+        self.log.debug("Finding full names matching {}", name)
         matches = []
         for project in self.db_session.query(Project)\
                 .add_columns(Project.name, Project.organization)\
@@ -157,10 +801,21 @@ class Projects(Repository):
         if organization is None:
             organization, name = Project.split_qualfied_name(name)
 
+        # Baked, since this runs for every command naming a project.  Tasks
+        # and metrics are lazily loaded by unpack() the first time that the
+        # project is loaded, and not loaded again after that.
+        query = bakery(lambda session: session.query(Project))
+        query += lambda q: q.filter(Project.name == bindparam("name"))
+        params = dict(name=name)
+        if organization is None:
+            query += lambda q: q.filter(Project.organization.is_(None))
+        else:
+            query += lambda q: q.filter(
+                Project.organization == bindparam("organization"))
+            params["organization"] = organization
+
         try:
-            project = self.db_session.query(Project) \
-                .filter_by(name=name, organization=organization) \
-                .one()
+            project = query(self.db_session).params(**params).one()
             project.unpack()
             return project
         except NoResultFound:
@@ -173,6 +828,13 @@ class Projects(Repository):
         else:
             return organization + cls.org_separator + name
 
+    def _query(self):
+        # Tasks and metrics are loaded for all projects at once, rather than
+        # lazily one project at a time when the projects are unpacked.
+        return self.db_session.query(Project) \
+            .options(subqueryload(Project.tasks),
+                     subqueryload(Project.metrics))
+
     @staticmethod
     def _unpack(projects):
         for project in projects:
@@ -192,18 +854,174 @@ class Projects(Repository):
         project.name = project.name.lower()
         self.db_session.add(project)
         if not self.delay_save:
-            self.db_session.commit()
+            self.commit()
 
     def revert(self):
         self.db_session.rollback()
 
+    def compact(self, project, days=None):
+        """Applies a project's retention policy, combining duration entries
+        recorded more than a number of days ago into a single entry per task,
+        metric and day.  Totals for each task, metric and day are unchanged.
+
+        :param project: The :class:`maxify.projects.Project` to compact.
+        :param days: Optional number of days of individual entries to keep.
+            Defaults to the project's ``retention_days``.
+
+        :return: The number of rows removed from the data store.
+
+        """
+        days = days if days is not None else project.retention_days
+        if days is None:
+            return 0
+
+        today = datetime.combine(datetime.now().date(), time())
+        cutoff = to_epoch(today - timedelta(days=days))
+        self.log.debug("Compacting {} before {}", project.name, cutoff)
+
+        last_rowid = self.db_session.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM metrics_data_durations")\
+            .scalar()
+        inserted = self.db_session.execute(
+            _compact_insert_sql,
+            dict(project_id=project.id.hex, cutoff=cutoff)).rowcount
+        deleted = self.db_session.execute(
+            _compact_delete_sql,
+            dict(last_rowid=last_rowid, cutoff=cutoff)).rowcount
+
+        if not self.delay_save:
+            self.commit()
+
+        # Loaded duration collections no longer reflect the stored entries.
+        self.db_session.expire_all()
+        return deleted - inserted
+
+    def archive(self, before):
+        """Moves values recorded before a point in time out of the data store
+        into archive data files, one per year.  Archived values are still
+        included in totals and reports.
+
+        :param before: :class:`datetime.datetime` before which values are
+            archived.
+
+        :return: ``dict`` mapping archived years to (durations, numbers)
+            tuples containing the number of values moved.
+
+        """
+        if self.data_path == ":memory:":
+            raise ValueError("In-memory data stores cannot be archived.")
+
+        return archive_before(self.db_session, self.data_path, before)
+
+    def vacuum(self):
+        """Rebuilds the data file to release space left by deleted rows.
+
+        :return: The number of bytes that the data file shrank by.
+
+        """
+        self.db_session.commit()
+        size = self._file_size()
+        self.db_session.execute("VACUUM")
+        return size - self._file_size()
+
+    def _file_size(self):
+        page_count = self.db_session.execute("PRAGMA page_count").scalar()
+        page_size = self.db_session.execute("PRAGMA page_size").scalar()
+        return page_count * page_size
+
+    def row_counts(self):
+        """Returns the number of rows stored for each project.
+
+        :return: ``dict`` mapping project ids to ``dict`` objects with the
+            number of ``tasks``, ``metrics``, ``numbers`` and ``durations``
+            of the project.
+
+        """
+        query = self.db_session.query
+        queries = (
+            ("tasks", Task.project_id, query(Task.project_id,
+                                             func.count())),
+            ("metrics", Metric.project_id, query(Metric.project_id,
+                                                 func.count())),
+            ("numbers", Task.project_id, query(Task.project_id, func.count())
+                .join(Number, Number.task_id == Task.id)),
+            ("durations", Task.project_id, query(Task.project_id,
+                                                 func.count())
+                .join(Duration, Duration.task_id == Task.id))
+        )
+
+        counts = {}
+        for name, column, rows in queries:
+            for project_id, count in rows.group_by(column):
+                counts.setdefault(project_id, dict(tasks=0,
+                                                   metrics=0,
+                                                   numbers=0,
+                                                   durations=0))
+                counts[project_id][name] = count
+
+        return counts
+
+    def storage(self):
+        """Returns how the data file's pages are used.
+
+        :return: ``dict`` with the ``page_size`` in bytes, the number of
+            pages (``page_count``) and of unused pages (``free_pages``), and
+            ``tables``, a ``list`` of (name, pages, bytes, unused bytes)
+            tuples for each table and index ordered by size, or ``None`` if
+            SQLite was built without the ``dbstat`` virtual table.
+
+        """
+        session = self.db_session
+        stats = dict(
+            page_size=session.execute("PRAGMA page_size").scalar(),
+            page_count=session.execute("PRAGMA page_count").scalar(),
+            free_pages=session.execute("PRAGMA freelist_count").scalar(),
+            tables=None)
+        try:
+            stats["tables"] = [tuple(row) for row in session.execute(
+                "SELECT name, COUNT(*), SUM(pgsize), SUM(unused) "
+                "FROM dbstat GROUP BY name ORDER BY SUM(pgsize) DESC")]
+        except OperationalError:
+            # No such table: dbstat
+            session.rollback()
+
+        return stats
+
+    def load_copy(self, project):
+        """Loads a separate copy of a project, with all of its tasks, metrics
+        and recorded values, in a new session, which is closed before
+        returning.  This is used to find out how much memory a project takes
+        once it is fully loaded.
+
+        :param project: The :class:`maxify.projects.Project` to copy.
+
+        :return: The copy of the project.
+
+        """
+        session = sessionmaker(bind=self.db_session.bind)()
+        try:
+            tasks = subqueryload(Project.tasks)
+            copy = session.query(Project) \
+                .options(tasks.subqueryload(Task.numeric_values),
+                         tasks.subqueryload(Task.duration_values),
+                         subqueryload(Project.metrics)) \
+                .filter(Project.id == project.id) \
+                .one()
+            copy.unpack()
+            return copy
+        finally:
+            session.close()
+
     def delete(self, *projects):
         for project in projects:
             self.db_session.delete(project)
 
-        self.db_session.flush()
-        if not self.delay_save:
-            self.db_session.commit()
+        if self.delay_save:
+            # Delete before projects saved later in the same transaction,
+            # which may reuse the deleted projects' names.
+            self.db_session.flush()
+        else:
+            self.commit()
 
     @contextmanager
     def transaction(self):
@@ -212,7 +1030,7 @@ class Projects(Repository):
         self.delay_save = False
 
         try:
-            self.db_session.commit()
+            self.commit()
         except SQLAlchemyError:
             self.db_session.rollback()
             raise
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""Module containing constructs used to build time based reports of the
+values recorded for a project, including the daily rollups of recorded
+durations that reports are computed from.
+
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String
+)
+from sqlalchemy.schema import ForeignKey, Index
+from sqlalchemy.sql import text
+from sqlalchemy.sql.schema import PrimaryKeyConstraint
+
+from maxify.data import (
+    Base,
+    GUID,
+    IntervalType,
+    data_version
+)
+from maxify.metrics import DURATION_DATA_VERSION
+from maxify.log import Logger
+
+log = Logger("reports")
+
+#: Mapping of the periods that reports can be broken down by to the SQLite
+#: ``strftime`` format used to compute the bucket that a value falls into.
+periods = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m"
+}
+
+
+class DailyRollup(Base):
+    """Total duration recorded for a metric of a task on a single day.
+
+    Rollups are derived data maintained by :func:`refresh_rollups`, and are
+    used so that reports over long histories don't need to scan every
+    recorded duration.
+
+    """
+    __tablename__ = "daily_rollups"
+
+    task_id = Column(GUID, ForeignKey("tasks.id",
+                                      ondelete="cascade",
+                                      onupdate="cascade"))
+    metric_id = Column(GUID, ForeignKey("metrics.id",
+                                        ondelete="cascade",
+                                        onupdate="cascade"))
+
+    #: The day, in local time, formatted as YYYY-MM-DD.
+    day = Column(String(10))
+    project_id = Column(GUID, ForeignKey("projects.id",
+                                         ondelete="cascade",
+                                         onupdate="cascade"))
+    total = Column(IntervalType)
+    entries = Column(Integer)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("task_id", "metric_id", "day"),
+        Index("ix_daily_rollups_project_day", "project_id", "day")
+    )
+
+
+class RollupMark(Base):
+    """High-water mark recording the data that rollups have been computed
+    from: the last ``rowid`` of the ``metrics_data_durations`` table that has
+    been rolled up and the data version at the time.
+    """
+    __tablename__ = "rollup_marks"
+
+    name = Column(String(64), primary_key=True)
+    last_rowid = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=0)
+
+
+# Adds the durations with rowids in the range (:first, :last] to the daily
+# rollups.  New totals are merged with existing rollups via a left join, so
+# that no upsert support is needed from SQLite.
+_rollup_sql = text("""
+    INSERT OR REPLACE INTO daily_rollups
+        (task_id, metric_id, day, project_id, total, entries)
+    SELECT n.task_id, n.metric_id, n.day, n.project_id,
+           n.total + COALESCE(r.total, 0),
+           n.entries + COALESCE(r.entries, 0)
+    FROM (SELECT d.task_id, d.metric_id,
+                 strftime('%Y-%m-%d', d.epoch, 'unixepoch', 'localtime')
+                    AS day,
+                 t.project_id,
+                 SUM(d.value) AS total,
+                 COUNT(*) AS entries
+          FROM metrics_data_durations d
+          JOIN tasks t ON t.id = d.task_id
+          WHERE d.rowid > :first AND d.rowid <= :last
+          GROUP BY d.task_id, d.metric_id, day) n
+    LEFT JOIN daily_rollups r
+        ON r.task_id = n.task_id
+        AND r.metric_id = n.metric_id
+        AND r.day = n.day
+""")
+
+
+def refresh_rollups(session, rebuild=False):
+    """Brings the daily rollups up to date with the recorded durations.
+
+    Durations inserted since the last refresh are added to the rollups
+    incrementally.  If any recorded duration has been updated or deleted
+    since then, or if ``rebuild`` is ``True``, rollups are recomputed from
+    scratch.  Changes are flushed but not committed.
+
+    :param session: The sqlalchemy database session used to query the
+        datastore.
+    :param rebuild: ``True`` to recompute all rollups.
+
+    :return: ``True`` if rollups were changed.
+
+    """
+    version = data_version(session, DURATION_DATA_VERSION)
+    mark = session.query(RollupMark).get("daily")
+    if mark is None:
+        mark = RollupMark(name="daily", last_rowid=0, version=version)
+        session.add(mark)
+        rebuild = True
+    elif mark.version != version:
+        rebuild = True
+
+    if rebuild:
+        log.debug("Rebuilding daily rollups for version {}", version)
+        session.query(DailyRollup).delete()
+        mark.last_rowid = 0
+        mark.version = version
+
+    last_rowid = session.execute(
+        "SELECT COALESCE(MAX(rowid), 0) FROM metrics_data_durations").scalar()
+    if last_rowid <= mark.last_rowid:
+        session.flush()
+        return rebuild
+
+    session.execute(_rollup_sql, dict(first=mark.last_rowid,
+                                      last=last_rowid))
+    mark.last_rowid = last_rowid
+    session.flush()
+    return True
+
+
+class PivotTable(object):
+    """Table of duration totals with one row per time period (bucket) and one
+    column per metric.
+
+    :param rows: ``list`` of bucket names, in order.
+    :param columns: ``list`` of :class:`maxify.metrics.Metric` objects.
+    :param cells: ``dict`` mapping (bucket, metric id) tuples to the total
+        duration recorded for the metric in that period.
+
+    """
+
+    def __init__(self, rows, columns, cells):
+        self.rows = rows
+        self.columns = columns
+        self.cells = cells
+
+    @classmethod
+    def from_totals(cls, metrics, totals):
+        """Creates a table from (bucket, metric id, total) tuples, such as
+        the ones returned by a grouped SQL query.
+
+        :param metrics: ``list`` of metrics to use as table columns.
+        :param totals: Iterable of (bucket, metric id, total) tuples.
+
+        :return: The :class:`PivotTable`.
+
+        """
+        cells = {}
+        for bucket, metric_id, total in totals:
+            key = (bucket, metric_id)
+            cells[key] = cells.get(key, timedelta()) + (total or timedelta())
+
+        rows = sorted({bucket for bucket, _ in cells})
+        metric_ids = {metric_id for _, metric_id in cells}
+        columns = sorted([m for m in metrics if m.id in metric_ids],
+                         key=lambda m: m.name)
+        return cls(rows, columns, cells)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def cell(self, row, column):
+        """Returns the total for a metric in a period.
+
+        :param row: The name of the period bucket.
+        :param column: The :class:`maxify.metrics.Metric`.
+
+        :return: The total as a :class:`datetime.timedelta`, or ``None`` if
+            nothing was recorded.
+
+        """
+        return self.cells.get((row, column.id))
+
+    def row_total(self, row):
+        """Returns the total of all metrics in a period."""
+        return sum((self.cells.get((row, c.id), timedelta())
+                    for c in self.columns), timedelta())
+
+    def column_total(self, column):
+        """Returns the total of a metric across all periods."""
+        return sum((self.cells.get((r, column.id), timedelta())
+                    for r in self.rows), timedelta())
+
+
+def format_hours(value):
+    """Formats a duration as a number of hours and minutes, such as
+    ``26:30``, for display in timesheet style reports.
+
+    :param value: :class:`datetime.timedelta` to format, or ``None``.
+
+    :return: The formatted duration, or ``-`` for a ``None`` value.
+
+    """
+    if value is None:
+        return "-"
+
+    minutes = int(round(value.total_seconds() / 60))
+    return "{:d}:{:02d}".format(minutes // 60, minutes % 60)
@@ -0,0 +1,167 @@
+"""Module implementing the maxify daemon, which keeps a data file open and
+executes commands sent by clients over a Unix domain socket.
+
+Starting the command line client pays for importing its dependencies,
+opening the data file and loading projects on every invocation.  The daemon
+pays for those once, so that one-shot commands (for instance, from editor
+hooks) sent with :mod:`maxify.client` only cost a round trip over the
+socket.
+
+The protocol is line based: each request is a JSON object on a single line,
+containing the ``command`` to execute along with the optional ``project`` to
+execute it against and whether to ``color`` the output.  Each response is a
+JSON object on a single line containing the command's ``output`` and
+whether it succeeded (``ok``).
+
+"""
+
+import json
+import os
+import socket
+import socketserver
+from io import StringIO
+import sys
+
+from maxify.log import Logger
+from maxify.repo import Repository
+from maxify.ui import MaxifyCmd
+
+log = Logger("server")
+
+#: Commands that need a terminal, and so can't be executed by the daemon.
+interactive_commands = frozenset(["stopwatch"])
+
+
+def socket_path_for(data_path):
+    """Returns the default path of the socket of the daemon serving a data
+    file.
+
+    :param data_path: Path to the data file.
+
+    """
+    return os.path.abspath(data_path) + ".sock"
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Handles a client connection, executing each request it sends in turn.
+    """
+
+    def handle(self):
+        self.server.interpreter.current_project = None
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line.decode("utf-8"))
+                response = self.server.execute(request)
+            except (ValueError, KeyError) as e:
+                response = dict(output="Error: Invalid request: {}\n".format(e),
+                                ok=False)
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class CommandServer(socketserver.UnixStreamServer):
+    """Server executing commands received over a Unix domain socket with a
+    single, long-lived :class:`maxify.ui.MaxifyCmd` interpreter.
+
+    Requests are handled one at a time, since the interpreter and its
+    database session are not thread safe.
+
+    :param path: Path of the socket to listen on.
+    :param interpreter: Optional :class:`maxify.ui.MaxifyCmd` used to execute
+        commands.
+
+    """
+
+    def __init__(self, path, interpreter=None):
+        _remove_stale_socket(path)
+        socketserver.UnixStreamServer.__init__(self, path, CommandHandler)
+        self.interpreter = interpreter or MaxifyCmd(stdout=StringIO())
+        self.interpreter.interactive = False
+
+    def execute(self, request):
+        """Executes a request.
+
+        :param request: ``dict`` containing the request.
+
+        :return: ``dict`` containing the response.
+
+        """
+        command = request["command"].strip()
+        name = command.split(" ", 1)[0]
+        if name in interactive_commands:
+            return dict(output="Error: The {} command can't be used with the "
+                               "daemon\n".format(name),
+                        ok=False)
+
+        interpreter = self.interpreter
+        output = StringIO()
+        interpreter.stdout = output
+        interpreter.use_color = bool(request.get("color", False))
+        if request.get("project"):
+            interpreter.current_project = \
+                interpreter.projects.get(request["project"])
+            if not interpreter.current_project:
+                return dict(output="Error: No project found named "
+                                   "'{}'\n".format(request["project"]),
+                            ok=False)
+
+        ok = True
+        try:
+            interpreter.onecmd(command)
+        except EOFError:
+            Repository.db_session.rollback()
+            output.write("\nError: The command needs interactive input\n")
+            ok = False
+        except Exception as e:
+            log.exception("Exception occurred executing '{}'", command)
+            Repository.db_session.rollback()
+            output.write("\nError: {}\n".format(e))
+            ok = False
+
+        return dict(output=output.getvalue(), ok=ok)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(path, interpreter=None):
+    """Runs the daemon until it is interrupted.
+
+    :param path: Path of the socket to listen on.
+    :param interpreter: Optional :class:`maxify.ui.MaxifyCmd` used to execute
+        commands.
+
+    """
+    # The daemon never reads from its own terminal: commands that prompt for
+    # input fail instead of blocking every client.
+    sys.stdin = open(os.devnull)
+
+    server = CommandServer(path, interpreter)
+    log.info("Listening on {}", path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)
+    else:
+        raise OSError("A daemon is already listening on {}".format(path))
+    finally:
+        sock.close()
@@ -2,15 +2,99 @@
 to record time for a maxify task.
 """
 
+from collections import OrderedDict
 from datetime import timedelta
-from threading import Timer
+import json
+import os
+from threading import Condition, Lock, Thread
+import time
+
 from maxify.log import Logger
 
 
+class Ticker(object):
+    """Background thread that periodically invokes the ``tick`` method of
+    registered objects, such as running stop watches that refresh an output
+    display.
+
+    A single long-lived thread is shared by all stop watches and sleeps
+    while none are running.  Ticks are scheduled against a monotonic clock,
+    so that late ticks don't delay the following ones.  Ticks only drive
+    callbacks: the time recorded by a stop watch never depends on them.
+
+    :param interval: Number of seconds between ticks.
+
+    """
+
+    log = Logger("ticker")
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._watches = []
+        self._condition = Condition()
+        self._thread = None
+
+    def add(self, watch):
+        """Starts invoking the ``tick`` method of an object."""
+        with self._condition:
+            if watch not in self._watches:
+                self._watches.append(watch)
+
+            if self._thread is None:
+                self._thread = Thread(target=self._run,
+                                      name="maxify-ticker",
+                                      daemon=True)
+                self._thread.start()
+
+            self._condition.notify()
+
+    def remove(self, watch):
+        """Stops invoking the ``tick`` method of an object."""
+        with self._condition:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _run(self):
+        next_tick = None
+        while True:
+            with self._condition:
+                while not self._watches:
+                    next_tick = None
+                    self._condition.wait()
+
+                now = time.monotonic()
+                if next_tick is None:
+                    next_tick = now + self.interval
+                if now < next_tick:
+                    # Woken up early, either by a watch being added or
+                    # spuriously, so wait for the rest of the interval.
+                    self._condition.wait(next_tick - now)
+                    continue
+
+                watches = list(self._watches)
+
+            for watch in watches:
+                watch.tick()
+
+            # Skip ticks that were missed rather than firing them in a burst
+            next_tick += self.interval
+            now = time.monotonic()
+            if next_tick <= now:
+                next_tick = now + self.interval
+
+
+#: Ticker shared by all stop watches.
+ticker = Ticker(interval=1.0)
+
+
 class StopWatch(object):
     """Object used to measure a duration of time like a stop watch.
+
+    Time is measured using the difference between readings of a monotonic
+    clock taken when the stop watch is started and paused, so the total is
+    exact regardless of how often the tick callback is invoked.
+
     """
-    resolution = 1.0
 
     STATUS_RUNNING = "Running"
     STATUS_STOPPED = "Stopped"
@@ -19,18 +103,57 @@ class StopWatch(object):
 
     log = Logger("stopwatch")
 
-    def __init__(self):
-        #: Total number of seconds recorded by the stopwatch.
-        self.total_secs = 0
+    def __init__(self,
+                 name=None,
+                 metric=None,
+                 project=None,
+                 ticker=ticker,
+                 checkpoints=None,
+                 elapsed=0.0):
+        #: Optional name of the stop watch, usually the name of the task
+        #: that time is being recorded for.
+        self.name = name
+        #: Optional name of the metric that the recorded time is for.
+        self.metric = metric
+        #: Optional qualified name of the project the task belongs to.
+        self.project = project
+        #: Optional :class:`Checkpoints` that the state of the stop watch is
+        #: saved to.
+        self.checkpoints = checkpoints
         #: Boolean indicating the timer has stopped
         self.stopped = False
-        self._timer = None
-        self._status = "Stopped"
+        self._ticker = ticker
+        self._elapsed = elapsed
+        self._started_at = None
+        self._status = self.STATUS_STOPPED
         self._tick_callback = None
 
+    @property
+    def running(self):
+        """``True`` if the stop watch is currently recording time."""
+        return self._started_at is not None
+
+    @property
+    def status(self):
+        """The current status of the stop watch, such as
+        :attr:`STATUS_RUNNING`.
+        """
+        return self._status
+
+    @property
+    def total_secs(self):
+        """Total number of seconds recorded by the stopwatch."""
+        started_at = self._started_at
+        if started_at is None:
+            return self._elapsed
+
+        return self._elapsed + (time.monotonic() - started_at)
+
     def start(self, tick_callback=None):
         """Starts the stop watch.  This can either start the stop watch for
         the first time or be used to resume recording after it is paused.
+        Starting a stop watch that is already running has no effect, other
+        than replacing its tick callback.
 
         :param tick_callback: Function that will be called on each tick
             of the stopwatch.  This can be used for things like output displays.
@@ -43,25 +166,34 @@ class StopWatch(object):
             raise ValueError("Tick callback must be callable.")
 
         self._tick_callback = tick_callback
+        if not self.running:
+            self._started_at = time.monotonic()
         self._status = self.STATUS_RUNNING
-        self._timer_tick()
+        if tick_callback:
+            self._ticker.add(self)
+        else:
+            self._ticker.remove(self)
+        self._save_checkpoint()
+        self._handle_tick_callback()
 
     def stop(self):
         """Stops the stop watch.  Once stopped, the stop watch cannot be
         restarted.
         """
-        if self._timer:
-            self.pause()
+        self._pause()
         self._status = self.STATUS_STOPPED
         self.stopped = True
+        if self.checkpoints:
+            self.checkpoints.remove(self)
         self._handle_tick_callback()
 
     def pause(self):
         """Pauses the stop watch.  To restart recording, call the ``start``
         method again.
         """
+        self._pause()
         self._status = self.STATUS_PAUSED
-        self._timer.cancel()
+        self._save_checkpoint()
         self._handle_tick_callback()
 
     def reset(self):
@@ -69,9 +201,10 @@ class StopWatch(object):
         total time recorded back to 0.
 
         """
-        self.pause()
+        self._pause()
         self._status = self.STATUS_RESET
-        self.total_secs = 0
+        self._elapsed = 0.0
+        self._save_checkpoint()
         self._handle_tick_callback()
 
     @property
@@ -81,13 +214,22 @@ class StopWatch(object):
         """
         return timedelta(seconds=self.total_secs)
 
-    def _timer_tick(self):
-        if self._timer is not None:
-            self.total_secs += self.resolution
-            self._handle_tick_callback()
+    def tick(self):
+        """Invoked by the :class:`Ticker` while the stop watch is running."""
+        self._handle_tick_callback()
+
+    def _save_checkpoint(self):
+        if self.checkpoints and self.name is not None:
+            self.checkpoints.save(self)
+
+    def _pause(self):
+        started_at = self._started_at
+        if started_at is None:
+            return
 
-        self._timer = Timer(self.resolution, self._timer_tick)
-        self._timer.start()
+        self._elapsed += time.monotonic() - started_at
+        self._started_at = None
+        self._ticker.remove(self)
 
     def _handle_tick_callback(self):
         if self._tick_callback:
@@ -97,3 +239,288 @@ class StopWatch(object):
                 self.log.exception("Exception occurred in tick callback", e)
                 self._tick_callback = None
                 return
+
+
+class StopWatches(object):
+    """Collection of named stop watches, any number of which can be running
+    at the same time.
+
+    Stop watches are identified by their name together with the qualified
+    name of the project they record time for, so tasks with the same name
+    in different projects get separate stop watches.
+
+    All operations return immediately and only touch the stop watches
+    involved, so their cost doesn't depend on how many stop watches exist.
+    Running stop watches share a single :class:`Ticker` thread.
+
+    :param ticker: The :class:`Ticker` used by the stop watches.
+
+    """
+
+    def __init__(self, ticker=ticker, checkpoints=None):
+        self._ticker = ticker
+        self.checkpoints = checkpoints
+        self._watches = OrderedDict()
+        self._running = OrderedDict()
+
+    def __len__(self):
+        return len(self._watches)
+
+    def __iter__(self):
+        return iter(list(self._watches.values()))
+
+    def __contains__(self, key):
+        """Checks for a stop watch by a ``(project, name)`` tuple."""
+        return key in self._watches
+
+    def get(self, name, project=None):
+        """Returns the stop watch with the specified name and project, or
+        ``None``.
+        """
+        return self._watches.get((project, name))
+
+    @property
+    def running(self):
+        """``list`` of the stop watches that are currently running."""
+        return list(self._running.values())
+
+    def create(self, name, metric=None, project=None, elapsed=0.0):
+        """Returns the stop watch with the specified name and project,
+        creating it (not running) if it doesn't exist yet.  Accepts the same arguments as
+        :meth:`start`, as well as the time already elapsed for new stop
+        watches in seconds.
+
+        :return: The :class:`StopWatch`.
+
+        """
+        watch = self._watches.get((project, name))
+        if watch is None:
+            watch = StopWatch(name=name,
+                              metric=metric,
+                              project=project,
+                              ticker=self._ticker,
+                              checkpoints=self.checkpoints,
+                              elapsed=elapsed)
+            self._watches[(project, name)] = watch
+
+        return watch
+
+    def restore(self):
+        """Recreates the stop watches saved in the checkpoints file, paused
+        with the time they had recorded when last saved.
+
+        :return: ``list`` of the restored stop watches.
+
+        """
+        if not self.checkpoints:
+            return []
+
+        restored = []
+        for state in self.checkpoints.load():
+            if (state.get("project"), state["name"]) in self._watches:
+                continue
+
+            watch = self.create(state["name"],
+                                state.get("metric"),
+                                state.get("project"),
+                                state["elapsed"])
+            watch._status = StopWatch.STATUS_PAUSED
+            restored.append(watch)
+
+        return restored
+
+    def start(self, name, metric=None, project=None):
+        """Starts (or resumes) the stop watch with the specified name and
+        project, creating it if it doesn't exist yet.
+
+        :param name: The name of the stop watch.
+        :param metric: Optional name of the metric that time is recorded
+            for, used when the stop watch is created.
+        :param project: Optional qualified name of the project that time is
+            recorded for.
+
+        :return: The :class:`StopWatch`.
+
+        """
+        watch = self.create(name, metric, project)
+        watch.start()
+        self._running[(project, name)] = watch
+        return watch
+
+    def pause(self, name=None, project=None):
+        """Pauses the stop watch with the specified name and project, or all
+        running stop watches if no name is given.
+
+        :return: ``list`` of the stop watches that were paused.
+
+        """
+        if name is None:
+            keys = list(self._running)
+        elif (project, name) in self._running:
+            keys = [(project, name)]
+        else:
+            keys = []
+
+        paused = []
+        for key in keys:
+            watch = self._running.pop(key)
+            watch.pause()
+            paused.append(watch)
+
+        return paused
+
+    def switch(self, name, metric=None, project=None):
+        """Pauses all running stop watches and starts the one with the
+        specified name and project.  Accepts the same arguments as
+        :meth:`start`.
+
+        :return: The :class:`StopWatch` that was started.
+
+        """
+        for running_project, running_name in list(self._running):
+            if (running_project, running_name) != (project, name):
+                self.pause(running_name, running_project)
+
+        return self.start(name, metric, project)
+
+    def stop(self, name, project=None):
+        """Stops the stop watch with the specified name and project and
+        removes it from the collection.
+
+        :return: The stopped :class:`StopWatch`, or ``None`` if no stop watch
+            exists with the name and project.
+
+        """
+        watch = self._watches.pop((project, name), None)
+        if watch is None:
+            return None
+
+        self._running.pop((project, name), None)
+        watch.stop()
+        return watch
+
+
+class Checkpoints(object):
+    """Append-only file that the state of stop watches is saved to, so that
+    the time they recorded can be recovered if the application exits without
+    stopping them (for instance, if it crashes).
+
+    Each line of the file is a JSON object with the state of a stop watch
+    (its name, project, metric and elapsed seconds), written whenever the
+    stop watch changes state and every ``interval`` seconds while it is
+    running.  Stopped stop watches are removed by writing a line marking
+    them as stopped.  The file is rewritten with only the latest state of
+    each stop watch when loaded.
+
+    :param path: Path to the checkpoints file.
+    :param interval: Number of seconds between saves of running stop
+        watches.
+    :param ticker: The :class:`Ticker` that periodic saves are driven by,
+        so they are made on the first tick after each ``interval``.
+
+    """
+
+    log = Logger("checkpoints")
+
+    def __init__(self, path, interval=30.0, ticker=ticker):
+        self.path = path
+        self.interval = interval
+        self._lock = Lock()
+        self._running = []
+        self._ticker = ticker
+        self._next_save = None
+
+    @classmethod
+    def for_data_file(cls, data_path, interval=30.0):
+        """Returns the checkpoints file stored alongside a data file."""
+        return cls(data_path + ".watches", interval)
+
+    def save(self, watch):
+        """Saves the current state of a stop watch."""
+        self._write(dict(name=watch.name,
+                         project=watch.project,
+                         metric=watch.metric,
+                         elapsed=watch.total_secs))
+
+        with self._lock:
+            if watch.running and watch not in self._running:
+                self._running.append(watch)
+            elif not watch.running and watch in self._running:
+                self._running.remove(watch)
+
+            self._schedule()
+
+    def remove(self, watch):
+        """Removes a stop watch from the checkpoints."""
+        with self._lock:
+            if watch in self._running:
+                self._running.remove(watch)
+            self._schedule()
+
+        self._write(dict(name=watch.name, project=watch.project,
+                         stopped=True))
+
+    def tick(self):
+        """Invoked by the :class:`Ticker` to save running stop watches once
+        ``interval`` seconds have passed since they were last saved.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._next_save is None or now < self._next_save:
+                return
+
+            self._next_save = now + self.interval
+            watches = list(self._running)
+
+        for watch in watches:
+            self.save(watch)
+
+    def _schedule(self):
+        # Called with the lock held whenever the running stop watches change
+        if not self._running:
+            self._next_save = None
+            self._ticker.remove(self)
+        elif self._next_save is None:
+            self._next_save = time.monotonic() + self.interval
+            self._ticker.add(self)
+
+    def load(self):
+        """Returns the last saved state of each stop watch that wasn't
+        stopped, and compacts the checkpoints file.
+
+        :return: ``list`` of ``dict`` objects with the state of each stop
+            watch.
+
+        """
+        states = OrderedDict()
+        with self._lock:
+            try:
+                with open(self.path) as f:
+                    for line in f:
+                        try:
+                            state = json.loads(line)
+                        except ValueError:
+                            # Most likely the line being written when the
+                            # application exited.
+                            self.log.warning("Invalid checkpoint: {}", line)
+                            continue
+
+                        key = (state.get("project"), state["name"])
+                        states.pop(key, None)
+                        if not state.get("stopped"):
+                            states[key] = state
+            except FileNotFoundError:
+                return []
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for state in states.values():
+                    f.write(json.dumps(state) + "\n")
+            os.replace(tmp_path, self.path)
+
+        return list(states.values())
+
+    def _write(self, state):
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(state) + "\n")
@@ -3,22 +3,20 @@ Module defining user interface for the application.
 """
 
 import cmd
-import fnmatch
+from datetime import timedelta
 from io import StringIO
 import shlex
 
 from maxify.metrics import ParsingError, Duration
-from termcolor import colored
-
-from maxify.config import (
-    import_config,
-    ImportStrategy,
-    ProjectConflictError,
-    ConfigError
+from maxify.repo import Repository, Projects, Reports, Tasks
+from maxify.reports import periods, format_hours
+from maxify.stopwatch import StopWatch, StopWatches, Checkpoints
+from maxify.utils import (
+    ArgumentParser,
+    cbreak,
+    format_size,
+    parse_datetime
 )
-from maxify.repo import Projects, Tasks
-from maxify.stopwatch import StopWatch
-from maxify.utils import ArgumentParser, cbreak
 
 
 help_texts = {
@@ -55,19 +53,24 @@ print details about each one.
 
 Usage:
 
-    > tasks [--details] [PATTERN]
+    > tasks [--details] [--page N] [--page-size N] [PATTERN]
 
-The tasks command accepts the following arguments:
+Tasks are listed in the natural order of their names, so that maxify-2 comes
+before maxify-10.  The tasks command accepts the following arguments:
 
---details - Flag used to print out details on each task.
-PATTERN   - Optional name pattern to use for only displaying a subset of tasks.
-            The name pattern is a glob pattern.
+--details     - Flag used to print out details on each task.
+--page        - Optional number of the page of tasks to print, starting at 1.
+                By default, all tasks are printed.
+--page-size   - Optional number of tasks per page. By default, 25.
+PATTERN       - Optional name pattern to use for only displaying a subset of
+                tasks. The name pattern is a glob pattern.
 
 Examples:
 
     > tasks
     > tasks --details
     > tasks --details maxify-1*
+    > tasks --page 2
 
 """,
     "task": """Create or update a task associated with the current project.
@@ -87,6 +90,141 @@ Example (interactive):
     Debug Time: 20 mins
     ...
 
+""",
+    "log": """Prints values recorded for tasks in the current project within a
+range of time, along with totals for each metric.
+
+Usage:
+
+    > log [--since DATE] [--until DATE] [METRIC]
+
+The log command accepts the following arguments:
+
+--since - Only print values recorded at or after this date/time.
+--until - Only print values recorded before this date/time.
+METRIC  - Optional name of a metric to print values for.
+
+Dates are in the form YYYY-MM-DD [HH:MM[:SS]].
+
+Examples:
+
+    > log --since 2014-06-02
+    > log --since 2014-06-02 --until "2014-06-02 12:00" compile_time
+
+""",
+    "report": """Prints a timesheet of the time recorded for each duration metric in
+the current project, broken down by day, week or month.
+
+Usage:
+
+    > report [--by day|week|month] [--since DATE] [--until DATE] [--rebuild]
+
+The report command accepts the following arguments:
+
+--by      - Period to break totals down by.  Defaults to day.
+--since   - Only include time recorded at or after this date/time.
+--until   - Only include time recorded before this date/time.
+--rebuild - Recompute the daily totals that reports are built from, rather
+            than only adding time recorded since the last report.
+
+Dates are in the form YYYY-MM-DD [HH:MM[:SS]].  Totals are displayed in
+hours and minutes.
+
+Examples:
+
+    > report
+    > report --by week --since 2014-01-01
+
+""",
+    "compact": """Applies the retention policy of each project, combining duration
+entries older than the project's retention period into a single entry per
+task, metric and day, and then shrinks the data file.  Totals are not
+affected.
+
+The retention period of a project is set by the retention_days property in
+its configuration file.  Projects without a retention period are skipped,
+unless one is specified with --days.
+
+Usage:
+
+    > compact [--days DAYS]
+
+Examples:
+
+    > compact
+    > compact --days 90
+
+""",
+    "archive": """Moves values recorded before a date out of the data file into
+archive data files, one per year, stored next to the data file (for
+instance, maxify-archive-2013.db).  Archived values are still included in
+task totals and reports.
+
+Usage:
+
+    > archive --before DATE
+
+Dates are in the form YYYY-MM-DD [HH:MM[:SS]].
+
+Example:
+
+    > archive --before 2014-01-01
+
+""",
+    "watch": """Manages any number of named stop watches that record time for tasks
+in the current project while the prompt stays available for other commands.
+
+Usage:
+
+    > watch [list]
+    > watch start TASK [METRIC]
+    > watch switch TASK [METRIC]
+    > watch pause [TASK]
+    > watch stop TASK
+
+The watch command accepts the following sub-commands:
+
+list   - Print the status and time recorded by each stop watch.
+start  - Start or resume the stop watch for a task, creating it if needed.
+switch - Pause all running stop watches and start the one for a task.
+pause  - Pause the stop watch for a task, or all running stop watches.
+stop   - Stop the stop watch for a task and record its time.  If a METRIC
+         was given when the stop watch was created, the time is recorded for
+         that metric, otherwise it is assigned interactively.
+
+Examples:
+
+    > watch start maxify-1 coding_time
+    > watch switch maxify-2 debug_time
+    > watch stop maxify-1
+
+""",
+    "stats": """Prints statistics on the size of the data file, the space used by
+each table and index, the number of rows stored for each project, the number
+of objects held by the database session and the amount of memory that the
+current project takes once all of its tasks and values are loaded.
+
+Example:
+
+    > stats
+
+""",
+    "profile": """Turns profiling of commands on or off.  While profiling is on, the
+time taken by each command is printed after it, along with the number of SQL
+statements executed and the time spent executing them, the number of rows
+fetched and the number of objects loaded from them.  A warning is also
+printed for each query executed more than 5 times by the same command,
+which usually means that a relationship is lazily loaded in a loop (an N+1
+query pattern).
+
+Usage:
+
+    > profile [on|off]
+
+Example:
+
+    > profile on
+
 """
 }
 
@@ -104,13 +242,30 @@ class MaxifyCmd(cmd.Cmd):
         StopWatch.STATUS_STOPPED: "white"
     }
 
-    def __init__(self, stdin=None, stdout=None, use_color=True):
+    def __init__(self,
+                 stdin=None,
+                 stdout=None,
+                 use_color=True,
+                 checkpoint_interval=30.0,
+                 profile=False,
+                 interactive=True):
         cmd.Cmd.__init__(self, stdin=stdin, stdout=stdout)
         self.intro = "Maxify programmer time tracker client"
         self.prompt = "> "
         self.current_project = None
         self.use_color = use_color
+        self.profile = profile
+        #: ``False`` if no one can answer prompts, such as in the daemon.
+        self.interactive = interactive
         self.projects = Projects()
+
+        # Save the state of stop watches alongside the data file, so that
+        # their time can be recovered if the client exits unexpectedly.
+        checkpoints = None
+        if Repository.data_path and Repository.data_path != ":memory:":
+            checkpoints = Checkpoints.for_data_file(Repository.data_path,
+                                                    checkpoint_interval)
+        self.stopwatches = StopWatches(checkpoints=checkpoints)
         self._generate_help_funcs()
 
     def _generate_help_funcs(self):
@@ -137,6 +292,13 @@ class MaxifyCmd(cmd.Cmd):
                 self.intro = self.intro + \
                              "\n\nNo project found named '{0}'\n".format(args.project)
 
+        restored = self.stopwatches.restore()
+        if restored:
+            self.intro = self.intro + \
+                "\n\nRecovered {0} stop watch(es): {1}. Use 'watch' to " \
+                "list them.\n".format(len(restored),
+                                      ", ".join(w.name for w in restored))
+
         if args and args.command and len(args.command) > 0:
             stdin = StringIO()
             self.stdin = stdin
@@ -151,6 +313,29 @@ class MaxifyCmd(cmd.Cmd):
             self._print("\nExiting\n")
             return
 
+    def onecmd(self, line):
+        if not self.profile or not line.strip():
+            return cmd.Cmd.onecmd(self, line)
+
+        from maxify.instrument import format_finding, Profiler, QueryDetector
+
+        engine = Repository.db_session.bind
+        profiler = Profiler(engine)
+        detector = QueryDetector(engine)
+        profiler.start()
+        detector.start()
+        try:
+            stop = cmd.Cmd.onecmd(self, line)
+        finally:
+            findings = detector.stop()
+            stats = profiler.stop()
+
+        self._print("Profile: " + str(stats), "magenta", not findings)
+        for finding in findings:
+            self._warning("Repeated query: " + format_finding(finding),
+                          extra_newline=finding is findings[-1])
+        return stop
+
     def _set_current_project(self, project_name):
         self.current_project = self.projects.get(project_name)
 
@@ -170,6 +355,78 @@ class MaxifyCmd(cmd.Cmd):
         """Exit the application."""
         return True
 
+    ########################################
+    # Command - profile
+    ########################################
+
+    def do_profile(self, line):
+        """Turn profiling of commands on or off."""
+        setting = line.strip().lower()
+        if setting in ("on", "off"):
+            self.profile = setting == "on"
+        elif setting:
+            self._error("Expected 'on' or 'off'")
+            return
+
+        self._info("Profiling is " + ("on" if self.profile else "off"))
+
+    ########################################
+    # Command - stats
+    ########################################
+
+    def do_stats(self, line):
+        """Print statistics on the size of the data file and of the data
+        loaded in memory.
+        """
+        self._title("Data File")
+        storage = self.projects.storage()
+        self._print("{0} pages of {1} ({2}), {3} unused".format(
+            storage["page_count"],
+            format_size(storage["page_size"]),
+            format_size(storage["page_count"] * storage["page_size"]),
+            storage["free_pages"]))
+        if storage["tables"] is None:
+            self._warning("Space used by each table is not available",
+                          extra_newline=False)
+        else:
+            width = max(len(row[0]) for row in storage["tables"])
+            for name, pages, size, unused in storage["tables"]:
+                self._print(" * {0:{1}} {2:>6} pages {3:>10} ({4} "
+                            "unused)".format(name,
+                                             width,
+                                             pages,
+                                             format_size(size),
+                                             format_size(unused)))
+
+        self._title("Projects")
+        counts = self.projects.row_counts()
+        for project in sorted(self.projects.all(),
+                              key=lambda p: p.qualified_name):
+            project_counts = counts.get(project.id, {})
+            self._print(" * {0} - {1} tasks, {2} metrics, {3} numbers, {4} "
+                        "durations".format(project.qualified_name,
+                                           project_counts.get("tasks", 0),
+                                           project_counts.get("metrics", 0),
+                                           project_counts.get("numbers", 0),
+                                           project_counts.get("durations", 0)))
+
+        self._title("Memory")
+        identity_map = Repository.db_session.identity_map
+        self._print("{0} objects in the session".format(len(identity_map)))
+        if self.current_project:
+            from maxify.instrument import allocated_memory
+
+            project, size = allocated_memory(
+                lambda: self.projects.load_copy(self.current_project))
+            values = sum(len(t.numeric_values) + len(t.duration_values)
+                         for t in project.tasks)
+            self._print("{0} when fully loaded, with {1} tasks and {2} "
+                        "values".format(format_size(size),
+                                        len(project.tasks),
+                                        values))
+
+        self._print()
+
     ########################################
     # Command - switch
     ########################################
@@ -232,6 +489,85 @@ class MaxifyCmd(cmd.Cmd):
             desc=project.desc if project.desc else "No description provided")
         self._print(project_str)
 
+    ########################################
+    # Command - compact
+    ########################################
+
+    def do_compact(self, line):
+        """Compact duration entries according to the projects' retention
+        policies.
+        """
+        parser = ArgumentParser(stdout=self.stdout,
+                                prog="compact",
+                                add_help=False)
+        parser.add_argument("--days", type=int)
+
+        args = parser.parse_args(shlex.split(line))
+        if not args:
+            self._error("Invalid arguments")
+            return
+
+        self._title("Compact")
+        removed = 0
+        for project in self.projects.all():
+            days = args.days if args.days is not None \
+                else project.retention_days
+            if days is None:
+                continue
+
+            project_removed = self.projects.compact(project, days)
+            self._print(" * {0} - {1} rows removed (entries older than {2} "
+                        "days)".format(project.qualified_name,
+                                       project_removed,
+                                       days))
+            removed += project_removed
+
+        from maxify.render import StatusLine
+
+        status_line = StatusLine(self.stdout, use_color=self.use_color)
+        status_line.update("  Reclaiming space...")
+        reclaimed = self.projects.vacuum()
+        status_line.clear()
+
+        self._print()
+        self._success("Removed {0} rows, reclaimed {1} bytes".format(
+            removed, reclaimed))
+
+    ########################################
+    # Command - archive
+    ########################################
+
+    def do_archive(self, line):
+        """Move old values into archive data files."""
+        parser = ArgumentParser(stdout=self.stdout,
+                                prog="archive",
+                                add_help=False)
+        parser.add_argument("--before", type=parse_datetime, required=True)
+
+        args = parser.parse_args(shlex.split(line))
+        if not args:
+            self._error("Invalid arguments")
+            return
+
+        try:
+            moved = self.projects.archive(args.before)
+        except ValueError as e:
+            self._error(str(e))
+            return
+
+        self._title("Archive")
+        if not moved:
+            self._print("No values recorded before {}\n".format(args.before))
+            return
+
+        for year, (durations, numbers) in sorted(moved.items()):
+            self._print(" * {0} - {1} durations, {2} numbers".format(
+                year, durations, numbers))
+
+        self._print()
+        self._success("Archived {} values".format(
+            sum(d + n for d, n in moved.values())))
+
     ########################################
     # Command - import
     ########################################
@@ -240,6 +576,14 @@ class MaxifyCmd(cmd.Cmd):
         """Import projects from a configuration file.
 
         """
+        # Imported here, since reading configuration files needs yaml
+        from maxify.config import (
+            import_config,
+            ImportStrategy,
+            ProjectConflictError,
+            ConfigError
+        )
+
         # First, attempt an import and abort if a conflict happens
         file_path = line.strip()
         try:
@@ -326,15 +670,21 @@ class MaxifyCmd(cmd.Cmd):
                                 prog="tasks",
                                 add_help=False)
         parser.add_argument("--details", action="store_true")
+        parser.add_argument("--page", type=int)
+        parser.add_argument("--page-size", type=int, default=25)
         parser.add_argument("pattern", metavar="PATTERN", nargs="?")
 
-        args = parser.parse_args(line.split())
+        args = parser.parse_args(shlex.split(line))
         if not args:
             self._error("Invalid arguments")
             return
 
+        if (args.page is not None and args.page < 1) or args.page_size < 1:
+            self._error("Page and page size must be at least 1")
+            return
+
         details = args.details
-        pattern = args.pattern if args.pattern else "*"
+        pattern = args.pattern
 
         self._title("Tasks")
 
@@ -345,10 +695,16 @@ class MaxifyCmd(cmd.Cmd):
         max_name_len = len(max(metric_names, key=len))
         detail_fmt = "    {0:" + str(max_name_len) + "} | {1}"
 
-        for task in sorted(
-                filter(lambda t: fnmatch.fnmatch(t.name, pattern),
-                       self.current_project.tasks),
-                key=lambda t: t.name):
+        repo = Tasks(self.current_project)
+        if args.page:
+            tasks = repo.summaries(totals=details,
+                                   pattern=pattern,
+                                   offset=(args.page - 1) * args.page_size,
+                                   limit=args.page_size)
+        else:
+            tasks = repo.summaries(totals=details, pattern=pattern)
+
+        for task in tasks:
             self._info(" * " + task.name, extra_newline=False)
             if details:
                 self._print(" " + "-" * 51)
@@ -363,8 +719,147 @@ class MaxifyCmd(cmd.Cmd):
                                               task.last_updated))
                 self._print()
 
+        if args.page:
+            count = repo.count(pattern)
+            self._print()
+            pages = max(1, (count + args.page_size - 1) // args.page_size)
+            self._print("Page {0} of {1} ({2} tasks)".format(args.page,
+                                                             pages,
+                                                             count))
+
+        self._print()
+
+    ########################################
+    # Command - log
+    ########################################
+
+    def do_log(self, line):
+        """Print out values recorded for the current project within a range
+        of time.
+        """
+        if not self.current_project:
+            self._error("Please select a project first using the 'switch' "
+                        "command")
+            return
+
+        parser = ArgumentParser(stdout=self.stdout,
+                                prog="log",
+                                add_help=False)
+        parser.add_argument("--since", type=parse_datetime)
+        parser.add_argument("--until", type=parse_datetime)
+        parser.add_argument("metric", metavar="METRIC", nargs="?")
+
+        args = parser.parse_args(shlex.split(line))
+        if not args:
+            self._error("Invalid arguments")
+            return
+
+        metric = None
+        if args.metric:
+            metric = self.current_project.metric(args.metric)
+            if not metric:
+                self._error("Invalid metric: " + args.metric)
+                return
+
+        values = Tasks(self.current_project).data_points(args.since,
+                                                         args.until,
+                                                         metric)
+
+        # Archives keep the values of tasks and metrics deleted since, which
+        # can't be shown
+        tasks = {t.id: t for t in self.current_project.tasks}
+        metrics = {m.id: m for m in self.current_project.metrics}
+        values = [v for v in values
+                  if v.task_id in tasks and v.metric_id in metrics]
+
+        self._title("Log")
+        if not values:
+            self._print("No values recorded\n")
+            return
+
+        task_name_len = len(max((tasks[v.task_id].name for v in values),
+                                key=len))
+        metric_name_len = len(max((metrics[v.metric_id].name
+                                   for v in values), key=len))
+        row_fmt = "  {0:%Y-%m-%d %H:%M}  {1:" + str(task_name_len) + \
+                  "}  {2:" + str(metric_name_len) + "}  {3}"
+
+        totals = {}
+        for value in values:
+            metric = metrics[value.metric_id]
+            self._print(row_fmt.format(value.timestamp,
+                                       tasks[value.task_id].name,
+                                       metric.name,
+                                       metric.metric_type.to_str(value.value)))
+            if metric.metric_type is Duration:
+                totals[metric] = totals.get(metric, timedelta()) + value.value
+
+        if totals:
+            self._title("Totals")
+            for metric in sorted(totals, key=lambda m: m.name):
+                self._print(" * {0}: {1}".format(
+                    metric.name, Duration.to_str(totals[metric])))
+
         self._print()
 
+    ########################################
+    # Command - report
+    ########################################
+
+    def do_report(self, line):
+        """Print out a timesheet for the current project."""
+        if not self.current_project:
+            self._error("Please select a project first using the 'switch' "
+                        "command")
+            return
+
+        parser = ArgumentParser(stdout=self.stdout,
+                                prog="report",
+                                add_help=False)
+        parser.add_argument("--by", choices=sorted(periods), default="day")
+        parser.add_argument("--since", type=parse_datetime)
+        parser.add_argument("--until", type=parse_datetime)
+        parser.add_argument("--rebuild", action="store_true")
+
+        args = parser.parse_args(shlex.split(line))
+        if not args:
+            self._error("Invalid arguments")
+            return
+
+        reports = Reports(self.current_project)
+        if args.rebuild:
+            reports.refresh(rebuild=True)
+
+        table = reports.durations(args.by, args.since, args.until)
+        self._title("Report by " + args.by)
+        if not len(table):
+            self._print("No time recorded\n")
+            return
+
+        # Build the whole table before writing it, so that it is output
+        # with a single write regardless of its size.
+        header = [args.by.capitalize()] + \
+            [c.name for c in table.columns] + ["Total"]
+        rows = [[row] +
+                [format_hours(table.cell(row, c)) for c in table.columns] +
+                [format_hours(table.row_total(row))]
+                for row in table.rows]
+        footer = ["Total"] + \
+            [format_hours(table.column_total(c)) for c in table.columns] + \
+            [format_hours(sum((table.row_total(r) for r in table.rows),
+                              timedelta()))]
+
+        widths = [max(len(r[i]) for r in [header, footer] + rows)
+                  for i in range(len(header))]
+        row_fmt = "  ".join("{:>" + str(w) + "}" for w in widths)
+        separator = "  ".join("-" * w for w in widths)
+
+        lines = [row_fmt.format(*header), separator]
+        lines.extend(row_fmt.format(*row) for row in rows)
+        lines.append(separator)
+        lines.append(row_fmt.format(*footer))
+        self.stdout.write("".join("  " + l + "\n" for l in lines) + "\n")
+
     ########################################
     # Command - task
     ########################################
@@ -423,9 +918,10 @@ class MaxifyCmd(cmd.Cmd):
             metrics.append((metric, value))
 
         task = self.current_project.task(task_name)
+        tasks = Tasks(self.current_project)
         for metric, value in metrics:
             try:
-                task.record(metric, value)
+                tasks.record(task, metric, value)
             except ValueError as e:
                 self._error(str(e))
                 self.projects.revert()
@@ -460,7 +956,7 @@ class MaxifyCmd(cmd.Cmd):
         parser.add_argument("task", metavar="TASK")
         parser.add_argument("metric", metavar="METRIC", nargs="?")
 
-        args = parser.parse_args(line.split())
+        args = parser.parse_args(shlex.split(line))
         if not args.task:
             self._print()
             self._error("Invalid arguments")
@@ -483,11 +979,16 @@ class MaxifyCmd(cmd.Cmd):
         # Create a stop watch and UI
         self._print("\n  (R)eset | (S)tart | (P)ause | S(t)op\n")
 
-        self.stdout.write("  Stopped\t--:--:--\r")
-        self.stdout.flush()
+        from maxify.render import StatusLine
+
+        self._status_line = StatusLine(self.stdout, use_color=self.use_color)
+        self._status_line.update("  Stopped  --:--:--", force=True)
 
         stopwatch_active = True
-        stopwatch = StopWatch()
+        stopwatch = self.stopwatches.create(
+            task.name,
+            metric.name if metric else None,
+            self.current_project.qualified_name)
         with cbreak():
             while stopwatch_active:
                 user_input_int = ord(self.stdin.read(1))
@@ -500,30 +1001,140 @@ class MaxifyCmd(cmd.Cmd):
                     elif user_input == 'R':
                         stopwatch.reset()
                     elif user_input == "T":
-                        stopwatch.stop()
+                        stopwatch.pause()
                         stopwatch_active = False
 
-        # At this point, stopwatch has been stopped, so now attempt to assign
-        # its total duration to the task.
+        self._status_line.flush()
+        self._print()
+
+        # At this point, stopwatch has been paused, so now attempt to assign
+        # its total duration to the task.  It is only stopped once the time
+        # is saved, so that its checkpoint survives a failure.
         if metric:
             self._assign_time(task, metric, stopwatch.total)
         else:
             self._assign_time_interactive(task, stopwatch.total)
 
         self.projects.save(self.current_project)
+        self.stopwatches.stop(stopwatch.name, stopwatch.project)
+
+    ########################################
+    # Command - watch
+    ########################################
+
+    def do_watch(self, line):
+        """Manage stop watches that run in the background."""
+        tokens = shlex.split(line)
+        command = tokens[0] if tokens else "list"
+        args = tokens[1:]
+
+        if command == "list" and not args:
+            self._print_watches()
+        elif command in ("start", "switch") and 1 <= len(args) <= 2:
+            self._start_watch(command, *args)
+        elif command == "pause" and len(args) <= 1:
+            project = self.current_project
+            paused = self.stopwatches.pause(
+                *args, project=project.qualified_name if project else None)
+            if not paused:
+                self._error("No running stop watch found")
+            for watch in paused:
+                self._success("Paused '{}' at {}".format(watch.name,
+                                                         watch.total))
+        elif command == "stop" and len(args) == 1:
+            self._stop_watch(args[0])
+        else:
+            self._error("Invalid arguments.\nUsage: watch [list|start|switch|"
+                        "pause|stop] [TASK] [METRIC]")
+
+    def _start_watch(self, command, task_name, metric_name=None):
+        if not self.current_project:
+            self._error("Please select a project first using the 'switch' "
+                        "command")
+            return
+
+        if not self.current_project.task(task_name, create=False):
+            self._error("Task {} does not exist.".format(task_name))
+            return
+
+        if metric_name and not self.current_project.metric(metric_name):
+            self._error("Metric {} does not exist.".format(metric_name))
+            return
+
+        if command == "switch":
+            start = self.stopwatches.switch
+        else:
+            start = self.stopwatches.start
+
+        watch = start(task_name,
+                      metric_name,
+                      self.current_project.qualified_name)
+        self._success("Started '{}' at {}".format(watch.name, watch.total))
+
+    def _stop_watch(self, task_name):
+        project = self.current_project
+        if not project:
+            self._error("Please select a project first using the 'switch' "
+                        "command")
+            return
+
+        watch = self.stopwatches.get(task_name, project.qualified_name)
+        if not watch:
+            self._error("No stop watch found for task " + task_name)
+            return
+
+        task = project.task(watch.name, create=False)
+        if not task:
+            self._error("Task {} no longer exists.".format(watch.name))
+            return
+
+        metric = project.metric(watch.metric) if watch.metric else None
+        if not metric and not self.interactive:
+            self._error("Stop watch for task {} has no metric, so its time "
+                        "can only be assigned from an interactive "
+                        "session.".format(watch.name))
+            return
+
+        # The stop watch and its checkpoint are only removed once its time
+        # is saved, so that the time isn't lost if assigning it fails.
+        self.stopwatches.pause(task_name, watch.project)
+        if metric:
+            self._assign_time(task, metric, watch.total)
+        else:
+            self._assign_time_interactive(task, watch.total, project)
+
+        self.projects.save(project)
+        self.stopwatches.stop(task_name, watch.project)
+
+    def _print_watches(self):
+        self._title("Stop Watches")
+        if not len(self.stopwatches):
+            self._print("No stop watches\n")
+            return
+
+        for watch in self.stopwatches:
+            self._print(" * {0:7}  {1}  {2}{3}{4}".format(
+                watch.status,
+                watch.total,
+                watch.name,
+                " (" + watch.metric + ")" if watch.metric else "",
+                " [" + watch.project + "]" if watch.project else ""))
+
+        self._print()
 
     def _assign_time(self, task, metric, total):
         task.record(metric, total)
         self._print('  \n\n  Added {} to "{}"\n'.format(total, metric.name))
 
-    def _assign_time_interactive(self, task, total):
+    def _assign_time_interactive(self, task, total, project=None):
+        project = project or self.current_project
         self._title("\n\nAssign Time")
         self._print("The stop watch recorded {}. Assign that time to the "
                     "metrics in this task:\n\n".format(total))
 
         remainder = total
         duration_metrics = filter(lambda m: m.metric_type is Duration,
-                                  self.current_project.metrics)
+                                  project.metrics)
         for metric in sorted(duration_metrics, key=lambda m: m.name):
             parsed_val = None
             while parsed_val is None:
@@ -559,10 +1170,14 @@ class MaxifyCmd(cmd.Cmd):
         :param status: The current stopwatch status as a string.
 
         """
-        self.stdout.write(" " * 80 + "\r")
-        self.stdout.write(colored("  {:7}\t{}\r".format(status, total),
-                                  self._stopwatch_status_colors[status]))
-        self.stdout.flush()
+        # Ticks of a running stop watch may be dropped to limit the refresh
+        # rate, but changes of its status are always displayed.
+        color = self._stopwatch_status_colors[status]
+        total = timedelta(seconds=int(total.total_seconds()))
+        self._status_line.update("  {:7}  {}".format(status, total),
+                                 color,
+                                 force=(status != StopWatch.STATUS_RUNNING or
+                                        color != self._status_line.color))
 
     def complete_stopwatch(self, text, line, beginx, endidx):
         """Provides support for auto-complete of task name in stopwatch command.
@@ -599,6 +1214,8 @@ class MaxifyCmd(cmd.Cmd):
 
     def _print(self, msg=None, color=None, extra_newline=False):
         if msg and color and self.use_color:
+            from termcolor import colored
+
             msg = colored(msg, color)
 
         if not msg:
@@ -4,7 +4,8 @@
 
 import argparse
 from contextlib import contextmanager
-from functools import partial
+from datetime import datetime
+import locale
 import re
 import os
 import sys
@@ -21,7 +22,7 @@ def sorted_naturally(l, key=None, reverse=False):
 
         >>> values = ["A 1", "A 10", "A 2", "b"]
         >>> print(sorted_naturally(values))
-        ... ["A 1", "A 2", "A 10", "b"]
+        ['A 1', 'A 2', 'A 10', 'b']
 
     :param list l: List of objects to sort.
     :param function key: Optional function to return key by which to sort values
@@ -34,21 +35,94 @@ def sorted_naturally(l, key=None, reverse=False):
 
     """
     if key:
-        key_func = partial(_alphanum_key, prop_getter=key)
+        key_func = lambda v: natural_sort_key(key(v))
     else:
-        key_func = _alphanum_key
+        key_func = natural_sort_key
 
     return sorted(l, key=key_func, reverse=reverse)
 
 
-def _convert_if_numeric(s):
-    return int(s) if s.isdigit() else s.lower()
+def natural_sort_key(s):
+    """Returns a string that sorts in the natural order of the specified
+    string when compared with the keys of other strings, so that keys can be
+    stored and compared by a database.  Letters are compared regardless of
+    case, and numbers by their value, by prefixing each number with its
+    number of digits.
 
+    Example:
+
+        >>> natural_sort_key("Task 10")
+        'task 0210'
+
+    :param s: The string to return a key for.
+
+    :return: The sort key as a ``str``.
+
+    """
+    def number(match):
+        digits = match.group(0).lstrip("0") or "0"
+        return "{0:02d}{1}".format(len(digits), digits)
+
+    return _number_re.sub(number, s.lower())
+
+
+#: Formats accepted by :func:`parse_datetime`.
+datetime_formats = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d"
+)
+
+
+def set_locale():
+    """Uses the locale specified via the LANG environment variable for
+    locale-specific formatting (for instance, of numbers).  Called on startup
+    rather than on import, since it is relatively slow.
+    """
+    lang = os.environ.get("LANG")
+    if lang:
+        locale.setlocale(locale.LC_ALL, lang)
+
+
+def format_size(size):
+    """Formats a number of bytes for display, such as ``1.5 MiB``.
+
+    :param size: The number of bytes.
+
+    :return: The formatted size as a ``str``.
+
+    """
+    for unit in ("bytes", "KiB", "MiB"):
+        if abs(size) < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = "GiB"
+
+    return "{0} {1}".format(size, unit) if unit == "bytes" \
+        else "{0:.1f} {1}".format(size, unit)
+
+
+def parse_datetime(value):
+    """Parses a date or date and time entered by the user, such as
+    ``2014-06-01`` or ``2014-06-01 13:30``.
+
+    :param value: :class:`str` containing the value to parse.
+
+    :return: The parsed :class:`datetime.datetime`.
+
+    :raises ValueError: If the value does not match any of the supported
+        formats.
+
+    """
+    for fmt in datetime_formats:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            pass
 
-def _alphanum_key(s, prop_getter=None):
-    if prop_getter is not None:
-        s = prop_getter(s)
-    return [_convert_if_numeric(c) for c in _number_re.split(s)]
+    raise ValueError("Invalid date: {}. Dates must be in the form "
+                     "YYYY-MM-DD [HH:MM[:SS]]".format(value))
 
 
 @contextmanager
@@ -26,9 +26,15 @@ setup(
     author="Ross Bayer",
     author_email="rossbayer@sicessolutions.com",
     url="http://www.sicessolutions.com",
+    python_requires=">=3.5",
+    classifiers=[
+        "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
+        "Programming Language :: Python :: 3.5"
+    ],
     install_requires=[
         "pyyaml",
-        "sqlalchemy",
+        "sqlalchemy>=1.0",
         "colorama",
         "termcolor",
         "logbook"
@@ -8,7 +8,9 @@ from maxify.data import open_user_data
 from maxify.projects import Project
 from maxify.metrics import Metric, Duration, Number
 from maxify.repo import Repository
+from maxify.utils import set_locale
 
+set_locale()
 
 _db_session = open_user_data(":memory:", False)
 
@@ -1,6 +1,6 @@
 from maxify.projects import Project, Number, Duration
 
-project1 = Project(name="nep", desc="NEP project")
+project1 = Project(name="nep", desc="NEP project", retention_days=90)
 project1.add_metric(name="Story Points",
                     metric_type=Number,
                     value_range=[1, 2, 3, 5, 8, 13],
@@ -0,0 +1,184 @@
+"""Unit tests for the ``maxify.api`` module.
+"""
+
+import asyncio
+from datetime import timedelta
+import json
+
+import pytest
+
+from maxify.api import ApiServer, GroupCommitter
+from maxify.projects import Task
+
+
+@pytest.fixture
+def loop(request):
+    loop = asyncio.new_event_loop()
+    request.addfinalizer(loop.close)
+    return loop
+
+
+@pytest.fixture
+def server(request, loop):
+    server = ApiServer(port=0, commit_interval=0.01)
+    loop.run_until_complete(server.start())
+    request.addfinalizer(lambda: loop.run_until_complete(server.close()))
+    return server
+
+
+def _request(loop, server, method, target, body=None):
+    async def send():
+        reader, writer = await asyncio.open_connection(server.host,
+                                                       server.port)
+        payload = json.dumps(body).encode("utf-8") if body is not None \
+            else b""
+        writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\n"
+                     "Content-Length: {}\r\nConnection: close\r\n\r\n"
+                     .format(method, target, len(payload)).encode("latin-1") +
+                     payload)
+        response = await reader.read()
+        writer.close()
+        return response
+
+    response = loop.run_until_complete(send())
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ")[1])
+    return status, json.loads(payload.decode("utf-8"))
+
+
+def test_get_projects(loop, server, project):
+    status, body = _request(loop, server, "GET", "/projects")
+    assert status == 200
+    assert [p["name"] for p in body] == ["test"]
+
+
+def test_record(loop, server, project):
+    status, body = _request(loop, server, "POST", "/record",
+                            dict(project="test",
+                                 task="task-1",
+                                 metric="Compile Time",
+                                 value="1h"))
+    assert status == 201
+    assert body["value"] == 3600
+
+    status, body = _request(loop, server, "GET", "/tasks?project=test")
+    assert status == 200
+    assert [t["name"] for t in body] == ["task-1"]
+
+    status, body = _request(loop, server, "GET",
+                            "/totals?project=test&task=task-1")
+    assert status == 200
+    assert body["Compile Time"] == 3600
+
+    status, body = _request(loop, server, "GET", "/report?project=test")
+    assert status == 200
+    assert len(body) == 1
+    assert body[0]["total"] == 3600
+
+
+def test_record_group_commit(loop, server, project, db_session):
+    async def record_all():
+        writes = [server.post_record(dict(project="test",
+                                          task="task-1",
+                                          metric="Compile Time",
+                                          value="10m"))
+                  for _ in range(20)]
+        return await asyncio.gather(*writes)
+
+    responses = loop.run_until_complete(record_all())
+
+    assert all(status == 201 for status, _ in responses)
+    assert server.committer.commits == 1
+    task = project.task("task-1", create=False)
+    assert task.value(project.metric("Compile Time")) == \
+        timedelta(minutes=200)
+
+
+def test_record_invalid(loop, server, project):
+    status, body = _request(loop, server, "POST", "/record",
+                            dict(project="test",
+                                 task="task-1",
+                                 metric="Compile Time",
+                                 value="5 eons"))
+    assert status == 400
+
+    status, body = _request(loop, server, "POST", "/record",
+                            dict(project="missing", task="t", metric="m",
+                                 value="1"))
+    assert status == 404
+    assert "missing" in body["error"]
+
+
+def test_errors(loop, server, project):
+    assert _request(loop, server, "GET", "/unknown")[0] == 404
+    assert _request(loop, server, "POST", "/projects")[0] == 405
+    assert _request(loop, server, "GET", "/tasks")[0] == 400
+    assert _request(loop, server, "GET", "/report?project=test&by=year")[0] \
+        == 400
+
+
+def test_record_group_commit_invalid_value(loop, server, project,
+                                           db_session):
+    async def record_all():
+        return await asyncio.gather(
+            server._dispatch("POST", "/record", json.dumps(
+                dict(project="test", task="task-1", metric="Compile Time",
+                     value="1h")).encode("utf-8")),
+            server._dispatch("POST", "/record", json.dumps(
+                dict(project="test", task="task-2", metric="Story Points",
+                     value="7")).encode("utf-8")))
+
+    (valid, _), (invalid, body) = loop.run_until_complete(record_all())
+
+    assert valid == 201
+    assert invalid == 400
+    assert "not in the valid range" in body["error"]
+    assert [t.name for t in project.tasks] == ["task-1"]
+    assert db_session.query(Task).count() == 1
+
+
+def test_group_committer_single_commit(loop, db_session, project):
+    committer = GroupCommitter(db_session)
+    connection = db_session.connection().connection.connection
+    statements = []
+    connection.set_trace_callback(statements.append)
+
+    def write(name):
+        project.task(name)
+        db_session.flush()
+
+    async def submit():
+        return await asyncio.gather(*[committer.submit(lambda n=n: write(n))
+                                      for n in ("task-1", "task-2")])
+
+    try:
+        loop.run_until_complete(submit())
+    finally:
+        connection.set_trace_callback(None)
+
+    # The savepoints of the writes are released inside the batch's
+    # transaction, which is committed once
+    statements = [s.split()[0] for s in statements]
+    assert statements[0] == "BEGIN"
+    assert statements.count("BEGIN") == 1
+    assert statements.count("COMMIT") == 1
+    assert statements.count("RELEASE") == 2
+
+
+def test_group_committer_failed_write(loop, db_session, project):
+    committer = GroupCommitter(db_session)
+
+    def fail():
+        project.task("task-2")
+        raise ValueError("Failed")
+
+    async def submit():
+        return await asyncio.gather(committer.submit(lambda: 1),
+                                    committer.submit(fail),
+                                    return_exceptions=True)
+
+    results = loop.run_until_complete(submit())
+    assert results[0] == 1
+    assert isinstance(results[1], ValueError)
+    assert committer.commits == 1
+    assert db_session.query(Task).filter_by(name="task-2").count() == 0
@@ -0,0 +1,214 @@
+"""Unit tests for the ``maxify.archive`` module.
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+
+from maxify.archive import find_archives, Archive
+from maxify.data import Base, ARCHIVES_KEY, to_epoch
+from maxify.metrics import Duration, Number
+from maxify.projects import Project
+from maxify.repo import Repository, Projects, Reports, Tasks
+from maxify.ui import MaxifyCmd
+
+
+@pytest.fixture
+def data_path(request, tmpdir):
+    path = str(tmpdir.join("maxify.db"))
+    Repository.init(path)
+
+    def close():
+        for archive in Repository.db_session.info.get(ARCHIVES_KEY, ()):
+            archive.close()
+        Repository.db_session.close()
+
+    request.addfinalizer(close)
+    return path
+
+
+@pytest.fixture
+def file_project(data_path):
+    project = Project(name="archived")
+    project.add_metric(name="Coding Time", metric_type=Duration)
+    project.add_metric(name="Points", metric_type=Number)
+    Projects().save(project)
+    return project
+
+
+def _record_at(task, metric, value, timestamp):
+    task.record(metric, value)
+    if metric.metric_type is Duration:
+        data_point = task.duration_values[-1]
+    else:
+        data_point = task.numeric_values[-1]
+    data_point.timestamp = timestamp
+    data_point.epoch = to_epoch(timestamp)
+
+
+def test_for_data_file():
+    archive = Archive.for_data_file("/tmp/maxify.db", 2014)
+    assert archive.path == "/tmp/maxify-archive-2014.db"
+    assert archive.year == 2014
+
+    assert archive.covers()
+    assert archive.covers(datetime(2014, 6, 1), datetime(2014, 7, 1))
+    assert not archive.covers(start=datetime(2015, 1, 1))
+    assert not archive.covers(end=datetime(2014, 1, 1))
+
+
+def test_archive(data_path, file_project):
+    db_session = Repository.db_session
+    coding_time = file_project.metric("Coding Time")
+    points = file_project.metric("Points")
+    task = file_project.task("task-1")
+    _record_at(task, coding_time, timedelta(hours=1), datetime(2013, 5, 1))
+    _record_at(task, coding_time, timedelta(hours=2), datetime(2014, 5, 1))
+    _record_at(task, coding_time, timedelta(hours=4), datetime(2015, 5, 1))
+    _record_at(task, points, Decimal(5), datetime(2013, 5, 1))
+    db_session.commit()
+
+    projects = Projects()
+    moved = projects.archive(datetime(2015, 1, 1))
+
+    assert moved == {2013: (1, 1), 2014: (1, 0)}
+    assert [a.year for a in find_archives(data_path)] == [2013, 2014]
+    assert db_session.query(Duration).count() == 1
+    assert db_session.query(Number).count() == 0
+
+    assert Duration.total(coding_time, task, db_session) == \
+        timedelta(hours=7)
+    assert Number.total(points, task, db_session) == Decimal(5)
+
+    reports = Reports(file_project)
+    table = reports.durations("month")
+    assert table.rows == ["2013-05", "2014-05", "2015-05"]
+    assert table.column_total(coding_time) == timedelta(hours=7)
+
+    table = reports.durations("month", start=datetime(2014, 1, 1))
+    assert table.rows == ["2014-05", "2015-05"]
+
+    assert projects.archive(datetime(2015, 1, 1)) == {}
+
+
+def test_archive_tasks(data_path, file_project):
+    db_session = Repository.db_session
+    coding_time = file_project.metric("Coding Time")
+    points = file_project.metric("Points")
+    task1 = file_project.task("task-1")
+    _record_at(task1, coding_time, timedelta(hours=1), datetime(2013, 5, 1))
+    _record_at(task1, coding_time, timedelta(hours=2), datetime(2015, 5, 1))
+    _record_at(task1, points, Decimal(5), datetime(2013, 6, 1))
+    task2 = file_project.task("task-2")
+    _record_at(task2, coding_time, timedelta(hours=4), datetime(2014, 5, 1))
+    db_session.commit()
+
+    Projects().archive(datetime(2015, 1, 1))
+    tasks = Tasks(file_project)
+
+    summaries = tasks.summaries()
+    assert [s.name for s in summaries] == ["task-1", "task-2"]
+    assert summaries[0].value(coding_time) == timedelta(hours=3)
+    assert summaries[0].value(points) == Decimal(5)
+    assert summaries[1].value(coding_time) == timedelta(hours=4)
+    assert summaries[1].value(points) is None
+
+    page = tasks.summaries(offset=1, limit=1)
+    assert [s.value(coding_time) for s in page] == [timedelta(hours=4)]
+
+    assert [p.value for p in tasks.data_points(None, None)] == \
+        [timedelta(hours=1), Decimal(5), timedelta(hours=4),
+         timedelta(hours=2)]
+    assert [p.value for p in tasks.data_points(datetime(2014, 1, 1),
+                                               datetime(2015, 1, 1),
+                                               coding_time)] == \
+        [timedelta(hours=4)]
+
+
+def test_log_deleted_task(data_path, file_project):
+    db_session = Repository.db_session
+    coding_time = file_project.metric("Coding Time")
+    task1 = file_project.task("task-1")
+    _record_at(task1, coding_time, timedelta(hours=1), datetime(2013, 5, 1))
+    task2 = file_project.task("task-2")
+    _record_at(task2, coding_time, timedelta(hours=2), datetime(2013, 6, 1))
+    db_session.commit()
+
+    Projects().archive(datetime(2015, 1, 1))
+    db_session.delete(task2)
+    db_session.commit()
+
+    # The archive still has the values of the deleted task
+    stdout = StringIO()
+    c = MaxifyCmd(stdout=stdout, use_color=False)
+    c.onecmd("switch " + file_project.name)
+    c.onecmd("log")
+
+    output = stdout.getvalue()
+    assert "task-1" in output
+    assert "task-2" not in output
+    assert "Coding Time: 1:00:00" in output
+
+
+def test_archive_failure(data_path, file_project):
+    db_session = Repository.db_session
+    coding_time = file_project.metric("Coding Time")
+    task = file_project.task("task-1")
+    _record_at(task, coding_time, timedelta(hours=1), datetime(2013, 5, 1))
+    _record_at(task, coding_time, timedelta(hours=2), datetime(2014, 5, 1))
+    _record_at(task, coding_time, timedelta(hours=4), datetime(2015, 5, 1))
+    db_session.commit()
+
+    # Archive that can't be written to
+    archive = Archive.for_data_file(data_path, 2014)
+    archive.session.execute("""
+        CREATE TRIGGER fail BEFORE INSERT ON metrics_data_durations
+        BEGIN SELECT RAISE(ABORT, 'archive is full'); END""")
+    archive.session.commit()
+    archive.close()
+
+    with pytest.raises(IntegrityError):
+        Projects().archive(datetime(2015, 1, 1))
+
+    archives = db_session.info[ARCHIVES_KEY]
+    assert [a.year for a in archives] == [2013, 2014]
+    assert archives[0].session.query(Duration).count() == 1
+    assert archives[1].session.query(Duration).count() == 0
+    assert db_session.query(Duration).count() == 2
+    assert Duration.total(coding_time, task, db_session) == \
+        timedelta(hours=7)
+
+
+def test_archive_upgrades_tables(data_path, file_project):
+    # Archive created before tasks had a sort key
+    engine = create_engine(
+        "sqlite:///" + Archive.for_data_file(data_path, 2013).path)
+    engine.execute("""
+        CREATE TABLE tasks (
+            id CHAR(32) NOT NULL,
+            name VARCHAR(256),
+            "desc" VARCHAR,
+            created DATETIME,
+            last_updated DATETIME,
+            project_id CHAR(32),
+            PRIMARY KEY (id)
+        )""")
+    Base.metadata.create_all(engine, tables=[Number.__table__,
+                                             Duration.__table__])
+    engine.dispose()
+
+    task = file_project.task("task-1")
+    _record_at(task, file_project.metric("Coding Time"), timedelta(hours=1),
+               datetime(2013, 5, 1))
+    Repository.db_session.commit()
+
+    assert Projects().archive(datetime(2014, 1, 1)) == {2013: (1, 0)}
+
+
+def test_archive_memory_data_store():
+    with pytest.raises(ValueError):
+        Projects().archive(datetime(2015, 1, 1))
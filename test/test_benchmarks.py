@@ -0,0 +1,100 @@
+"""Unit tests for the ``benchmarks`` package.
+"""
+
+import os
+
+from benchmarks import history
+from benchmarks.generate import generate
+from benchmarks.run import percentile, run
+from benchmarks.scenarios import scenarios
+from maxify.data import open_user_data
+from maxify.metrics import Duration
+from maxify.projects import Project, Task
+
+
+def _generated(path):
+    session = open_user_data(path)
+    try:
+        return (sorted((p.id, p.qualified_name)
+                       for p in session.query(Project)),
+                session.query(Task).count(),
+                session.query(Duration).count())
+    finally:
+        session.close()
+        session.bind.dispose()
+
+
+def test_generate_deterministic(tmpdir):
+    first = str(tmpdir.join("first.db"))
+    second = str(tmpdir.join("second.db"))
+    generate(first, projects=3, tasks=5, rows=20, seed=1)
+    generate(second, projects=3, tasks=5, rows=20, seed=1)
+
+    projects, tasks, durations = _generated(first)
+    assert _generated(second) == (projects, tasks, durations)
+    assert sorted(name for _, name in projects) == \
+        ["org1/project-001", "project-000", "project-002"]
+    assert tasks == 15
+    assert durations == 60
+
+
+def test_run(tmpdir):
+    path = str(tmpdir.join("maxify.db"))
+    generate(path, projects=2, tasks=5, rows=20)
+
+    results = run(path, str(tmpdir), projects=2, repeat=2)
+
+    assert list(results) == [name for name, _ in scenarios]
+    for result in results.values():
+        assert len(result["times"]) == 2
+        assert result["p50"] <= result["p95"]
+        assert result["peak"] > 0
+
+
+def test_percentile():
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile(list(range(1, 101)), 0.95) == 95
+
+
+def _record(p50s):
+    return dict(results={name: dict(times=times, p50=percentile(times, 0.5))
+                         for name, times in p50s.items()})
+
+
+def test_mann_whitney_p():
+    baseline = [1.0, 1.1, 0.9, 1.05, 0.95, 1.0, 1.02, 0.98]
+    assert history.mann_whitney_p(baseline, baseline) > 0.4
+    assert history.mann_whitney_p(baseline, [v * 1.5 for v in baseline]) \
+        < 0.01
+    assert history.mann_whitney_p(baseline, [v * 0.5 for v in baseline]) \
+        > 0.99
+
+
+def test_compare():
+    fast = [1.0, 1.1, 0.9, 1.05, 0.95, 1.0, 1.02, 0.98]
+    slow = [v * 1.5 for v in fast]
+    baseline = _record({"maxify.ui:projects": fast,
+                        "maxify.metrics:Duration.parse": fast,
+                        "maxify.repo:Projects.save": fast})
+    current = _record({"maxify.ui:projects": slow,
+                       "maxify.metrics:Duration.parse": slow,
+                       "maxify.repo:Projects.save": fast})
+
+    rows = history.compare(baseline, current)
+    regressed = [row[0] for row in rows if row[-1]]
+    assert regressed == ["maxify.ui:projects"]
+
+    assert not [row for row in history.compare(baseline, current,
+                                               threshold=0.6) if row[-1]]
+
+
+def test_save_load(tmpdir):
+    directory = str(tmpdir)
+    results = {"maxify.ui:projects": dict(times=[1.0], p50=1.0, p95=1.0,
+                                          peak=10)}
+    path = history.save(results, dict(projects=1), directory)
+
+    assert path.startswith(os.path.join(directory, history.fingerprint()))
+    record = history.load(history.revision(), directory)
+    assert record["results"] == results
+    assert history.load(path, directory)["params"] == dict(projects=1)
@@ -78,6 +78,7 @@ def _verify_config():
     project = projects.get("nep")
 
     assert project.desc == "NEP project"
+    assert project.retention_days == 90
     assert len(project.metrics) == 7
     assert project.metric("Story Points")
     assert project.metric("Story Points").metric_type == Number
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Unit tests for the ``maxify.instrument`` module.
+"""
+
+import json
+
+import pytest
+
+from maxify.instrument import (
+    allocated_memory,
+    detect_repeated_queries,
+    disable_tracing,
+    enable_tracing,
+    profile,
+    Profiler,
+    QueryDetector,
+    RepeatedQueryError,
+    RepeatedQueryWarning
+)
+from maxify.projects import Project
+from maxify.repo import Projects, Repository
+
+
+def test_profile(db_session, project):
+    db_session.expunge_all()
+
+    with profile(db_session.bind) as stats:
+        projects = db_session.query(Project).all()
+        assert len(projects[0].metrics) == 2
+
+    assert stats.statements == 2
+    assert stats.rows == 3
+    assert stats.objects == 3
+    assert 0 < stats.sql_time <= stats.wall_time
+
+
+def test_profiler_stop(db_session, project):
+    profiler = Profiler(db_session.bind)
+    profiler.start()
+    stats = profiler.stop()
+
+    db_session.expunge_all()
+    db_session.query(Project).all()
+
+    assert stats.statements == 0
+    assert stats.rows == 0
+    assert stats.objects == 0
+
+
+def _projects(db_session, count):
+    for i in range(count):
+        project = Project(name="project-{}".format(i))
+        project.task("task-1")
+        db_session.add(project)
+    db_session.commit()
+    db_session.expunge_all()
+
+
+def test_query_detector(db_session):
+    _projects(db_session, 4)
+
+    detector = QueryDetector(db_session.bind, threshold=3)
+    detector.start()
+    for project in db_session.query(Project).all():
+        project.unpack()
+    findings = detector.stop()
+
+    assert len(findings) == 2
+    for statement, count, call_site in findings:
+        assert statement.startswith("SELECT")
+        assert count == 4
+        assert call_site.startswith("maxify/projects.py:")
+        assert call_site.endswith(" in unpack")
+
+
+def test_detect_repeated_queries(db_session):
+    _projects(db_session, 3)
+
+    with pytest.raises(RepeatedQueryError):
+        with detect_repeated_queries(db_session.bind, threshold=2,
+                                     fail=True):
+            for project in db_session.query(Project).all():
+                project.unpack()
+
+    db_session.expunge_all()
+    with pytest.warns(RepeatedQueryWarning):
+        with detect_repeated_queries(db_session.bind, threshold=2):
+            for project in db_session.query(Project).all():
+                project.unpack()
+
+
+def test_tracing(tmpdir, project):
+    path = str(tmpdir.join("trace.jsonl"))
+    commit = Repository.__dict__["commit"]
+
+    enable_tracing(path)
+    try:
+        projects = Projects()
+        projects.save(projects.get("test"))
+        with pytest.raises(AttributeError):
+            projects.save(None)
+    finally:
+        disable_tracing()
+
+    assert Repository.__dict__["commit"] is commit
+    Projects().all()
+
+    with open(path) as f:
+        spans = [json.loads(line) for line in f]
+
+    assert [s["name"] for s in spans] == ["Projects.get",
+                                          "Repository.commit",
+                                          "Projects.save",
+                                          "Projects.save"]
+    get, commit_span, save, failed_save = spans
+    assert get["parent"] is None
+    assert commit_span["parent"] == save["id"]
+    assert save["duration"] >= commit_span["duration"] >= 0
+    assert failed_save["error"] == "AttributeError"
+    assert "error" not in save
+
+
+def test_allocated_memory():
+    result, size = allocated_memory(lambda: bytearray(100000))
+
+    assert len(result) == 100000
+    assert size >= 100000
@@ -0,0 +1,99 @@
+"""Unit tests for the startup of the ``maxify.main`` module.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.generate import generate, project_name
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Budget for running a one-shot command, in seconds, on top of starting the
+#: interpreter and importing the parts of SQLAlchemy that every command
+#: opening the data file needs.
+COMMAND_BUDGET = 0.1
+
+#: Imports timed as the baseline of :data:`COMMAND_BUDGET`.
+SQLALCHEMY_IMPORTS = "import sqlalchemy.dialects.sqlite, " \
+                     "sqlalchemy.ext.baked, " \
+                     "sqlalchemy.ext.declarative, " \
+                     "sqlalchemy.orm"
+
+#: Times each command of the budget is run, keeping the fastest run.
+BUDGET_RUNS = 15
+
+#: Modules that only commands using them should import.
+HEAVY_MODULES = ["sqlalchemy", "yaml", "logbook", "colorama", "termcolor",
+                 "asyncio", "maxify.ui", "maxify.repo"]
+
+#: Modules that listing the tasks of a project should not import.
+COMMAND_MODULES = ["yaml", "logbook", "asyncio", "tracemalloc",
+                   "maxify.api", "maxify.config", "maxify.instrument",
+                   "maxify.render", "maxify.server"]
+
+
+def _run(*args):
+    return subprocess.run([sys.executable] + list(args),
+                          cwd=ROOT,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True,
+                          check=True)
+
+
+def _imported_after(module):
+    result = _run("-c", "import sys, {}; print('\\n'.join(sys.modules))"
+                        .format(module))
+    return set(result.stdout.split())
+
+
+def test_main_imports_lazily():
+    imported = _imported_after("maxify.main")
+    assert not [m for m in HEAVY_MODULES if m in imported]
+
+
+def test_ui_imports_lazily():
+    imported = _imported_after("maxify.ui")
+    assert "yaml" not in imported
+    assert "logbook" not in imported
+
+
+def _best_times(*commands):
+    # Runs the commands in turn, so that they are equally affected by the
+    # load of the machine, and returns their fastest time
+    times = [[] for _ in commands]
+    for _ in range(BUDGET_RUNS):
+        for command, command_times in zip(commands, times):
+            started = time.perf_counter()
+            _run(*command)
+            command_times.append(time.perf_counter() - started)
+    return [min(command_times) for command_times in times]
+
+
+def _tasks_command(tmpdir):
+    path = str(tmpdir.join("maxify.db"))
+    generate(path, projects=1, tasks=20, rows=100)
+    return ["-m", "maxify.main", "--data-file", path, "--project",
+            project_name(0), "tasks"]
+
+
+def test_command_imports_lazily(tmpdir):
+    result = _run("-X", "importtime", *_tasks_command(tmpdir))
+    assert "task-20" in result.stdout
+    imported = {line.split("|")[-1].strip()
+                for line in result.stderr.splitlines()
+                if line.startswith("import time:")}
+    assert not [m for m in COMMAND_MODULES if m in imported]
+
+
+def test_command_budget(tmpdir):
+    baseline, command = _best_times(["-c", SQLALCHEMY_IMPORTS],
+                                    _tasks_command(tmpdir))
+    assert command - baseline < COMMAND_BUDGET
+
+
+def test_help():
+    result = _run("-m", "maxify.main", "--help")
+    assert "usage" in result.stdout
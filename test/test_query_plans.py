@@ -0,0 +1,230 @@
+"""
+Query plan regression tests for the repository's queries.
+
+Each test runs a repository operation against a generated data file,
+captures the SELECT statements it executes and compares their
+``EXPLAIN QUERY PLAN`` output with the expected plans below, so that a lost
+index or a query that can no longer use one shows up as a diff.  Plans must
+not scan a whole table, except for the tables an operation reads entirely.
+"""
+
+from datetime import datetime
+import difflib
+import re
+
+import pytest
+from sqlalchemy import event
+
+from benchmarks.generate import generate, project_name
+from maxify.metrics import Duration, Number
+from maxify.repo import Repository, Projects, Reports, Tasks
+
+_scan = re.compile(r"^\s*SCAN (\w+)(?! USING)")
+
+#: Operations run by the tests, as functions of a :class:`Context`.
+operations = {
+    "Projects.get": lambda c: Projects().get(project_name(1)),
+    "Projects.all": lambda c: Projects().all(),
+    "Tasks.starts_with": lambda c: Tasks(c.project).starts_with("task-1"),
+    "Tasks.load_values": lambda c: Tasks(c.project).load_values(),
+    "Tasks.between": lambda c: Tasks(c.project).between(
+        datetime(2014, 1, 1), datetime(2014, 2, 1)),
+    "Tasks.data_points": lambda c: Tasks(c.project).data_points(
+        datetime(2014, 1, 1), datetime(2014, 2, 1)),
+    "Tasks.summaries": lambda c: Tasks(c.project).summaries(),
+    "Tasks.summaries (page)": lambda c: Tasks(c.project).summaries(
+        offset=20, limit=10),
+    "Tasks.count": lambda c: Tasks(c.project).count("task-*"),
+    "Duration.total": lambda c: Duration.total(c.duration_metric, c.task,
+                                               c.session),
+    "Number.total": lambda c: Number.total(c.number_metric, c.task,
+                                           c.session),
+    "Reports.durations": lambda c: Reports(c.project).durations(
+        "week", datetime(2014, 1, 1), datetime(2014, 2, 1)),
+    "Reports.durations (partial days)": lambda c: Reports(c.project).durations(
+        "week", datetime(2014, 1, 1, 12), datetime(2014, 2, 1, 12)),
+}
+
+#: Tables that operations are allowed to scan, since they read all of them.
+allowed_scans = {
+    "Projects.all": {"projects", "tasks", "metrics"},
+}
+
+#: Operations that query values within a range of time, whose searches of
+#: values must be bounded by that range rather than filter each value.
+range_operations = {
+    "Reports.durations (partial days)",
+    "Tasks.between",
+    "Tasks.data_points",
+}
+
+_values_search = re.compile(r"^\s*SEARCH metrics_data_\w+ .*\((.*)\)$")
+
+#: Expected plans of the statements executed by each operation, separated by
+#: "--" lines.  Plans are sorted, since the order that eagerly loaded
+#: relationships are queried in can vary.
+expected_plans = {
+    "Duration.total": """
+SEARCH metrics_data_durations USING INDEX sqlite_autoindex_metrics_data_durations_1 (metric_id=? AND task_id=?)
+""",
+    "Number.total": """
+SEARCH metrics_data_numbers USING INDEX sqlite_autoindex_metrics_data_numbers_1 (metric_id=? AND task_id=?)
+""",
+    "Projects.all": """
+SCAN metrics
+SEARCH projects USING COVERING INDEX sqlite_autoindex_projects_1 (id=?)
+--
+SCAN projects
+--
+SCAN tasks
+SEARCH projects USING COVERING INDEX sqlite_autoindex_projects_1 (id=?)
+""",
+    "Projects.get": """
+SEARCH projects USING INDEX ix_projects_name (name=?)
+""",
+    "Reports.durations": """
+SEARCH daily_rollups USING INDEX ix_daily_rollups_project_day (project_id=? AND day>? AND day<?)
+USE TEMP B-TREE FOR GROUP BY
+--
+SEARCH data_versions USING INDEX sqlite_autoindex_data_versions_1 (name=?)
+--
+SEARCH metrics USING INDEX ix_metrics_project_id (project_id=?)
+--
+SEARCH metrics_data_durations
+--
+SEARCH projects USING INDEX sqlite_autoindex_projects_1 (id=?)
+--
+SEARCH rollup_marks USING INDEX sqlite_autoindex_rollup_marks_1 (name=?)
+""",
+    "Reports.durations (partial days)": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=? AND epoch>? AND epoch<?)
+USE TEMP B-TREE FOR GROUP BY
+""",
+    "Tasks.between": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=? AND epoch>? AND epoch<?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_numbers USING INDEX ix_metrics_data_numbers_task_id_epoch (task_id=? AND epoch>? AND epoch<?)
+""",
+    "Tasks.data_points": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=? AND epoch>? AND epoch<?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_numbers USING INDEX ix_metrics_data_numbers_task_id_epoch (task_id=? AND epoch>? AND epoch<?)
+""",
+    "Tasks.load_values": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_numbers USING INDEX ix_metrics_data_numbers_task_id_epoch (task_id=?)
+""",
+    "Tasks.count": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+""",
+    "Tasks.summaries": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=?)
+USE TEMP B-TREE FOR GROUP BY
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=?)
+SEARCH metrics_data_numbers USING INDEX ix_metrics_data_numbers_task_id_epoch (task_id=?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_sort_key (project_id=?)
+""",
+    "Tasks.summaries (page)": """
+SEARCH tasks USING COVERING INDEX sqlite_autoindex_tasks_1 (id=?)
+SEARCH metrics_data_durations USING INDEX ix_metrics_data_durations_task_id_epoch (task_id=?)
+USE TEMP B-TREE FOR GROUP BY
+--
+SEARCH tasks USING COVERING INDEX sqlite_autoindex_tasks_1 (id=?)
+SEARCH metrics_data_numbers USING INDEX ix_metrics_data_numbers_task_id_epoch (task_id=?)
+--
+SEARCH tasks USING INDEX ix_tasks_project_id_sort_key (project_id=?)
+""",
+    "Tasks.starts_with": """
+SEARCH tasks USING INDEX ix_tasks_project_id_name_nocase (project_id=? AND name>? AND name<?)
+"""
+}
+
+
+class Context(object):
+    """Objects from the generated data file used by operations."""
+
+    def __init__(self):
+        self.session = Repository.db_session
+        self.project = Projects().get(project_name(1))
+        self.task = self.project.task("task-1")
+        self.duration_metric = self.project.metric("Coding Time")
+        self.number_metric = self.project.metric("Story Points")
+
+
+@pytest.fixture
+def context(tmpdir):
+    path = str(tmpdir.join("plans.db"))
+    generate(path, projects=3, tasks=50, rows=500)
+    Repository.init(path)
+    return Context()
+
+
+def query_plans(operation, context):
+    """Runs an operation and returns the sorted query plans of the SELECT
+    statements that it executed, in the format of :data:`expected_plans`.
+    """
+    engine = context.session.bind
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, execution_context,
+                executemany):
+        if statement.lstrip()[:6].upper() == "SELECT":
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        operation(context)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    cursor = context.session.connection().connection.cursor()
+    plans = []
+    for statement, parameters in statements:
+        depths = {0: 0}
+        lines = []
+        for node, parent, _, detail in cursor.execute(
+                "EXPLAIN QUERY PLAN " + statement, parameters):
+            depths[node] = depths.get(parent, 0) + 1
+            # Older versions of SQLite include "TABLE" in scans and searches
+            detail = re.sub(r"^(SCAN|SEARCH) TABLE ", r"\1 ", detail)
+            lines.append("  " * (depths[node] - 1) + detail)
+        plans.append("\n".join(lines))
+
+    return "\n" + "\n--\n".join(sorted(plans)) + "\n"
+
+
+@pytest.mark.parametrize("name", sorted(operations))
+def test_query_plan(context, name):
+    plans = query_plans(operations[name], context)
+
+    scans = {m.group(1) for m in map(_scan.match, plans.splitlines()) if m}
+    unexpected = scans - allowed_scans.get(name, set())
+    assert not unexpected, "{} scans {}:\n{}".format(
+        name, ", ".join(sorted(unexpected)), plans)
+
+    if name in range_operations:
+        searches = [m.group(1) for m in map(_values_search.match,
+                                            plans.splitlines()) if m]
+        bounded = [c for c in searches if "epoch>? AND epoch<?" in c]
+        assert searches and bounded == searches, \
+            "{} doesn't search values by time:\n{}".format(name, plans)
+
+    expected = expected_plans[name]
+    assert plans == expected, "Query plans of {} changed:\n{}".format(
+        name, "".join(difflib.unified_diff(expected.splitlines(True),
+                                           plans.splitlines(True),
+                                           "expected",
+                                           "actual")))
@@ -0,0 +1,100 @@
+"""Unit tests for the ``maxify.render`` module.
+"""
+
+from io import StringIO
+
+from maxify.render import StatusLine
+
+
+class TerminalOutput(StringIO):
+
+    def __init__(self):
+        super(TerminalOutput, self).__init__()
+        self.writes = 0
+
+    def isatty(self):
+        return True
+
+    def write(self, s):
+        self.writes += 1
+        return super(TerminalOutput, self).write(s)
+
+
+def test_redraw_changed_characters():
+    output = TerminalOutput()
+    status_line = StatusLine(output, max_fps=1000)
+
+    status_line.update("  Running  0:00:01")
+    status_line.update("  Running  0:00:02", force=True)
+
+    assert output.getvalue() == "\r  Running  0:00:01\r" \
+                                "\r\x1b[17C2\r"
+    assert output.writes == 2
+
+
+def test_redraw_shorter_text():
+    output = TerminalOutput()
+    status_line = StatusLine(output)
+
+    status_line.update("abcdef")
+    status_line.update("abx", force=True)
+
+    assert output.getvalue().endswith("\r\x1b[2Cx   \r")
+
+
+def test_redraw_color_change():
+    output = TerminalOutput()
+    status_line = StatusLine(output, use_color=False)
+
+    status_line.update("  Paused   0:00:01", "yellow")
+    status_line.update("  Running  0:00:01", "green", force=True)
+
+    assert output.getvalue().endswith("\r  Running  0:00:01\r")
+    assert status_line.color == "green"
+
+
+def test_unchanged_text():
+    output = TerminalOutput()
+    status_line = StatusLine(output)
+
+    status_line.update("same")
+    status_line.update("same", force=True)
+
+    assert output.writes == 1
+
+
+def test_throttled_frames():
+    output = TerminalOutput()
+    status_line = StatusLine(output, max_fps=1)
+
+    status_line.update("1")
+    status_line.update("2")
+    status_line.update("3")
+    assert output.getvalue() == "\r1\r"
+
+    status_line.flush()
+    assert output.getvalue() == "\r1\r\r3\r"
+    assert status_line.text == "3"
+
+
+def test_not_a_terminal():
+    output = StringIO()
+    status_line = StatusLine(output)
+
+    status_line.update("skipped")
+    status_line.flush()
+    assert output.getvalue() == ""
+
+    status_line.update("Stopped", force=True)
+    assert output.getvalue() == "\rStopped\r"
+
+
+def test_clear():
+    output = TerminalOutput()
+    status_line = StatusLine(output)
+
+    status_line.update("text")
+    status_line.clear()
+
+    assert output.getvalue().endswith("\r    \r")
+    assert status_line.text == ""
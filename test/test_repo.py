@@ -2,8 +2,20 @@
 
 """
 
+from datetime import datetime, timedelta
+import multiprocessing
+import sqlite3
+import threading
+from time import sleep
+import uuid
+
 import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
 
+from maxify.data import Base, to_epoch
+from maxify.instrument import detect_repeated_queries
+from maxify.metrics import Duration, Number
 from maxify.repo import *
 
 
@@ -13,6 +25,44 @@ def test_projects_all(project):
     assert project in projects
 
 
+def test_projects_all_eager(db_session, project, org1_project):
+    db_session.expunge_all()
+
+    with detect_repeated_queries(db_session.bind, threshold=1, fail=True):
+        projects = Projects().all()
+
+    assert sorted(len(p.metrics) for p in projects) == [2, 2]
+
+
+def test_tasks_starts_with(db_session, project):
+    for name in ("Maxify-3", "maxify-1", "MAXIMUM", "other", "x@1", "xa"):
+        project.task(name)
+    db_session.commit()
+    tasks = Tasks(project)
+
+    assert sorted(t.name for t in tasks.starts_with("max")) == \
+        ["MAXIMUM", "Maxify-3", "maxify-1"]
+    assert sorted(t.name for t in tasks.starts_with("MAXIF")) == \
+        ["Maxify-3", "maxify-1"]
+    assert [t.name for t in tasks.starts_with("x@")] == ["x@1"]
+    assert len(tasks.starts_with("")) == 6
+
+
+def test_tasks_load_values(db_session, project, story_points_metric):
+    for i in range(5):
+        project.task("task-{}".format(i)).record(story_points_metric, 3)
+    db_session.commit()
+    db_session.expunge_all()
+    project = Projects().get("test")
+    metric = project.metric("Story Points")
+
+    with detect_repeated_queries(db_session.bind, threshold=1, fail=True):
+        Tasks(project).load_values()
+        values = [task.value(metric) for task in project.tasks]
+
+    assert values == [3] * 5
+
+
 def test_projects_all_named(project, org1_project):
     names = [project.qualified_name, org1_project.qualified_name]
 
@@ -25,6 +75,13 @@ def test_projects_all_named(project, org1_project):
     assert org1_project.id in ids
 
 
+def test_projects_all_named_excludes_others(project, org1_project):
+    projects = Projects().all_named(org1_project.qualified_name)
+    assert [p.id for p in projects] == [org1_project.id]
+
+    assert Projects().all_named("missing") == []
+
+
 def test_projects_matching_name(project, org1_project):
     partial_name = project.name[:4]
     projects = Projects()
@@ -77,4 +134,441 @@ def test_project_delete(project):
     projects.delete(project)
 
     persisted_project = projects.get(project.name, project.organization)
-    assert persisted_project is None
\ No newline at end of file
+    assert persisted_project is None
+
+
+def _record_at(db_session, task, metric, value, timestamp):
+    task.record(metric, value)
+    data_point = task.duration_values[-1]
+    data_point.timestamp = timestamp
+    data_point.epoch = to_epoch(timestamp)
+    db_session.commit()
+    return data_point
+
+
+def test_tasks_between(db_session, project, compile_time_metric):
+    task = project.task("task-1")
+    first = _record_at(db_session, task, compile_time_metric,
+                       timedelta(hours=1), datetime(2014, 6, 1, 10))
+    second = _record_at(db_session, task, compile_time_metric,
+                        timedelta(hours=2), datetime(2014, 6, 2, 10))
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=3), datetime(2014, 6, 3, 10))
+
+    tasks = Tasks(project)
+
+    values = tasks.between(datetime(2014, 6, 1), datetime(2014, 6, 3))
+    assert [v.id for v in values] == [first.id, second.id]
+
+    values = tasks.between(datetime(2014, 6, 2), None, compile_time_metric)
+    assert [v.value for v in values] == [timedelta(hours=2),
+                                         timedelta(hours=3)]
+
+    assert not tasks.between(datetime(2014, 7, 1), None)
+
+
+def test_tasks_data_points(db_session, project, compile_time_metric,
+                           story_points_metric):
+    task = project.task("task-1")
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=2), datetime(2014, 6, 2, 10))
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=1), datetime(2014, 6, 1, 10))
+    task.record(story_points_metric, 5)
+    db_session.commit()
+
+    tasks = Tasks(project)
+
+    points = tasks.data_points(datetime(2014, 6, 1), datetime(2014, 6, 3))
+    assert points == [(task.id, compile_time_metric.id,
+                       datetime(2014, 6, 1, 10), timedelta(hours=1)),
+                      (task.id, compile_time_metric.id,
+                       datetime(2014, 6, 2, 10), timedelta(hours=2))]
+    assert points[0].value == timedelta(hours=1)
+
+    points = tasks.data_points(None, None, story_points_metric)
+    assert [p.value for p in points] == [5]
+
+
+def test_tasks_summaries(db_session, project, compile_time_metric,
+                         story_points_metric):
+    task = project.task("task-1")
+    task.record(compile_time_metric, timedelta(hours=1))
+    task.record(compile_time_metric, timedelta(hours=2))
+    task.record(story_points_metric, 5)
+    project.task("task-2")
+    db_session.commit()
+
+    summaries = sorted(Tasks(project).summaries(), key=lambda s: s.name)
+
+    assert [s.name for s in summaries] == ["task-1", "task-2"]
+    assert summaries[0].id == task.id
+    assert summaries[0].created == task.created
+    assert summaries[0].value(compile_time_metric) == timedelta(hours=3)
+    assert summaries[0].value(story_points_metric) == 5
+    assert summaries[1].value(compile_time_metric) is None
+
+    summaries = Tasks(project).summaries(totals=False)
+    assert [s.totals for s in summaries] == [{}, {}]
+
+
+def test_tasks_summaries_natural_order(db_session, project,
+                                       story_points_metric):
+    for name in ("maxify-10", "maxify-2", "Maxify-1", "other"):
+        project.task(name).record(story_points_metric, 1)
+    db_session.commit()
+    tasks = Tasks(project)
+
+    assert [s.name for s in tasks.summaries()] == \
+        ["Maxify-1", "maxify-2", "maxify-10", "other"]
+    assert [s.name for s in tasks.summaries(pattern="maxify-*")] == \
+        ["maxify-2", "maxify-10"]
+    assert tasks.count() == 4
+    assert tasks.count("maxify-*") == 2
+
+    page = tasks.summaries(offset=1, limit=2)
+    assert [s.name for s in page] == ["maxify-2", "maxify-10"]
+    assert [s.value(story_points_metric) for s in page] == [1, 1]
+    assert tasks.summaries(offset=4, limit=2) == []
+
+    page = tasks.summaries(offset=2)
+    assert [s.name for s in page] == ["maxify-10", "other"]
+    assert [s.value(story_points_metric) for s in page] == [1, 1]
+
+
+def test_reports_durations(db_session, project, compile_time_metric):
+    task1 = project.task("task-1")
+    task2 = project.task("task-2")
+    _record_at(db_session, task1, compile_time_metric,
+               timedelta(hours=1), datetime(2014, 6, 2, 10))
+    _record_at(db_session, task2, compile_time_metric,
+               timedelta(hours=2), datetime(2014, 6, 2, 15))
+    _record_at(db_session, task1, compile_time_metric,
+               timedelta(hours=3), datetime(2014, 6, 10, 10))
+
+    reports = Reports(project)
+
+    table = reports.durations("day")
+    assert table.rows == ["2014-06-02", "2014-06-10"]
+    assert table.columns == [compile_time_metric]
+    assert table.cell("2014-06-02", compile_time_metric) == timedelta(hours=3)
+    assert table.column_total(compile_time_metric) == timedelta(hours=6)
+
+    table = reports.durations("month", start=datetime(2014, 6, 3))
+    assert table.rows == ["2014-06"]
+    assert table.row_total("2014-06") == timedelta(hours=3)
+
+
+def test_reports_durations_partial_days(db_session, project,
+                                        compile_time_metric):
+    task = project.task("task-1")
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=1), datetime(2014, 6, 2, 10))
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=2), datetime(2014, 6, 2, 15))
+
+    table = Reports(project).durations("day",
+                                       start=datetime(2014, 6, 2, 12))
+    assert table.cell("2014-06-02", compile_time_metric) == \
+        timedelta(hours=2)
+
+
+def test_projects_row_counts(db_session, project, org1_project,
+                            story_points_metric, compile_time_metric):
+    task = project.task("task-1")
+    task.record(story_points_metric, 3)
+    task.record(compile_time_metric, timedelta(minutes=5))
+    task.record(compile_time_metric, timedelta(minutes=10))
+    project.task("task-2")
+    db_session.commit()
+
+    counts = Projects().row_counts()
+
+    assert counts[project.id] == dict(tasks=2,
+                                      metrics=2,
+                                      numbers=1,
+                                      durations=2)
+    assert counts[org1_project.id] == dict(tasks=0,
+                                           metrics=2,
+                                           numbers=0,
+                                           durations=0)
+
+
+def test_projects_storage(project):
+    storage = Projects().storage()
+
+    assert storage["page_size"] > 0
+    assert storage["page_count"] > 0
+    if storage["tables"] is not None:
+        assert "projects" in [name for name, _, _, _ in storage["tables"]]
+
+
+def test_projects_load_copy(db_session, project, compile_time_metric):
+    project.task("task-1").record(compile_time_metric, timedelta(minutes=5))
+    db_session.commit()
+
+    copy = Projects().load_copy(project)
+
+    assert copy is not project
+    assert copy.task("task-1", create=False).duration_values[0].value == \
+        timedelta(minutes=5)
+    assert len(copy.metrics) == 2
+
+
+def test_project_compact(db_session, project, compile_time_metric):
+    task = project.task("task-1")
+    old_day = datetime.now() - timedelta(days=40)
+    for hours in (1, 2, 3):
+        _record_at(db_session, task, compile_time_metric,
+                   timedelta(hours=hours), old_day)
+    _record_at(db_session, task, compile_time_metric,
+               timedelta(hours=4), old_day - timedelta(days=1))
+    for hours in (5, 6):
+        _record_at(db_session, task, compile_time_metric,
+                   timedelta(hours=hours), datetime.now())
+
+    projects = Projects()
+    assert projects.compact(project) == 0
+
+    removed = projects.compact(project, days=30)
+    assert removed == 2
+    assert sorted(d.value.total_seconds() / 3600
+                  for d in task.duration_values) == [4, 5, 6, 6]
+    assert Duration.total(compile_time_metric, task, db_session) == \
+        timedelta(hours=21)
+
+    assert projects.compact(project, days=30) == 0
+    assert projects.vacuum() >= 0
+
+
+@pytest.fixture
+def record_queue(request, repository):
+    queue = repository.enable_write_behind(interval=60)
+    request.addfinalizer(repository.disable_write_behind)
+    return queue
+
+
+def test_tasks_record_write_behind(db_session, project, story_points_metric,
+                                   compile_time_metric, record_queue):
+    tasks = Tasks(project)
+    task = project.task("task-1")
+    tasks.record(task, compile_time_metric, timedelta(hours=1))
+    tasks.record(task, compile_time_metric, timedelta(hours=2))
+    tasks.record(task, story_points_metric, 3)
+    tasks.record(task, story_points_metric, 5)
+
+    assert len(record_queue) == 4
+    assert not Duration.total(compile_time_metric, task, db_session)
+
+    assert record_queue.flush() == 4
+    assert Duration.total(compile_time_metric, task, db_session) == \
+        timedelta(hours=3)
+    assert Number.total(story_points_metric, task, db_session) == 5
+
+    with pytest.raises(ValueError):
+        tasks.record(task, story_points_metric, 4)
+
+
+def test_tasks_record_write_behind_deleted_task(db_session, project,
+                                                compile_time_metric,
+                                                record_queue):
+    tasks = Tasks(project)
+    task1 = project.task("task-1")
+    task2 = project.task("task-2")
+    tasks.record(task1, compile_time_metric, timedelta(hours=1))
+    tasks.record(task2, compile_time_metric, timedelta(hours=2))
+    db_session.delete(task2)
+    db_session.commit()
+
+    # The value of the deleted task is dropped instead of failing the batch
+    assert record_queue.flush() == 1
+    assert not len(record_queue)
+    assert Duration.total(compile_time_metric, task1, db_session) == \
+        timedelta(hours=1)
+
+
+def test_tasks_record_write_behind_max_rows(db_session, project,
+                                            compile_time_metric,
+                                            record_queue):
+    record_queue.max_rows = 2
+    tasks = Tasks(project)
+    task = project.task("task-1")
+    tasks.record(task, compile_time_metric, timedelta(hours=1))
+    tasks.record(task, compile_time_metric, timedelta(hours=2))
+
+    for _ in range(100):
+        if not len(record_queue):
+            break
+        sleep(0.01)
+
+    assert not len(record_queue)
+    Repository.disable_write_behind()
+    assert Duration.total(compile_time_metric, task, db_session) == \
+        timedelta(hours=3)
+
+
+def _record_durations(path, task_name, count):
+    Repository.init(path)
+    projects = Projects()
+    project = projects.get("stress")
+    metric = project.metric("Coding Time")
+    for _ in range(count):
+        project.task(task_name).record(metric, timedelta(minutes=1))
+        projects.save(project)
+
+
+def test_projects_save_concurrent_processes(tmpdir):
+    path = str(tmpdir.join("maxify.db"))
+    Repository.init(path)
+    project = Project(name="stress")
+    project.add_metric(name="Coding Time", metric_type=Duration)
+    Projects().save(project)
+
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_record_durations,
+                               args=(path, "task-{}".format(i), 20))
+               for i in range(8)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(60)
+
+    assert [w.exitcode for w in writers] == [0] * 8
+    db_session = Repository.db_session
+    db_session.expire_all()
+    assert db_session.query(Duration).count() == 160
+    db_session.close()
+
+
+def test_commit_retries_locked(tmpdir, monkeypatch):
+    path = str(tmpdir.join("maxify.db"))
+    Repository.init(path, busy_timeout=0.01)
+    monkeypatch.setattr(Repository, "retry_delay", 0.01)
+
+    other = sqlite3.connect(path, isolation_level=None,
+                            check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.1, other.rollback)
+    timer.start()
+
+    Projects().save(Project(name="locked"))
+    timer.join()
+    assert Projects().get("locked")
+
+    monkeypatch.setattr(Repository, "write_attempts", 2)
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(OperationalError):
+        Projects().save(Project(name="still-locked"))
+    other.rollback()
+    Repository.db_session.rollback()
+    Repository.db_session.close()
+
+
+def test_record_write_behind_retries_locked(tmpdir, monkeypatch):
+    path = str(tmpdir.join("maxify.db"))
+    Repository.init(path, busy_timeout=0.01)
+    monkeypatch.setattr(Repository, "retry_delay", 0.01)
+    project = Project(name="locked")
+    project.add_metric(name="Coding Time", metric_type=Duration)
+    Projects().save(project)
+    metric = project.metric("Coding Time")
+    Repository.enable_write_behind(interval=60)
+
+    other = sqlite3.connect(path, isolation_level=None,
+                            check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.1, other.rollback)
+    timer.start()
+
+    # The new task is committed before its value is queued
+    Tasks(project).record(project.task("task-1"), metric,
+                          timedelta(hours=1))
+    timer.join()
+    Repository.disable_write_behind()
+    assert Duration.total(metric, project.task("task-1"),
+                          Repository.db_session) == timedelta(hours=1)
+    Repository.db_session.close()
+
+
+def test_metric_data_version_removed(tmpdir):
+    # Data file created while a "metrics_data" version counter was kept
+    path = str(tmpdir.join("maxify.db"))
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(engine)
+    engine.execute("INSERT INTO data_versions (name, version) "
+                   "VALUES ('metrics_data', 3)")
+    for table in ("metrics_data_numbers", "metrics_data_durations"):
+        for suffix in ("version", "metrics_data"):
+            engine.execute("CREATE TRIGGER {table}_update_{suffix} "
+                           "AFTER UPDATE ON {table} BEGIN "
+                           "UPDATE data_versions SET version = version + 1 "
+                           "WHERE name = 'metrics_data'; END"
+                           .format(table=table, suffix=suffix))
+    engine.dispose()
+
+    Repository.init(path)
+    db_session = Repository.db_session
+    triggers = {row[0] for row in db_session.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+    assert not [t for t in triggers
+                if t.endswith("_version") or t.endswith("_metrics_data")]
+    assert "metrics_data_durations_update_metrics_data_durations" in triggers
+    assert not db_session.execute("SELECT COUNT(*) FROM data_versions "
+                                  "WHERE name = 'metrics_data'").scalar()
+    db_session.close()
+
+
+def test_task_id_indexes_replaced(tmpdir):
+    # Data file created when values were indexed by task alone
+    path = str(tmpdir.join("maxify.db"))
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(engine)
+    for table in ("metrics_data_numbers", "metrics_data_durations"):
+        engine.execute("DROP INDEX ix_{0}_task_id_epoch".format(table))
+        engine.execute("CREATE INDEX ix_{0}_task_id ON {0} (task_id)"
+                       .format(table))
+    engine.dispose()
+
+    Repository.init(path)
+    for table in ("metrics_data_numbers", "metrics_data_durations"):
+        indexes = {row[1] for row in Repository.db_session.execute(
+            "PRAGMA index_list({})".format(table))}
+        assert "ix_{}_task_id".format(table) not in indexes
+        assert "ix_{}_task_id_epoch".format(table) in indexes
+    Repository.db_session.close()
+
+
+def test_tasks_sort_key_backfill(tmpdir):
+    # Data file created before tasks had a sort key
+    path = str(tmpdir.join("maxify.db"))
+    engine = create_engine("sqlite:///" + path)
+    Base.metadata.create_all(engine,
+                             tables=[t for t in Base.metadata.sorted_tables
+                                     if t.name != "tasks"])
+    engine.execute("""
+        CREATE TABLE tasks (
+            id CHAR(32) NOT NULL,
+            name VARCHAR(256),
+            "desc" VARCHAR,
+            created DATETIME,
+            last_updated DATETIME,
+            project_id CHAR(32),
+            PRIMARY KEY (id),
+            FOREIGN KEY(project_id) REFERENCES projects (id)
+                ON DELETE cascade ON UPDATE cascade
+        )""")
+    project_id = uuid.uuid4()
+    engine.execute(Project.__table__.insert(), id=project_id, name="old")
+    for name in ("task-10", "task-9"):
+        engine.execute("INSERT INTO tasks (id, name, project_id) "
+                       "VALUES (?, ?, ?)",
+                       uuid.uuid4().hex, name, project_id.hex)
+    engine.dispose()
+
+    Repository.init(path)
+    project = Projects().get("old")
+    assert [s.name for s in Tasks(project).summaries()] == \
+        ["task-9", "task-10"]
+    assert [t.name for t in Tasks(project).starts_with("TASK-1")] == \
+        ["task-10"]
+    Repository.db_session.close()
@@ -0,0 +1,80 @@
+"""Unit tests for the ``maxify.reports`` module.
+"""
+
+from datetime import timedelta
+
+import pytest
+
+from maxify.reports import (
+    refresh_rollups,
+    format_hours,
+    DailyRollup,
+    RollupMark
+)
+
+
+@pytest.fixture
+def task(db_session, project):
+    task = project.task("task-1")
+    db_session.commit()
+    return task
+
+
+def _rollup_totals(db_session):
+    return sorted(r.total for r in db_session.query(DailyRollup))
+
+
+def test_refresh_rollups(db_session, task, compile_time_metric):
+    task.record(compile_time_metric, timedelta(hours=1))
+    task.record(compile_time_metric, timedelta(hours=2))
+    db_session.commit()
+
+    assert refresh_rollups(db_session)
+    rollup = db_session.query(DailyRollup).one()
+    assert rollup.total == timedelta(hours=3)
+    assert rollup.entries == 2
+
+    # Nothing new recorded
+    assert not refresh_rollups(db_session)
+
+
+def test_refresh_rollups_incremental(db_session, task, compile_time_metric):
+    task.record(compile_time_metric, timedelta(hours=1))
+    db_session.commit()
+    refresh_rollups(db_session)
+    last_rowid = db_session.query(RollupMark).get("daily").last_rowid
+
+    task.record(compile_time_metric, timedelta(hours=2))
+    db_session.commit()
+    assert refresh_rollups(db_session)
+
+    assert db_session.query(RollupMark).get("daily").last_rowid > last_rowid
+    assert _rollup_totals(db_session) == [timedelta(hours=3)]
+
+
+def test_refresh_rollups_after_delete(db_session, task, compile_time_metric):
+    task.record(compile_time_metric, timedelta(hours=1))
+    task.record(compile_time_metric, timedelta(hours=2))
+    db_session.commit()
+    refresh_rollups(db_session)
+
+    db_session.delete(task.duration_values[0])
+    db_session.commit()
+    refresh_rollups(db_session)
+
+    assert _rollup_totals(db_session) == [timedelta(hours=2)]
+
+
+def test_refresh_rollups_rebuild(db_session, task, compile_time_metric):
+    task.record(compile_time_metric, timedelta(hours=1))
+    db_session.commit()
+    refresh_rollups(db_session)
+
+    assert refresh_rollups(db_session, rebuild=True)
+    assert _rollup_totals(db_session) == [timedelta(hours=1)]
+
+
+def test_format_hours():
+    assert format_hours(None) == "-"
+    assert format_hours(timedelta(minutes=5)) == "0:05"
+    assert format_hours(timedelta(days=1, hours=2, minutes=30)) == "26:30"
@@ -0,0 +1,109 @@
+"""Unit tests for the ``maxify.server`` and ``maxify.client`` modules.
+"""
+
+from io import StringIO
+import sys
+import threading
+
+import pytest
+
+from maxify.client import Client, main
+from maxify.server import CommandServer
+from maxify.ui import MaxifyCmd
+
+
+@pytest.fixture
+def socket_path(request, tmpdir):
+    path = str(tmpdir.join("maxify.db.sock"))
+    server = CommandServer(path, MaxifyCmd(stdout=StringIO(), use_color=False))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        server.server_close()
+
+    request.addfinalizer(shutdown)
+    return path
+
+
+def test_execute(socket_path, project):
+    with Client(socket_path) as client:
+        output, ok = client.execute("task task-1 'Story Points' 5",
+                                    project="test")
+        assert ok
+        assert "Task updated" in output
+
+        output, ok = client.execute("tasks", project="test")
+        assert ok
+        assert "task-1" in output
+
+    assert project.task("task-1", create=False)
+
+
+def test_execute_unknown_project(socket_path):
+    with Client(socket_path) as client:
+        output, ok = client.execute("tasks", project="missing")
+
+    assert not ok
+    assert "No project found named 'missing'" in output
+
+
+def test_execute_interactive_command(socket_path, project):
+    with Client(socket_path) as client:
+        output, ok = client.execute("stopwatch task-1", project="test")
+
+    assert not ok
+    assert "can't be used with the daemon" in output
+
+
+def test_execute_watch_stop_without_metric(socket_path, project):
+    project.task("task-1")
+    with Client(socket_path) as client:
+        client.execute("watch start task-1", project="test")
+        output, ok = client.execute("watch stop task-1", project="test")
+        assert "Stop watch for task task-1 has no metric" in output
+
+        output, ok = client.execute("watch", project="test")
+        assert "task-1" in output
+
+
+def test_main_quotes_arguments(socket_path, monkeypatch, project,
+                               story_points_metric):
+    monkeypatch.setattr(sys, "argv", ["maxify-client", "--socket",
+                                      socket_path, "--project", "test",
+                                      "task", "task-1", "Story Points", "5"])
+    with pytest.raises(SystemExit) as exc_info:
+        main()
+
+    assert exc_info.value.code == 0
+    assert project.task("task-1").value(story_points_metric) == 5
+
+
+def test_main_quotes_pattern(socket_path, monkeypatch, capsys, project):
+    project.task("task-1")
+    project.task("task-2")
+    monkeypatch.setattr(sys, "argv", ["maxify-client", "--socket",
+                                      socket_path, "--project", "test",
+                                      "tasks", "task-1*"])
+    with pytest.raises(SystemExit) as exc_info:
+        main()
+
+    assert exc_info.value.code == 0
+    output = capsys.readouterr().out
+    assert "task-1" in output
+    assert "task-2" not in output
+
+def test_stale_socket(tmpdir):
+    path = str(tmpdir.join("maxify.db.sock"))
+    CommandServer(path).socket.close()
+
+    # Left behind without a daemon listening on it
+    server = CommandServer(path)
+    server.server_close()
+
+
+def test_already_running(socket_path):
+    with pytest.raises(OSError):
+        CommandServer(socket_path)
@@ -1,12 +1,19 @@
 """Unit tests for the ``maxify.stopwatch`` module.
 """
 
+import threading
 import time
 from datetime import timedelta
 
 import pytest
 
-from maxify.stopwatch import StopWatch
+from maxify.stopwatch import (
+    StopWatch,
+    StopWatches,
+    Ticker,
+    Checkpoints,
+    ticker
+)
 
 
 def test_stopwatch():
@@ -15,7 +22,10 @@ def test_stopwatch():
     time.sleep(2)
     s.stop()
 
-    assert timedelta(seconds=1) <= s.total <= timedelta(seconds=2)
+    # Time is measured with a monotonic clock rather than counted in whole
+    # ticks, so the total includes all of the time slept, and no more than
+    # the overhead of the calls around it.
+    assert timedelta(seconds=2) <= s.total < timedelta(seconds=2.5)
 
 
 def test_stopwatch_pause():
@@ -45,4 +55,169 @@ def test_stopwatch_restart():
     s.start()
     s.stop()
     with pytest.raises(RuntimeError):
-        s.start()
\ No newline at end of file
+        s.start()
+
+
+def test_stopwatch_precision():
+    s = StopWatch()
+    s.start()
+    time.sleep(0.25)
+    s.pause()
+
+    # Time is measured exactly rather than in whole ticks
+    assert timedelta(seconds=0.25) <= s.total < timedelta(seconds=0.5)
+
+    total = s.total
+    time.sleep(0.1)
+    assert s.total == total
+
+
+def test_stopwatch_tick_callback():
+    ticks = []
+    s = StopWatch(ticker=Ticker(interval=0.05))
+    s.start(tick_callback=lambda total, status: ticks.append(status))
+    time.sleep(0.3)
+    s.stop()
+
+    assert ticks[0] == StopWatch.STATUS_RUNNING
+    assert ticks.count(StopWatch.STATUS_RUNNING) >= 3
+    assert ticks[-1] == StopWatch.STATUS_STOPPED
+
+
+def test_stopwatch_single_thread():
+    ticker = Ticker(interval=0.05)
+    threads = threading.active_count()
+    watches = [StopWatch(ticker=ticker) for _ in range(5)]
+    for s in watches:
+        s.start(tick_callback=lambda total, status: None)
+
+    assert threading.active_count() == threads + 1
+
+    for s in watches:
+        s.stop()
+
+
+def test_stopwatches():
+    watches = StopWatches()
+    watch1 = watches.start("task-1", "coding_time")
+    watch2 = watches.start("task-2")
+
+    assert len(watches) == 2
+    assert watches.running == [watch1, watch2]
+    assert watch1.metric == "coding_time"
+
+    assert watches.pause("task-1") == [watch1]
+    assert not watch1.running
+    assert watches.running == [watch2]
+
+    assert watches.switch("task-1") is watch1
+    assert watches.running == [watch1]
+    assert watch2.status == StopWatch.STATUS_PAUSED
+
+    assert watches.stop("task-1") is watch1
+    assert watch1.stopped
+    assert (None, "task-1") not in watches
+    assert watches.stop("task-1") is None
+
+    assert watches.pause() == []
+
+
+def test_stopwatches_projects():
+    watches = StopWatches()
+    watch1 = watches.start("task-1", project="project-a")
+    watch2 = watches.start("task-1", project="project-b")
+
+    assert watch1 is not watch2
+    assert watches.get("task-1", "project-b") is watch2
+
+    assert watches.switch("task-1", project="project-a") is watch1
+    assert watches.running == [watch1]
+
+    assert watches.stop("task-1", "project-b") is watch2
+    assert ("project-a", "task-1") in watches
+    assert ("project-b", "task-1") not in watches
+
+    watches.stop("task-1", "project-a")
+
+def test_stopwatches_no_ticks():
+    # Stop watches without tick callbacks don't need to be scheduled
+    ticker = Ticker(interval=0.05)
+    watches = StopWatches(ticker=ticker)
+    for i in range(100):
+        watches.start("task-{}".format(i))
+
+    assert not ticker._watches
+
+
+@pytest.fixture
+def checkpoints(tmpdir):
+    return Checkpoints(str(tmpdir.join("maxify.db.watches")),
+                       interval=0.05,
+                       ticker=Ticker(interval=0.01))
+
+
+def test_checkpoints(checkpoints):
+    watches = StopWatches(checkpoints=checkpoints)
+    watches.start("task-1", "coding_time", "test")
+    watches.start("task-2")
+    time.sleep(0.2)
+    watches.pause("task-1", "test")
+    watches.stop("task-2")
+
+    # Running stop watches are saved periodically
+    with open(checkpoints.path) as f:
+        assert len(f.readlines()) > 5
+
+    restored = StopWatches(checkpoints=checkpoints).restore()
+    assert len(restored) == 1
+    assert restored[0].name == "task-1"
+    assert restored[0].metric == "coding_time"
+    assert restored[0].project == "test"
+    assert restored[0].status == StopWatch.STATUS_PAUSED
+    assert restored[0].total == watches.get("task-1", "test").total
+
+    # Loading compacts the file to the latest state of each stop watch
+    with open(checkpoints.path) as f:
+        assert len(f.readlines()) == 1
+
+
+def test_checkpoints_projects(checkpoints):
+    watches = StopWatches(checkpoints=checkpoints)
+    watches.start("task-1", project="project-a")
+    watches.start("task-1", project="project-b")
+    watches.stop("task-1", "project-b")
+    watches.pause()
+
+    restored = StopWatches(checkpoints=checkpoints).restore()
+    assert [(w.project, w.name) for w in restored] == \
+        [("project-a", "task-1")]
+
+def test_checkpoints_crash(checkpoints):
+    watches = StopWatches(checkpoints=checkpoints)
+    watches.start("task-1")
+    time.sleep(0.2)
+
+    # Simulate a partially written line at exit
+    with open(checkpoints.path, "a") as f:
+        f.write('{"name": "ta')
+
+    restored = StopWatches(checkpoints=checkpoints).restore()
+    assert len(restored) == 1
+    assert timedelta(seconds=0.1) <= restored[0].total <= \
+        watches.get("task-1").total
+
+    watches.stop("task-1")
+
+
+def test_checkpoints_shared_ticker(tmpdir):
+    checkpoints = Checkpoints.for_data_file(str(tmpdir.join("maxify.db")))
+    watches = StopWatches(checkpoints=checkpoints)
+    watches.start("task-1")
+    assert checkpoints in ticker._watches
+
+    watches.stop("task-1")
+    assert checkpoints not in ticker._watches
+
+
+def test_checkpoints_missing_file(checkpoints):
+    assert checkpoints.load() == []
@@ -2,11 +2,13 @@
 Unit tests for the ``maxify.main`` module.
 """
 
+from datetime import datetime, timedelta
 from io import StringIO
 from threading import Thread
 
 import pytest
 
+from maxify.data import to_epoch
 from maxify.ui import MaxifyCmd
 
 
@@ -103,4 +105,210 @@ test Metrics:
    - Possible Values: 1, 2, 3, 5, 8
    - Default Value: 3
 
-""" in output
\ No newline at end of file
+""" in output
+
+
+def test_log(stdin, stdout, db_session, project, compile_time_metric):
+    task = project.task("task-1")
+    task.record(compile_time_metric, timedelta(hours=1))
+    task.record(compile_time_metric, timedelta(minutes=30))
+    for data_point in task.duration_values:
+        data_point.timestamp = datetime(2014, 6, 1, 10)
+        data_point.epoch = to_epoch(data_point.timestamp)
+    db_session.commit()
+
+    _run_cmd(stdin,
+             stdout,
+             "switch " + project.name,
+             "log --since 2014-06-01 --until 2014-06-02",
+             "log --since 2014-06-02",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert "  2014-06-01 10:00  task-1  Compile Time  1:00:00" in output
+    assert " * Compile Time: 1:30:00" in output
+    assert "No values recorded" in output
+
+
+def test_report(stdin, stdout, db_session, project, compile_time_metric):
+    task = project.task("task-1")
+    task.record(compile_time_metric, timedelta(hours=1))
+    task.record(compile_time_metric, timedelta(minutes=30))
+    for data_point in task.duration_values:
+        data_point.timestamp = datetime(2014, 6, 1, 10)
+        data_point.epoch = to_epoch(data_point.timestamp)
+    db_session.commit()
+
+    _run_cmd(stdin,
+             stdout,
+             "switch " + project.name,
+             "report --by month",
+             "report --since 2014-07-01",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert """
+    Month  Compile Time  Total
+  -------  ------------  -----
+  2014-06          1:30   1:30
+  -------  ------------  -----
+    Total          1:30   1:30
+""" in output
+    assert "No time recorded" in output
+
+
+def test_compact(stdin, stdout, project):
+    _run_cmd(stdin,
+             stdout,
+             "compact",
+             "compact --days 30",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert " * test - 0 rows removed (entries older than 30 days)" in output
+    assert output.count("Removed 0 rows, reclaimed ") == 2
+
+
+def test_archive(stdin, stdout, project):
+    _run_cmd(stdin,
+             stdout,
+             "archive --before 2014-01-01",
+             "exit")
+
+    assert "Error: In-memory data stores cannot be archived." in \
+        stdout.getvalue()
+
+
+def test_watch(stdin, stdout, db_session, project, compile_time_metric):
+    project.task("task-1")
+    project.task("task-2")
+    db_session.commit()
+
+    _run_cmd(stdin,
+             stdout,
+             "switch " + project.name,
+             "watch start task-1 compile_time",
+             "watch switch task-2",
+             "watch",
+             "watch stop task-1",
+             "watch stop task-3",
+             "watch start task-3",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert "Started 'task-1' at 0:00:00" in output
+    assert "Started 'task-2' at 0:00:00" in output
+    assert " * Paused   0:00:00." in output
+    assert " * Running  0:00:00." in output
+    assert 'Added 0:00:00.' in output
+    assert "Error: No stop watch found for task task-3" in output
+    assert "Error: Task task-3 does not exist." in output
+    assert len(project.task("task-1").duration_values) == 1
+
+
+def test_watch_projects(stdout, db_session, project, org1_project):
+    project.task("task-1")
+    org1_project.task("task-1")
+    db_session.commit()
+    c = MaxifyCmd(stdout=stdout, use_color=False)
+    c.onecmd("switch " + project.name)
+    c.onecmd("watch start task-1 compile_time")
+    c.onecmd("switch " + org1_project.qualified_name)
+    c.onecmd("watch start task-1 compile_time")
+
+    assert len(c.stopwatches) == 2
+
+    c.onecmd("watch stop task-1")
+    assert len(org1_project.task("task-1").duration_values) == 1
+    assert len(project.task("task-1").duration_values) == 0
+    assert ("test", "task-1") in c.stopwatches
+
+    c.stopwatches.stop("task-1", "test")
+
+def test_watch_stop_keeps_watch(stdout, monkeypatch, db_session, project,
+                                compile_time_metric):
+    project.task("task-1")
+    db_session.commit()
+    c = MaxifyCmd(stdout=stdout, use_color=False)
+    c.onecmd("switch " + project.name)
+    c.onecmd("watch start task-1")
+
+    def no_input(prompt):
+        raise EOFError()
+
+    monkeypatch.setattr("builtins.input", no_input)
+    with pytest.raises(EOFError):
+        c.onecmd("watch stop task-1")
+    assert c.stopwatches.get("task-1", "test").status == "Paused"
+
+    c.interactive = False
+    c.onecmd("watch stop task-1")
+    assert "Error: Stop watch for task task-1 has no metric" in \
+        stdout.getvalue()
+    assert ("test", "task-1") in c.stopwatches
+
+    c.interactive = True
+    monkeypatch.setattr("builtins.input", lambda prompt: "rest")
+    c.onecmd("watch stop task-1")
+    assert ("test", "task-1") not in c.stopwatches
+    assert len(project.task("task-1").duration_values) == 1
+
+
+def test_profile(stdin, stdout, project):
+    _run_cmd(stdin,
+             stdout,
+             "profile on",
+             "projects",
+             "profile off",
+             "projects",
+             "profile maybe",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert "Profiling is on" in output
+    assert "Profiling is off" in output
+    assert "Error: Expected 'on' or 'off'" in output
+    assert output.count("Profile: ") == 2
+    assert "SQL statement(s)" in output
+
+
+def test_stats(stdin, stdout, project):
+    _run_cmd(stdin,
+             stdout,
+             "switch " + project.name,
+             "stats",
+             "exit")
+
+    output = stdout.getvalue()
+
+    assert "Data File" in output
+    assert " * test - 0 tasks, 2 metrics, 0 numbers, 0 durations" in output
+    assert "objects in the session" in output
+    assert "when fully loaded, with 0 tasks and 0 values" in output
+
+
+def test_tasks_page(stdin, stdout, project):
+    for name in ("task-10", "task-2", "task-1", "other"):
+        project.task(name)
+
+    _run_cmd(stdin,
+             stdout,
+             "switch " + project.name,
+             "tasks task-*",
+             "tasks --page 2 --page-size 2",
+             "tasks --page 0",
+             "exit")
+
+    output = stdout.getvalue()
+    listing, page = output.split("Tasks\n")[1:]
+
+    assert " * task-1\n * task-2\n * task-10\n" in listing
+    assert "other" not in listing
+    assert " * task-2\n * task-10\n" in page
+    assert "Page 2 of 2 (4 tasks)" in page
+    assert "Error: Page and page size must be at least 1" in output
@@ -15,4 +15,18 @@ def test_sorted_naturally():
         ("A 2", 2),
         ("A 10", 10),
         ("b", None)
-    ]
\ No newline at end of file
+    ]
+
+
+def test_natural_sort_key():
+    assert natural_sort_key("maxify-2") < natural_sort_key("maxify-10")
+    assert natural_sort_key("Maxify-2") < natural_sort_key("maxify-3")
+    assert natural_sort_key("task-007") == natural_sort_key("task-7")
+    assert natural_sort_key("v1.10") == "v011.0210"
+
+
+def test_format_size():
+    assert format_size(512) == "512 bytes"
+    assert format_size(1536) == "1.5 KiB"
+    assert format_size(3 * 1024 ** 2) == "3.0 MiB"
+    assert format_size(2 * 1024 ** 4) == "2048.0 GiB"